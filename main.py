@@ -5,9 +5,6 @@ import argparse
 # Añadir el directorio scripts al path para poder importar módulos desde allí
 sys.path.append(os.path.join(os.path.dirname(__file__), 'scripts'))
 
-# Importar el script principal de tracking multi-cámara
-from scripts.multi_cam_track import main
-
 def parse_args():
     parser = argparse.ArgumentParser(description="Sistema IA Tracking - Detección y Conteo de Paquetes")
     # Aceptar cualquier argumento posicional o flags para el video
@@ -15,6 +12,11 @@ def parse_args():
     parser.add_argument("--source", type=str, help="Ruta al archivo de video para modo prueba (alternativo)")
     parser.add_argument("--prueba.mp4", dest="prueba_mp4_flag", action="store_true", help="Flag para usar prueba.mp4 rápidamente")
     parser.add_argument("--no-gui", action="store_true", help="Ejecutar sin interfaz gráfica (modo servidor)")
+    # Sharding: un coordinador reparte las cámaras entre procesos worker
+    parser.add_argument("--workers", type=int, default=None, help="Modo coordinador: número de procesos worker")
+    parser.add_argument("--worker", type=str, default=None, help="Modo worker: dirección HOST:PUERTO del coordinador")
+    parser.add_argument("--worker-id", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--cams", type=str, default=None, help="IDs de cámara a procesar, separados por comas (modo worker)")
     
     # Truco para soportar el formato no estándar --prueba.mp4 como si fuera un flag
     # Si detectamos un argumento que empieza por -- y termina en .mp4/.avi/etc, lo tratamos como source
@@ -31,13 +33,27 @@ def parse_args():
         if arg.startswith("--") and (arg.endswith(".mp4") or arg.endswith(".avi")):
             video_source = arg.lstrip("-") # quitamos los guiones
     
-    return video_source, args.no_gui
+    return video_source, args.no_gui, args
 
 if __name__ == "__main__":
     print("[INFO] Iniciando Sistema IA Tracking...")
     try:
-        video_source, headless = parse_args()
-        main(video_source=video_source, headless=headless)
+        video_source, headless, args = parse_args()
+        if args.workers:
+            from scripts.coordinator import coordinator_from_config
+            from utils.utils import load_config
+            coordinator_from_config(load_config("config.yaml"), args.workers).run()
+        else:
+            # Import diferido: el parseo de argumentos no paga la carga del script de tracking;
+            # torch / ultralytics se importan dentro de main() mientras conectan las cámaras
+            from scripts.multi_cam_track import main
+            shard = None
+            cameras = [int(c) for c in args.cams.split(",")] if args.cams else None
+            if args.worker:
+                from utils.sharding import ShardClient, parse_address
+                shard = ShardClient(parse_address(args.worker), args.worker_id)
+                headless = True
+            main(video_source=video_source, headless=headless, cameras=cameras, shard=shard)
     except KeyboardInterrupt:
         print("\n[INFO] Sistema detenido por el usuario.")
     except Exception as e:
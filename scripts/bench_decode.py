@@ -0,0 +1,92 @@
+import sys
+import os
+import argparse
+import time
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.utils import load_config
+from utils.capture import BACKENDS, backend_available, create_capture
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    import resource # Solo Unix: CPU de procesos hijos (ffmpeg)
+except ImportError:
+    resource = None
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def bench_backend(source, backend, options, max_frames=None, idle=False):
+    """
+    Decodifica un video local completo (o max_frames) con un backend.
+    :return: Diccionario con frames, segundos de pared y segundos de CPU (proceso + ffmpeg).
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time() + _children_cpu()
+    cap = create_capture(source, backend, **options)
+    if not cap.isOpened():
+        raise RuntimeError(f"No se pudo abrir {source} con {backend}")
+    if idle:
+        cap.set_idle(True)
+    frames = 0
+    shape = None
+    while max_frames is None or frames < max_frames:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        shape = frame.shape
+        frames += 1
+    cap.release() # Espera al proceso ffmpeg para que su CPU cuente en RUSAGE_CHILDREN
+    return {"frames": frames, "wall": time.perf_counter() - wall_start,
+            "cpu": time.process_time() + _children_cpu() - cpu_start, "shape": shape}
+
+if __name__ == "__main__":
+    capture_config = load_config("config.yaml").get("capture", {})
+
+    parser = argparse.ArgumentParser(description="Benchmark de CPU de decodificación por backend de captura")
+    parser.add_argument("--source", required=True, nargs="+", help="Videos H.264 locales")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--width", type=int, default=capture_config.get("width", 640))
+    parser.add_argument("--height", type=int, default=capture_config.get("height", 360))
+    parser.add_argument("--threads", type=int, nargs="+", default=[capture_config.get("threads", 0)],
+                        help="Hilos de decodificación a probar (PyAV / ffmpeg)")
+    parser.add_argument("--idle", action="store_true", help="Medir también la decodificación solo de keyframes")
+    parser.add_argument("--max-frames", type=int, default=None)
+    args = parser.parse_args()
+
+    if resource is None:
+        logger.warning("Módulo 'resource' no disponible: la CPU de ffmpeg (proceso hijo) no se contabiliza.")
+
+    print(f"\n{'video':<24} {'backend':<8} {'hilos':>5} {'modo':<9} {'frames':>7} {'fps':>8} "
+          f"{'CPU ms/frame':>13} {'CPU %':>6} {'salida':>12}")
+    for source in args.source:
+        name = os.path.basename(str(source))[:24]
+        baseline = None
+        for backend in args.backends:
+            if not backend_available(backend):
+                logger.warning(f"Backend '{backend}' no disponible, se omite.")
+                continue
+            # OpenCV no tiene control de hilos ni modo keyframes
+            thread_options = args.threads if backend != "opencv" else [0]
+            modes = [False, True] if args.idle and backend != "opencv" else [False]
+            for threads in thread_options:
+                for idle in modes:
+                    options = {"width": args.width, "height": args.height, "threads": threads}
+                    res = bench_backend(source, backend, options, args.max_frames, idle)
+                    cpu_ms = 1000 * res["cpu"] / res["frames"] if res["frames"] else 0
+                    if backend == "opencv":
+                        baseline = cpu_ms
+                    shape = "x".join(str(v) for v in (res["shape"] or ())[:2][::-1])
+                    print(f"{name:<24} {backend:<8} {threads:>5} {'keyframes' if idle else 'completo':<9} "
+                          f"{res['frames']:>7} {res['frames'] / res['wall']:>8.1f} {cpu_ms:>13.2f} "
+                          f"{100 * res['cpu'] / res['wall']:>6.0f} {shape:>12}")
+        if baseline:
+            print(f"{'':<24} (referencia OpenCV: {baseline:.2f} ms de CPU por frame)")
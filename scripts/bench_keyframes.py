@@ -0,0 +1,131 @@
+import sys
+import os
+import argparse
+import time
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+from ultralytics import YOLO
+from utils.utils import load_config, get_device
+from utils.counter import LineCounter
+from utils.detections import DetectionBatch
+from utils.tracking import create_tracker, predict_detections
+from utils.propagation import KeyframeTracker
+from utils.resolution import ResolutionTiers
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def replay(source, model, config, device, line, k_min, k_max, line_margin, max_frames=None, imgsz=None,
+           resolution=None):
+    """
+    Reproduce un video frame a frame (sin descartar ninguno) con detección cada k frames.
+    :param imgsz: Resolución de inferencia fija (None = 'imgsz' global de config.yaml).
+    :param resolution: ResolutionTiers para elegir el imgsz en cada keyframe (modo automático).
+    :return: Diccionario con frames, keyframes, segundos y conteos.
+    """
+    counter = LineCounter((line[0], line[1]), (line[2], line[3]), model.names)
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cam_tracker = KeyframeTracker(create_tracker(config.get("tracker_type", "bytetrack.yaml"), frame_rate=int(round(fps))),
+                                  k_min, k_max, line=((line[0], line[1]), (line[2], line[3])), line_margin=line_margin)
+
+    start = time.perf_counter()
+    while max_frames is None or cam_tracker.frames < max_frames:
+        grabbed, frame = cap.read()
+        if not grabbed:
+            break
+        detections = None
+        if cam_tracker.needs_detection():
+            size = resolution.get(0) if resolution else imgsz or config.get("imgsz", 640)
+            detections = predict_detections(model, [frame], imgsz=size, conf=config.get("conf_threshold", 0.25),
+                                            iou=config.get("iou_threshold", 0.45), device=device).camera(0)
+            if resolution:
+                resolution.observe(0, detections, frame.shape)
+        tracks = cam_tracker.update(frame, detections)
+        counter.update(DetectionBatch.from_arrays([tracks]))
+    elapsed = time.perf_counter() - start
+    cap.release()
+
+    usage = dict(resolution.usage[0]) if resolution else {imgsz or config.get("imgsz", 640): cam_tracker.keyframes}
+    return {"frames": cam_tracker.frames, "keyframes": cam_tracker.keyframes, "seconds": elapsed,
+            "total": counter.total_count, "per_class": dict(counter.counts), "imgsz_usage": usage}
+
+def compare_tiers(source, weights, config, device, line, tiers, max_frames=None, gt=None):
+    """
+    Throughput y conteo con cada configuración de resolución (detección en todos los frames).
+    :param tiers: Lista de imgsz (int) o "auto" (escalones de la sección 'resolution').
+    :param gt: Conteo real del video; si no se da, la referencia es la primera configuración.
+    """
+    res_config = config.get("resolution", {})
+    name = os.path.basename(str(source))[:24]
+    reference = gt
+    for tier in tiers:
+        resolution = None
+        if tier == "auto":
+            resolution = ResolutionTiers(default=config.get("imgsz", 640), tiers=res_config.get("tiers", [320, 480, 640]),
+                                         auto=True, min_box_px=res_config.get("min_box_px", 48),
+                                         window=res_config.get("window", 30))
+        res = replay(source, YOLO(weights), config, device, line, 1, 1, 0, max_frames,
+                     imgsz=None if resolution else int(tier), resolution=resolution)
+        if reference is None:
+            reference = res["total"]
+        fps = res["frames"] / res["seconds"] if res["seconds"] else 0
+        total_kf = sum(res["imgsz_usage"].values()) or 1
+        usage = " ".join(f"{size}:{100 * n / total_kf:.0f}%" for size, n in sorted(res["imgsz_usage"].items()))
+        error = abs(res["total"] - reference) / reference if reference else 0.0
+        print(f"{name:<24} {str(tier):<6} {fps:>10.1f} {res['total']:>7} {res['total'] - reference:>5} "
+              f"{100 * (1 - error):>8.1f}% {usage}")
+
+if __name__ == "__main__":
+    config = load_config("config.yaml")
+    kf_config = config.get("keyframes", {})
+
+    parser = argparse.ArgumentParser(description="Benchmark de detección cada k frames vs detección en todos los frames")
+    parser.add_argument("--source", required=True, nargs="+", help="Videos grabados (uno por cámara)")
+    parser.add_argument("--cam", type=int, nargs="+", default=None,
+                        help="ID de cámara en config.yaml para la línea de cada video (default: 1)")
+    parser.add_argument("--k-min", type=int, default=kf_config.get("k_min", 1))
+    parser.add_argument("--k-max", type=int, default=kf_config.get("k_max", 6))
+    parser.add_argument("--max-frames", type=int, default=None, help="Limitar frames por video")
+    parser.add_argument("--weights", default="models/paquetes_tracking/weights/best.pt")
+    parser.add_argument("--tiers", nargs="+", default=None,
+                        help="Comparar resoluciones de inferencia en lugar de keyframes (ej. 640 480 320 auto)")
+    parser.add_argument("--gt", type=int, nargs="+", default=None, help="Conteo real de cada video (para --tiers)")
+    args = parser.parse_args()
+
+    device = get_device(config.get("device"))
+    weights = args.weights if os.path.exists(args.weights) else "yolov8n.pt"
+    cam_ids = args.cam or [1] * len(args.source)
+    line_margin = kf_config.get("line_margin", 60)
+
+    if args.tiers:
+        print(f"\n{'video':<24} {'imgsz':<6} {'fps efect.':>10} {'conteo':>7} {'dif.':>5} {'precisión':>9} uso de imgsz")
+    else:
+        print(f"\n{'video':<24} {'modo':<10} {'fps efect.':>10} {'det/frame':>10} {'conteo':>7} {'dif.':>5}")
+    for n, (source, cam_id) in enumerate(zip(args.source, cam_ids)):
+        cam_config = (config.get("cameras") or {}).get(cam_id) or {}
+        if not cam_config.get("line"):
+            logger.error(f"La cámara {cam_id} no tiene 'line' en config.yaml. Se omite {source}.")
+            continue
+        line = [int(v) for v in cam_config["line"]]
+
+        if args.tiers:
+            compare_tiers(source, weights, config, device, line, args.tiers, args.max_frames,
+                          args.gt[n] if args.gt and n < len(args.gt) else None)
+            continue
+
+        # Modelo nuevo por modo para no compartir estado de warmup entre mediciones
+        full = replay(source, YOLO(weights), config, device, line, 1, 1, line_margin, args.max_frames)
+        adaptive = replay(source, YOLO(weights), config, device, line, args.k_min, args.k_max, line_margin,
+                          args.max_frames)
+
+        name = os.path.basename(str(source))[:24]
+        for mode, res in (("completo", full), ("keyframes", adaptive)):
+            fps = res["frames"] / res["seconds"] if res["seconds"] else 0
+            det_ratio = res["keyframes"] / res["frames"] if res["frames"] else 0
+            print(f"{name:<24} {mode:<10} {fps:>10.1f} {det_ratio:>10.2f} {res['total']:>7} "
+                  f"{res['total'] - full['total']:>5}")
@@ -0,0 +1,98 @@
+import sys
+import os
+import argparse
+import time
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from utils.detections import DetectionBatch
+from utils.zones import ZoneEngine
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def grid_zones(num_zones, width, height):
+    """
+    Zonas rectangulares en rejilla que cubren el frame (num_zones celdas como mínimo).
+    """
+    cols = int(np.ceil(np.sqrt(num_zones * width / height)))
+    rows = int(np.ceil(num_zones / cols))
+    zones = []
+    for k in range(num_zones):
+        r, c = divmod(k, cols)
+        x1, x2 = c * width // cols, (c + 1) * width // cols - 1
+        y1, y2 = r * height // rows, (r + 1) * height // rows - 1
+        zones.append({"name": f"z{k}", "polygon": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]], "max_dwell": 30})
+    return zones
+
+def synthetic_tracks(num_tracks, num_frames, width, height, seed=0):
+    """
+    Tracks con movimiento lineal (rebotando en los bordes) como DetectionBatch por frame.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform([0, 0], [width, height], size=(num_tracks, 2))
+    vel = rng.uniform(-4, 4, size=(num_tracks, 2))
+    ids = np.arange(1, num_tracks + 1, dtype=np.float32)
+    frames = []
+    for _ in range(num_frames):
+        pos += vel
+        out = (pos < 0) | (pos > [width, height])
+        vel[out] *= -1
+        pos = np.clip(pos, 0, [width - 1, height - 1])
+        rows = np.column_stack([pos - 20, pos + 20, ids, np.full(num_tracks, 0.9), np.zeros(num_tracks)])
+        frames.append(DetectionBatch.from_arrays([rows.astype(np.float32)]))
+    return frames
+
+def naive_update(zones, detections, state):
+    """
+    Referencia: cv2.pointPolygonTest por centroide y por zona (coste O(tracks x zonas)).
+    """
+    entered = 0
+    for track_id, (x, y) in zip(detections.track_id, detections.centroids()):
+        label = 0
+        for k, zone in enumerate(zones, 1):
+            if cv2.pointPolygonTest(zone, (float(x), float(y)), False) >= 0:
+                label = k
+        if state.get(int(track_id), label) != label:
+            entered += 1
+        state[int(track_id)] = label
+    return entered
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del motor de zonas: coste por frame según número de zonas")
+    parser.add_argument("--zones", type=int, nargs="+", default=[1, 4, 16, 64, 200])
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=500)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    args = parser.parse_args()
+
+    frames = synthetic_tracks(args.tracks, args.frames, args.width, args.height)
+    shape = (args.height, args.width, 3)
+
+    print(f"\n{'zonas':>6} {'máscara ms':>11} {'ZoneEngine µs/frame':>20} {'pointPolygonTest µs/frame':>26} {'aceleración':>12}")
+    for num_zones in args.zones:
+        zones = grid_zones(num_zones, args.width, args.height)
+
+        engine = ZoneEngine(zones)
+        start = time.perf_counter()
+        engine._build_mask(shape)
+        mask_ms = 1000 * (time.perf_counter() - start)
+        start = time.perf_counter()
+        for t, detections in enumerate(frames):
+            engine.update(detections, shape, t / 30.0)
+        engine_us = 1e6 * (time.perf_counter() - start) / len(frames)
+
+        polygons = [np.asarray(z["polygon"], dtype=np.int32).reshape(-1, 1, 2) for z in zones]
+        state = {}
+        start = time.perf_counter()
+        for detections in frames:
+            naive_update(polygons, detections, state)
+        naive_us = 1e6 * (time.perf_counter() - start) / len(frames)
+
+        print(f"{num_zones:>6} {mask_ms:>11.2f} {engine_us:>20.1f} {naive_us:>26.1f} {naive_us / engine_us:>11.1f}x")
+    logger.info(f"{args.tracks} tracks, {args.frames} frames de {args.width}x{args.height}")
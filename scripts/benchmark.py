@@ -0,0 +1,272 @@
+import sys
+import os
+import argparse
+import contextlib
+import json
+import logging
+import platform
+import statistics
+import time
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from utils.counter import LineCounter
+from utils.detections import DetectionBatch
+from utils.display import GridRenderer
+import utils.utils
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = {0: "paquete", 1: "caja", 2: "sobre"}
+FRAME_W, FRAME_H = 640, 360
+
+class Skip(Exception):
+    """
+    El caso no se puede medir en este entorno (ej. falta torch / ultralytics / requests).
+    """
+
+def measure(fn, min_time=0.2, repeat=5):
+    """
+    Mide fn() al estilo timeit: ajusta el número de iteraciones para que cada ronda dure al
+    menos `min_time` segundos y repite `repeat` rondas.
+    :return: Diccionario con mediana y mínimo en µs por llamada e iteraciones por ronda.
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed < min_time / 10 else max(2, int(min_time / max(elapsed, 1e-9)) + 1)
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append(1e6 * (time.perf_counter() - start) / loops)
+    return {"median_us": statistics.median(rounds), "min_us": min(rounds), "loops": loops}
+
+def synthetic_tracks(n, seed=0, shift=0.0):
+    """
+    n tracks (ids 1..n) con cajas de 40x40 repartidas por el frame; `shift` desplaza en x.
+    """
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform([0, 0], [FRAME_W - 40, FRAME_H - 40], size=(n, 2))
+    xy[:, 0] = (xy[:, 0] + shift) % (FRAME_W - 40)
+    rows = np.column_stack([xy, xy + 40, np.arange(1, n + 1), rng.uniform(0.3, 1.0, n), rng.integers(0, 3, n)])
+    return DetectionBatch.from_arrays([rows.astype(np.float32)])
+
+# --- Casos ---------------------------------------------------------------------------
+
+def case_counter_update(n):
+    # Dos posiciones alternas por track: ~la mitad cruza la línea en cada llamada
+    counter = LineCounter((FRAME_W // 2, 0), (FRAME_W // 2, FRAME_H), CLASS_NAMES)
+    states = [synthetic_tracks(n, shift=0.0), synthetic_tracks(n, shift=FRAME_W / 2)]
+    step = [0]
+    def run():
+        step[0] ^= 1
+        counter.update(states[step[0]])
+    return run
+
+def case_crossed_line(n):
+    # Versión escalar original: un par de puntos por llamada, n pares por iteración
+    counter = LineCounter((FRAME_W // 2, 0), (FRAME_W // 2, FRAME_H), CLASS_NAMES)
+    a = synthetic_tracks(n, shift=0.0).centroids().astype(np.int64).tolist()
+    b = synthetic_tracks(n, shift=FRAME_W / 2).centroids().astype(np.int64).tolist()
+    pairs = list(zip(a, b))
+    def run():
+        for point_a, point_b in pairs:
+            counter._has_crossed_line(point_a, point_b)
+    return run
+
+def case_crossed_mask(n):
+    counter = LineCounter((FRAME_W // 2, 0), (FRAME_W // 2, FRAME_H), CLASS_NAMES)
+    a = synthetic_tracks(n, shift=0.0).centroids().astype(np.int64)
+    b = synthetic_tracks(n, shift=FRAME_W / 2).centroids().astype(np.int64)
+    return lambda: counter._crossed_mask(a, b)
+
+def case_from_results(cams, n=50):
+    try:
+        import torch
+        from ultralytics.engine.results import Results
+    except ImportError as e:
+        raise Skip(f"requiere torch y ultralytics ({e})")
+    image = np.zeros((FRAME_H, FRAME_W, 3), dtype=np.uint8)
+    results = []
+    for k in range(cams):
+        tracks = synthetic_tracks(n, seed=k)
+        data = np.column_stack([tracks.boxes, tracks.conf, tracks.cls]).astype(np.float32)
+        results.append(Results(image, path=f"cam{k}", names=CLASS_NAMES, boxes=torch.from_numpy(data)))
+    return lambda: DetectionBatch.from_results(results)
+
+def case_grid(cams, boxes=10):
+    # Todas las cámaras con frame nuevo en cada refresco (peor caso del grid)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 255, (FRAME_H, FRAME_W, 3), dtype=np.uint8) for _ in range(cams)]
+    detections = [synthetic_tracks(boxes, seed=k) for k in range(cams)]
+    counters = [LineCounter((FRAME_W // 2, 0), (FRAME_W // 2, FRAME_H), CLASS_NAMES) for _ in range(cams)]
+    renderer = GridRenderer(cams, 3, (FRAME_W, FRAME_H))
+    def run():
+        for k in range(cams):
+            renderer.draw_frame(k, k + 1, frames[k], detections[k], CLASS_NAMES, counters[k])
+        renderer.take()
+    return run
+
+def case_grid_idle(cams):
+    # Refresco sin frames nuevos: solo comprobaciones de estado
+    renderer = GridRenderer(cams, 3, (FRAME_W, FRAME_H))
+    for k in range(cams):
+        renderer.draw_status(k, k + 1, "NO FRAME", (0, 255, 255))
+    def run():
+        for k in range(cams):
+            renderer.draw_status(k, k + 1, "NO FRAME", (0, 255, 255))
+        renderer.take()
+    return run
+
+@contextlib.contextmanager
+def case_send_counts(n=50, counted=3):
+    # Mismo camino que el bucle principal: filas contadas de un DetectionBatch
+    try:
+        from utils import api_client
+    except ImportError as e:
+        raise Skip(f"requiere requests ({e})")
+    detections = synthetic_tracks(n)
+    rows = np.arange(counted)
+    # Se mide solo la construcción de payloads y el lanzamiento del hilo: el envío HTTP queda fuera.
+    # El parche se deshace al terminar el caso para no afectar al resto de la ejecución.
+    original = api_client._send_request
+    api_client._send_request = lambda payload: None
+    try:
+        yield lambda: api_client.send_counts("692f49453e34ca47297fc911", detections, rows, CLASS_NAMES)
+    finally:
+        api_client._send_request = original
+
+def case_load_config():
+    path = os.path.join(os.path.dirname(__file__), "..", "config.yaml")
+    return lambda: utils.utils.load_config(path)
+
+CASES = {}
+for n in (1, 10, 50, 200):
+    CASES[f"counter.update[n={n}]"] = (case_counter_update, (n,))
+    CASES[f"counter._has_crossed_line[n={n}]"] = (case_crossed_line, (n,))
+    CASES[f"counter._crossed_mask[n={n}]"] = (case_crossed_mask, (n,))
+for cams in (1, 7, 16):
+    CASES[f"detections.from_results[cams={cams}]"] = (case_from_results, (cams,))
+for cams in (1, 4, 7, 16):
+    CASES[f"grid.refresh[cams={cams}]"] = (case_grid, (cams,))
+    CASES[f"grid.idle[cams={cams}]"] = (case_grid_idle, (cams,))
+CASES["api.send_counts"] = (case_send_counts, ())
+CASES["config.load_config"] = (case_load_config, ())
+
+# --- Ejecución y comparación ---------------------------------------------------------
+
+def run_suite(pattern=None, min_time=0.2, repeat=5):
+    """
+    :param pattern: Subcadena para filtrar casos por nombre (None = todos).
+    :return: Diccionario con metadatos del entorno y resultados por caso.
+    """
+    # load_config registra cada lectura; no interesa en el benchmark
+    utils.utils.logger.setLevel(logging.WARNING)
+    cv2.setNumThreads(1) # Mediciones comparables entre máquinas con distinto número de núcleos
+    results = {}
+    for name, (factory, params) in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        try:
+            case = factory(*params)
+            # Los casos con preparación que deshacer (parches) son context managers que entregan la función
+            with case if hasattr(case, "__enter__") else contextlib.nullcontext(case) as fn:
+                results[name] = measure(fn, min_time, repeat)
+        except Skip as e:
+            logger.warning(f"{name}: omitido, {e}")
+            results[name] = {"skipped": str(e)}
+            continue
+        logger.info(f"{name}: {results[name]['median_us']:.1f} µs")
+    return {"meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                     "numpy": np.__version__, "opencv": cv2.__version__, "machine": platform.machine(),
+                     "processor": platform.processor(), "min_time": min_time, "repeat": repeat},
+            "results": results}
+
+def compare(base, new, threshold=0.15):
+    """
+    :param threshold: Aumento relativo del tiempo mínimo a partir del cual un caso es regresión.
+    :return: Lista de casos con regresión.
+    """
+    regressions = []
+    print(f"\n{'caso':<40} {'base µs':>10} {'nuevo µs':>10} {'cambio':>8}  estado")
+    for name, b in new["results"].items():
+        a = base["results"].get(name)
+        if not a or "skipped" in a or "skipped" in b:
+            reason = "omitido" if "skipped" in b else "sin referencia" if not a else "omitido en la referencia"
+            print(f"{name:<40} {'-':>10} {'-':>10} {'-':>8}  {reason}")
+            continue
+        # Se compara el mínimo de las rondas: es lo más estable frente a ruido del sistema
+        change = b["min_us"] / a["min_us"] - 1 if a["min_us"] else 0.0
+        status = "ok"
+        if change > threshold:
+            status = "REGRESIÓN"
+            regressions.append(name)
+        elif change < -threshold:
+            status = "mejora"
+        print(f"{name:<40} {a['min_us']:>10.1f} {b['min_us']:>10.1f} {100 * change:>+7.0f}%  {status}")
+    if base.get("meta", {}).get("processor") != new.get("meta", {}).get("processor"):
+        logger.warning("Los resultados son de máquinas distintas: la comparación es orientativa.")
+    return regressions
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_results(data, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Resultados guardados en {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks (CPU, datos sintéticos) de los componentes del bucle principal")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Ejecutar la suite y guardar los resultados en JSON")
+    p_run.add_argument("--out", default="runs/bench/latest.json")
+    p_run.add_argument("--baseline", default=None, help="Comparar además contra este JSON de referencia")
+    p_run.add_argument("--filter", default=None, help="Solo casos cuyo nombre contenga este texto")
+    p_run.add_argument("--min-time", type=float, default=0.2, help="Segundos mínimos por ronda")
+    p_run.add_argument("--repeat", type=int, default=5, help="Rondas por caso")
+    p_run.add_argument("--threshold", type=float, default=0.15)
+
+    p_cmp = sub.add_parser("compare", help="Comparar dos JSON y marcar regresiones")
+    p_cmp.add_argument("base", help="JSON de referencia (ej. benchmarks/baseline.json)")
+    p_cmp.add_argument("new", help="JSON a evaluar")
+    p_cmp.add_argument("--threshold", type=float, default=0.15,
+                       help="Aumento relativo del tiempo considerado regresión (0.15 = +15%%)")
+
+    p_list = sub.add_parser("list", help="Listar los casos disponibles")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in CASES:
+            print(name)
+        sys.exit(0)
+
+    if args.command == "run":
+        data = run_suite(args.filter, args.min_time, args.repeat)
+        save_results(data, args.out)
+        if not args.baseline:
+            sys.exit(0)
+        base, new = load_results(args.baseline), data
+    else:
+        base, new = load_results(args.base), load_results(args.new)
+
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        logger.error(f"{len(regressions)} casos más lentos que la referencia (> +{100 * args.threshold:.0f}%): "
+                     f"{', '.join(regressions)}")
+        sys.exit(1)
+    logger.info("Sin regresiones respecto a la referencia.")
@@ -0,0 +1,54 @@
+import sys
+import os
+import argparse
+import time
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import yaml
+from utils.utils import load_config
+from utils.shard_cache import build_split, labels_dir_for
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def build_cache(data_yaml, cache_root, imgsz, shard_size):
+    """
+    Convierte los splits train/val del dataset en shards uint8 (letterbox imgsz x imgsz)
+    más arrays de etiquetas. Es incremental: solo procesa imágenes nuevas o modificadas.
+    """
+    with open(data_yaml, "r", encoding="utf-8") as f:
+        data_cfg = yaml.safe_load(f)
+    root = data_cfg.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+
+    for split in ("train", "val"):
+        if split not in data_cfg:
+            continue
+        images_dir = os.path.join(root, data_cfg[split])
+        labels_dir = labels_dir_for(images_dir)
+        if not os.path.isdir(images_dir):
+            logger.error(f"Carpeta de imágenes no encontrada: {images_dir}")
+            continue
+
+        start = time.perf_counter()
+        stats = build_split(images_dir, labels_dir, os.path.join(cache_root, split), imgsz, shard_size)
+        elapsed = time.perf_counter() - start
+        logger.info(f"[{split}] nuevas: {stats['new']}, actualizadas: {stats['updated']}, "
+                    f"sin cambios: {stats['skipped']}, eliminadas: {stats['removed']}, "
+                    f"compactadas: {stats['compacted']} ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    config = load_config("config.yaml")
+    cache_config = config.get("shard_cache", {})
+
+    parser = argparse.ArgumentParser(description="Preparar caché de shards preprocesados para entrenamiento")
+    parser.add_argument("--data", default=config.get("data_yaml", "data/dataset.yaml"), help="Ruta a dataset.yaml")
+    parser.add_argument("--out", default=cache_config.get("dir", "data/cache"), help="Directorio de la caché")
+    parser.add_argument("--imgsz", type=int, default=config.get("imgsz", 640), help="Tamaño del letterbox")
+    parser.add_argument("--shard-size", type=int, default=cache_config.get("shard_size", 256),
+                        help="Imágenes por shard")
+    args = parser.parse_args()
+
+    build_cache(args.data, args.out, args.imgsz, args.shard_size)
@@ -0,0 +1,214 @@
+import sys
+import os
+import argparse
+import json
+import subprocess
+import time
+
+# Añadir el directorio raíz al path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from utils.utils import load_config
+from utils.api_client import send_events
+from utils.connection import Backoff
+from utils.event_log import EventLogger
+from utils.sharding import AUTH_EXIT_CODE, CountAggregator, EventDeduplicator, ShardServer, split_cameras
+from scripts.multi_cam_track import camera_urls
+
+class Coordinator:
+    """
+    Reparte las cámaras de RTSP_CAMERAS entre N procesos worker (cada uno con su modelo,
+    ingesta y contadores) y centraliza lo que antes hacía un único proceso: deduplica los
+    eventos de conteo, agrega totales por terminal, registra los eventos y los envía a la API.
+    Los workers que terminan inesperadamente se relanzan con backoff.
+    """
+    def __init__(self, num_workers, host="127.0.0.1", port=0, event_log="logs/count_events.jsonl",
+                 send_api=True, report_interval=30):
+        self.server = ShardServer((host, port))
+        self.address = "%s:%d" % self.server.address
+        # Los workers locales se conectan por loopback (no se puede conectar a 0.0.0.0 en Windows)
+        self.connect_address = "127.0.0.1:%d" % self.server.address[1]
+        cam_ids = [cam_id for cam_id, _ in camera_urls()]
+        if not cam_ids:
+            raise RuntimeError("No se encontraron cámaras en el .env (RTSP_CAMERAS o RTSP_CAM_X)")
+        # Las cámaras emparejadas para deduplicación entre cámaras deben compartir worker
+        handoff_config = load_config("config.yaml").get("handoff", {})
+        groups = [(p["from"], p["to"]) for p in handoff_config.get("pairs") or []] if handoff_config.get("enabled") else None
+        self.shards = split_cameras(cam_ids, num_workers, groups)
+        if len(self.shards) < num_workers:
+            print(f"[WARN] Solo hay {len(cam_ids)} cámaras: se usarán {len(self.shards)} workers.")
+
+        self.procs = [None] * len(self.shards)
+        self.backoffs = [Backoff(base=1.0, maximum=60.0) for _ in self.shards]
+        self.next_start = [0.0] * len(self.shards)
+        self.restarts = [0] * len(self.shards)
+
+        self.dedup = EventDeduplicator()
+        self.aggregator = CountAggregator()
+        self.event_logger = EventLogger(event_log)
+        self.send_api = send_api
+        self.events = 0
+        self.report_interval = report_interval
+        self.worker_metrics = {} # worker -> último mensaje de métricas
+        self.frames = 0          # Frames procesados (según métricas) en la ventana de medición
+        self.measure_from = None
+
+    def _spawn(self, k):
+        cmd = [sys.executable, os.path.join(ROOT, "main.py"), "--no-gui", "--worker", self.connect_address,
+               "--worker-id", str(k), "--cams", ",".join(str(c) for c in self.shards[k])]
+        # La clave va por entorno (no en la línea de comandos, visible para otros usuarios)
+        env = {**os.environ, "SHARD_AUTHKEY": self.server.key.decode()}
+        self.procs[k] = subprocess.Popen(cmd, cwd=ROOT, stdin=subprocess.DEVNULL, env=env)
+        print(f"[INFO] Worker {k} lanzado (pid {self.procs[k].pid}) con cámaras {self.shards[k]}")
+
+    def _check_workers(self):
+        now = time.time()
+        for k, proc in enumerate(self.procs):
+            if proc is None:
+                if now >= self.next_start[k]:
+                    self._spawn(k)
+                continue
+            code = proc.poll()
+            if code is None:
+                continue
+            if code == AUTH_EXIT_CODE:
+                # Con la clave rechazada el worker volvería a fallar: no se relanza
+                print(f"[ERROR] Worker {k} terminó: el coordinador rechazó su SHARD_AUTHKEY. "
+                      f"Cámaras {self.shards[k]} sin procesar.")
+                self.procs[k] = None
+                self.next_start[k] = float("inf")
+                continue
+            delay = self.backoffs[k].next_delay()
+            self.restarts[k] += 1
+            print(f"[WARN] Worker {k} terminó (código {code}). Reinicio {self.restarts[k]} en {delay:.1f}s")
+            self.procs[k] = None
+            self.next_start[k] = now + delay
+
+    def _handle(self, message):
+        if message.get("type") == "events":
+            events = [e for e in message["events"] if self.dedup.is_new(e["event_id"])]
+            # Los duplicados entre cámaras (utils.handoff) se registran pero no suman ni se envían
+            unique = [e for e in events if not e.get("duplicate")]
+            for event in unique:
+                self.aggregator.add(event)
+            self.events += len(events)
+            self.event_logger.write(events)
+            if self.send_api:
+                send_events(unique)
+        elif message.get("type") == "metrics":
+            worker = message["worker"]
+            self.worker_metrics[worker] = message
+            # Un worker que vuelve a mandar métricas está estable: reiniciar su backoff
+            if 0 <= worker < len(self.backoffs):
+                self.backoffs[worker].reset()
+            if self.measure_from is not None and time.time() >= self.measure_from:
+                self.frames += sum(message["frames"].values())
+
+    def report(self):
+        print(f"[METRICS] Coordinador: {self.events} eventos, {self.dedup.duplicates} duplicados descartados, "
+              f"reinicios {self.restarts}")
+        for worker, m in sorted(self.worker_metrics.items()):
+            fps = sum(m["frames"].values()) / m["elapsed"] if m["elapsed"] else 0.0
+            print(f"[METRICS] Worker {worker}: {fps:.1f} fps ({m['connected']} cámaras conectadas)")
+        for terminal, counts in sorted(self.aggregator.report().items()):
+            print(f"[METRICS] Terminal {terminal}: {sum(counts.values())} {counts}")
+
+    def run(self, duration=None, warmup=0.0):
+        """
+        :param duration: Segundos a ejecutar (None = hasta Ctrl+C).
+        :param warmup: Segundos iniciales excluidos de la medición de throughput (carga de modelos).
+        :return: Resumen con fps totales medidos tras el warmup.
+        """
+        start = time.time()
+        self.measure_from = start + warmup
+        last_report = start
+        print(f"[INFO] Coordinador escuchando en {self.address} con {len(self.shards)} workers.")
+        try:
+            while duration is None or time.time() - start < duration:
+                self._check_workers()
+                message = self.server.get(timeout=0.5)
+                if message is not None:
+                    self._handle(message)
+                if time.time() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            print("[INFO] Interrupción de teclado recibida.")
+        finally:
+            self.stop()
+        measured = max(time.time() - self.measure_from, 1e-6)
+        return {"workers": len(self.shards), "cameras": sum(len(s) for s in self.shards),
+                "fps_total": self.frames / measured, "events": self.events,
+                "duplicates": self.dedup.duplicates, "restarts": sum(self.restarts)}
+
+    def stop(self):
+        for proc in self.procs:
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            if proc is not None:
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        self.server.close()
+        self.event_logger.close()
+
+def coordinator_from_config(config, num_workers=None, host=None, port=None):
+    """
+    Coordinador con la sección 'sharding' de config.yaml (los argumentos no nulos la sobrescriben).
+    Lo usan main.py --workers y este script.
+    """
+    shard_config = config.get("sharding", {})
+    return Coordinator(num_workers or shard_config.get("workers", 2), host or shard_config.get("host", "127.0.0.1"),
+                       shard_config.get("port", 6000) if port is None else port,
+                       event_log=config.get("event_log", "logs/count_events.jsonl"),
+                       report_interval=shard_config.get("report_interval", 30))
+
+def scaling_report(worker_counts, duration, warmup, out_path, send_api=False):
+    """
+    Ejecuta el coordinador con distinto número de workers (mismas cámaras) y compara throughput.
+    """
+    config = load_config("config.yaml")
+    results = []
+    for n in worker_counts:
+        print(f"\n[INFO] === Escalado: {n} workers, {duration}s (warmup {warmup}s) ===")
+        coordinator = Coordinator(n, event_log=os.path.join("logs", f"scaling_{n}w.jsonl"), send_api=send_api,
+                                  report_interval=config.get("keyframes", {}).get("metrics_interval", 10))
+        results.append(coordinator.run(duration=duration, warmup=warmup))
+
+    base = results[0] if results and results[0]["fps_total"] else None
+    print(f"\n{'workers':>7} {'cámaras':>8} {'fps total':>10} {'aceleración':>12} {'eficiencia':>11} {'reinicios':>10}")
+    for r in results:
+        speedup = r["fps_total"] / base["fps_total"] if base else 0.0
+        r["speedup"] = round(speedup, 2)
+        r["efficiency"] = round(speedup * base["workers"] / r["workers"], 2) if base else 0.0
+        print(f"{r['workers']:>7} {r['cameras']:>8} {r['fps_total']:>10.1f} {speedup:>11.2f}x "
+              f"{100 * r['efficiency']:>10.0f}% {r['restarts']:>10}")
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[INFO] Reporte de escalado guardado en {out_path}")
+
+if __name__ == "__main__":
+    config = load_config("config.yaml")
+    shard_config = config.get("sharding", {})
+
+    parser = argparse.ArgumentParser(description="Coordinador: reparte las cámaras entre procesos worker")
+    parser.add_argument("--workers", type=int, default=shard_config.get("workers", 2))
+    parser.add_argument("--host", default=shard_config.get("host", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=shard_config.get("port", 6000))
+    parser.add_argument("--scaling", type=int, nargs="+", default=None,
+                        help="Medir throughput con estos números de workers (ej. 1 2 4)")
+    parser.add_argument("--duration", type=float, default=120, help="Segundos por medición de escalado")
+    parser.add_argument("--warmup", type=float, default=30, help="Segundos iniciales excluidos de la medición")
+    parser.add_argument("--out", default="runs/scaling/report.json")
+    args = parser.parse_args()
+
+    if args.scaling:
+        # El reporte de escalado no envía a la API (se repiten los mismos videos/cámaras)
+        scaling_report(args.scaling, args.duration, args.warmup, args.out)
+    else:
+        coordinator_from_config(config, args.workers, args.host, args.port).run()
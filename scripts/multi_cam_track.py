@@ -1,11 +1,10 @@
 import cv2
+import datetime
 import threading
 import os
 import time
 import numpy as np
-import torch
 from dotenv import load_dotenv
-from ultralytics import YOLO
 import sys
 
 # Añadir el directorio raíz al path para poder importar utils si fuera necesario
@@ -13,7 +12,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.utils import load_config, get_device
 from utils.counter import LineCounter
-from utils.api_client import send_count_data
+from utils.api_client import send_counts
+from utils.detections import DetectionBatch
+from utils.display import GridRenderer
+from utils.event_log import EventLogger, build_events
+from utils.handoff import HandoffMatcher
+from utils.zones import ZoneEngine
+from utils.recorder import ClipRecorder
+from utils.resolution import ResolutionTiers
+from utils.config_watch import ConfigWatcher, camera_settings, diff_cameras, restart_required
+from utils.snapshot import SnapshotWriter, counter_state, load_snapshot, restore_counter
+from utils.capture import create_capture, substream_url
+from utils.connection import Backoff, ConnectionMonitor, CONNECTING, CONNECTED, BACKOFF, STALLED, STOPPED
 
 # Cargar variables de entorno desde .env (forzando ruta raíz)
 dotenv_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.env'))
@@ -25,77 +35,299 @@ class RTSPStream:
     """
     Clase para leer streams RTSP en un hilo separado.
     Esto evita que el procesamiento de frames bloquee la lectura y cause latencia/lag.
+
+    La conexión sigue la máquina de estados de utils.connection: el primer reintento tras
+    una caída es inmediato y los siguientes usan backoff exponencial con jitter. Un watchdog
+    detecta streams congelados (read() que no vuelve) y lanza un lector nuevo; el lector
+    bloqueado queda descartado por su número de generación y libera su captura cuando su
+    read() vuelve. Si ya hay max_stuck_readers lectores bloqueados sin terminar (OpenCV no
+    permite interrumpir un read()), no se lanzan más hasta que alguno termine.
     """
-    def __init__(self, url, cam_id):
+    def __init__(self, url, cam_id, open_timeout=5.0, read_timeout=3.0, backoff_base=0.5, backoff_max=30.0,
+                 backoff_jitter=0.2, capture=None, keyframe_interval=10.0, max_stuck_readers=2):
+        """
+        :param capture: Opciones del backend de captura (utils.capture): backend, width, height,
+                        threads, substream_replace. None = OpenCV sin escalar.
+        :param keyframe_interval: Segundos máximos entre keyframes del stream. En modo inactivo solo
+                                  llegan keyframes, así que el watchdog los espera además de read_timeout.
+        """
         self.url = url
         self.cam_id = cam_id
-        self.cap = cv2.VideoCapture(self.url)
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.keyframe_interval = keyframe_interval
+        self.capture = dict(capture or {})
+        self.idle = False # Decodificar solo keyframes (cámara sin actividad)
+        self.cap = None # Se abre en el hilo de lectura para no bloquear el arranque
         self.frame = None
+        self.frame_seq = 0 # Número de secuencia del último frame leído
         self.stopped = False
-        self.connected = self.cap.isOpened()
-        if not self.connected:
-            print(f"[ERROR] No se pudo conectar a la cámara {cam_id}")
-        else:
-            print(f"[INFO] Conectado a cámara {cam_id}")
-        
+        self.created = time.perf_counter()
+        self.connect_time = None # Segundos desde la creación hasta la primera conexión
+        self.last_activity = self.created # Último frame recibido o inicio del intento de conexión actual
+
+        self.monitor = ConnectionMonitor(cam_id)
+        self.backoff = Backoff(backoff_base, backoff_max, backoff_jitter)
+        self.generation = 0 # Se incrementa al abandonar un lector bloqueado
+        self.max_stuck_readers = max_stuck_readers
+        self.stuck_readers = [] # Lectores abandonados cuyo read() aún no volvió
         self.lock = threading.Lock()
-        self.t = threading.Thread(target=self.update, args=())
-        self.t.daemon = True # El hilo muere si el programa principal muere
+        self.wake = threading.Event() # Interrumpe la espera de backoff al detener
+        self.t = self._spawn_reader()
+        self.watchdog = threading.Thread(target=self._watchdog, daemon=True)
+
+    @property
+    def connected(self):
+        return self.monitor.state == CONNECTED
 
     def start(self):
-        if self.connected:
-            self.t.start()
+        self.t.start()
+        self.watchdog.start()
         return self
 
-    def update(self):
-        while not self.stopped:
-            if not self.connected:
-                # Intentar reconexión básica
-                time.sleep(5)
+    def _spawn_reader(self):
+        return threading.Thread(target=self.update, args=(self.generation,), daemon=True) # El hilo muere si el programa principal muere
+
+    def _open(self):
+        """
+        Abre la captura con el backend configurado y timeouts de apertura/lectura.
+        """
+        options = dict(self.capture)
+        backend = options.pop("backend", "opencv")
+        url = substream_url(self.url, options.pop("substream_replace", None))
+        cap = create_capture(url, backend, open_timeout=self.open_timeout, read_timeout=self.read_timeout, **options)
+        if self.idle:
+            cap.set_idle(True)
+        return cap
+
+    def set_idle(self, idle):
+        """
+        Cámara inactiva: el decodificador solo entrega keyframes (si el backend lo permite).
+        """
+        if idle != self.idle:
+            self.idle = idle
+            cap = self.cap
+            if cap is not None:
+                cap.set_idle(idle)
+
+    def update(self, generation):
+        cap = None
+        while not self.stopped and generation == self.generation:
+            if cap is None:
+                self.monitor.set_state(CONNECTING)
+                self.last_activity = time.perf_counter()
                 try:
-                    self.cap.release()
-                    self.cap = cv2.VideoCapture(self.url)
-                    self.connected = self.cap.isOpened()
-                    if self.connected:
-                        print(f"[INFO] Reconectado a cámara {self.cam_id}")
-                except Exception:
-                    pass
-                continue
+                    cap = self._open()
+                except Exception as e:
+                    print(f"[ERROR] Excepción al abrir cámara {self.cam_id}: {e}")
+                    cap = None
+                if generation != self.generation:
+                    break # El watchdog ya lanzó otro lector
+                if cap is None or not cap.isOpened():
+                    if cap is not None:
+                        cap.release()
+                        cap = None
+                    self.monitor.lost(BACKOFF)
+                    delay = self.backoff.next_delay()
+                    print(f"[ERROR] No se pudo conectar a la cámara {self.cam_id}. Reintento en {delay:.1f}s")
+                    self.wake.wait(delay)
+                    continue
+
+                self.cap = cap
+                self.last_activity = time.perf_counter()
+                latency = self.monitor.connected()
+                if self.connect_time is None:
+                    self.connect_time = time.perf_counter() - self.created
+                    print(f"[INFO] Conectado a cámara {self.cam_id} ({self.connect_time:.1f}s)")
+                else:
+                    print(f"[INFO] Reconectado a cámara {self.cam_id} (sin señal {latency or 0:.1f}s)")
 
-            grabbed, frame = self.cap.read()
+            grabbed, frame = cap.read()
+            if generation != self.generation:
+                break
             if not grabbed:
-                self.connected = False
                 print(f"[WARN] Señal perdida de cámara {self.cam_id}")
+                if self.cap is cap:
+                    self.cap = None # set_idle / el watchdog no deben tocar una captura liberada
+                cap.release()
+                cap = None
+                self.monitor.lost(BACKOFF)
+                self.wake.wait(self.backoff.next_delay()) # 0 en el primer reintento
                 continue
-            
+
+            # El backoff solo se reinicia cuando la conexión entrega frames (no al abrir),
+            # para que una cámara que abre y cae enseguida no reintente en bucle
+            if self.backoff.attempt:
+                self.backoff.reset()
+            if self.monitor.state != CONNECTED:
+                self.monitor.connected() # Un read() lento que volvió mientras no se relanzaba el lector
             # Solo guardamos el último frame, descartando los anteriores para mantener tiempo real
+            self.last_activity = time.perf_counter()
             with self.lock:
                 self.frame = frame
+                self.frame_seq += 1
+
+        if cap is not None:
+            # El lector libera su propia captura al terminar (también si fue abandonado)
+            if self.cap is cap:
+                self.cap = None
+            cap.release()
+
+    def _watchdog(self):
+        """
+        Detecta lectores bloqueados: sin frames durante read_timeout estando conectada, o una
+        apertura que supera open_timeout (con margen, por si el backend ignora los timeouts).
+        """
+        while not self.stopped:
+            self.wake.wait(0.5)
+            state = self.monitor.state
+            silence = time.perf_counter() - self.last_activity
+            read_timeout = self.read_timeout + (self.keyframe_interval if self.idle else 0)
+            # STALLED: se dejó de relanzar por lectores bloqueados; se reintenta cuando alguno termine
+            frozen = state in (CONNECTED, STALLED) and silence > read_timeout
+            hung = state == CONNECTING and silence > self.open_timeout * 2
+            if not (frozen or hung):
+                continue
+            self.stuck_readers = [t for t in self.stuck_readers if t.is_alive()]
+            if len(self.stuck_readers) >= self.max_stuck_readers:
+                if self.monitor.state != STALLED:
+                    print(f"[ERROR] Cámara {self.cam_id}: {len(self.stuck_readers)} lectores bloqueados sin liberar "
+                          f"su captura. No se lanza otro hasta que alguno termine.")
+                    self.monitor.lost(STALLED)
+                continue
+            print(f"[WARN] Cámara {self.cam_id} {'congelada' if frozen else 'sin responder al conectar'} "
+                  f"({silence:.1f}s). Relanzando lector.")
+            self.monitor.lost(STALLED)
+            self.generation += 1
+            cap = self.cap # Una sola lectura: el lector puede poner self.cap a None en cualquier momento
+            if cap is not None:
+                cap.abort() # Desbloquea el read() del lector anterior si el backend lo permite
+            self.t.join(timeout=0.5)
+            if self.t.is_alive():
+                self.stuck_readers.append(self.t)
+            self.last_activity = time.perf_counter()
+            self.t = self._spawn_reader()
+            self.t.start()
 
     def read(self):
         with self.lock:
             return self.frame
 
+    def read_seq(self):
+        """
+        Devuelve (frame_seq, frame) para saber si el frame es nuevo desde la última lectura.
+        """
+        with self.lock:
+            return self.frame_seq, self.frame
+
     def stop(self):
         self.stopped = True
+        self.wake.set()
         if self.t.is_alive():
-            self.t.join()
-        self.cap.release()
+            # Un open()/read() de RTSP en curso puede tardar; no se espera indefinidamente
+            self.t.join(timeout=2)
+        self.monitor.set_state(STOPPED)
 
-def main(video_source=None, headless=False):
+def camera_urls():
+    """
+    Lee las URLs RTSP del .env: lista RTSP_CAMERAS separada por comas o, si no existe,
+    el formato antiguo RTSP_CAM_1, RTSP_CAM_2...
+    :return: Lista de (cam_id, url) con cam_id empezando en 1.
+    """
+    # Intentar leer formato de lista separada por comas (RTSP_CAMERAS)
+    cameras_env = os.getenv("RTSP_CAMERAS")
+    print(f"[DEBUG] Valor crudo de RTSP_CAMERAS: {cameras_env}")
+
+    if cameras_env:
+        # Dividir por comas y limpiar
+        urls = [u.strip().strip('"').strip("'") for u in cameras_env.split(',') if u.strip()]
+        return list(enumerate(urls, 1))
+
+    # Fallback a formato antiguo RTSP_CAM_1, RTSP_CAM_2...
+    cameras = []
+    i = 1
+    while True:
+        url = os.getenv(f"RTSP_CAM_{i}")
+        if not url:
+            break
+        url = url.strip('"').strip("'")
+        if url:
+            cameras.append((i, url))
+        i += 1
+    return cameras
+
+def main(video_source=None, headless=False, cameras=None, shard=None):
     """
     Función principal de tracking multi-cámara.
     :param video_source: Ruta a un archivo de video local para pruebas. Si es None, usa RTSP desde .env.
     :param headless: Si es True, no muestra la interfaz gráfica (útil para servidores o ejecución en background).
+    :param cameras: IDs de cámara a procesar (modo worker). None = todas las del .env.
+    :param shard: ShardClient del coordinador (modo worker): los eventos y métricas se envían
+                  al coordinador, que es quien registra y envía a la API.
     """
     if headless:
         print("[INFO] Ejecutando en modo HEADLESS (Sin interfaz gráfica).")
         print("[INFO] El sistema procesará video y enviará datos a la API en segundo plano.")
         print("[INFO] Presione Ctrl+C para detener.")
 
-    # 1. Cargar Configuración y Modelo
+    startup = time.perf_counter()
     config = load_config("config.yaml")
+
+    # 1. Inicializar Cámaras (la conexión ocurre en segundo plano, en paralelo a la carga del modelo)
+    streams = []
+    conn_config = config.get("camera_connection", {})
+    conn_kwargs = {"open_timeout": conn_config.get("open_timeout", 5.0),
+                   "read_timeout": conn_config.get("read_timeout", 3.0),
+                   "backoff_base": conn_config.get("backoff_base", 0.5),
+                   "backoff_max": conn_config.get("backoff_max", 30.0),
+                   "backoff_jitter": conn_config.get("backoff_jitter", 0.2),
+                   "max_stuck_readers": conn_config.get("max_stuck_readers", 2)}
+
+    # Backend de captura (OpenCV por defecto; PyAV / ffmpeg con escalado en el decodificador)
+    capture_config = config.get("capture", {})
+    idle_after = capture_config.get("idle_after", 0)
+    def capture_options(cam_id):
+        options = {k: v for k, v in capture_config.items() if k not in ("idle_after", "keyframe_interval")}
+        cam_settings = (config.get("cameras") or {}).get(cam_id) or {}
+        if cam_settings.get("decode_threads") is not None:
+            options["threads"] = cam_settings["decode_threads"]
+        return options
+    conn_kwargs["keyframe_interval"] = capture_config.get("keyframe_interval", 10.0)
     
+    if video_source:
+        print(f"[INFO] MODO PRUEBA: Usando archivo de video: {video_source}")
+        print(f"[INFO] Se usará la configuración de la Cámara 1 para conteo y API.")
+        # Creamos un único stream con el video y ID=1
+        stream = RTSPStream(video_source, 1, capture=capture_options(1), **conn_kwargs)
+        streams.append(stream)
+    else:
+        # Modo Normal: Leer RTSP desde .env
+        for i, url in camera_urls():
+            if cameras is not None and i not in cameras:
+                continue # Cámara asignada a otro worker
+            print(f"[INFO] Inicializando cámara {i}...")
+            stream = RTSPStream(url, i, capture=capture_options(i), **conn_kwargs)
+            streams.append(stream)
+
+        if not streams:
+            print("[ERROR] No se encontraron cámaras configuradas en el archivo .env (Variable RTSP_CAMERAS o RTSP_CAM_X)")
+            return
+
+    # Iniciar hilos de conexión + lectura (no bloquean)
+    for stream in streams:
+        stream.start()
+
+    # 2. Cargar Modelo mientras las cámaras conectan.
+    # Los imports pesados (torch / ultralytics) se hacen aquí para no retrasar la conexión.
+    import torch
+    from ultralytics import YOLO
+    from utils.tracking import (create_tracker, predict_bucketed, tracker_state, restore_tracker, max_track_id,
+                                reserve_track_ids)
+    from utils.propagation import KeyframeTracker
+    from utils.cascade import CascadeDetector
+    from utils.pipeline import PipelinedDetector
+    from utils.scheduler import ActivityScheduler
+
     # --- OPTIMIZACIÓN GPU ---
     device = get_device(config.get("device"))
     if device != "cpu":
@@ -111,85 +343,142 @@ def main(video_source=None, headless=False):
     
     print(f"[INFO] Cargando modelo: {model_path}")
     model = YOLO(model_path)
+    model_ready = time.perf_counter() - startup
+
+    # Warmup con un lote ficticio del tamaño de producción para no pagar la inicialización
+    # (kernels CUDA, asignación de memoria) con los primeros frames reales
+    warmup_batch = len(streams)
+    if config.get("scheduler", {}).get("enabled"):
+        warmup_batch = min(warmup_batch, config["scheduler"].get("batch_size", 4))
+
+    # Resolución de inferencia por cámara: 'imgsz' propio en 'cameras' y escalones automáticos
+    res_config = config.get("resolution", {})
+    resolution = ResolutionTiers(default=config.get("imgsz", 640), tiers=res_config.get("tiers", [320, 480, 640]),
+                                 auto=res_config.get("auto", False), min_box_px=res_config.get("min_box_px", 48),
+                                 window=res_config.get("window", 30))
+    warmup_sizes = {int(s.get("imgsz") or resolution.default) for s in camera_settings(config).values()}
+    warmup_sizes.add(resolution.default)
+    if resolution.auto:
+        warmup_sizes.update(t for t in resolution.tiers if t <= max(warmup_sizes))
+
+    # En modo pipeline la inferencia no pasa por model.predict: el warmup lo hace PipelinedDetector
+    if config.get("pipeline", {}).get("enabled"):
+        warmup_sizes = set()
+
+    warmup_start = time.perf_counter()
+    dummy = [np.zeros((720, 1280, 3), dtype=np.uint8)] * warmup_batch
+    for size in sorted(warmup_sizes):
+        model.predict(source=dummy, imgsz=size, device=device, verbose=False)
+    if warmup_sizes:
+        print(f"[INFO] Modelo listo en {model_ready:.1f}s (warmup lote {warmup_batch}, imgsz {sorted(warmup_sizes)}: "
+              f"{time.perf_counter() - warmup_start:.1f}s). Cámaras conectadas: "
+              f"{sum(stream.connected for stream in streams)}/{len(streams)}")
 
     # Inicializar contadores por cámara según config
     counters = {}
+    terminals = {} # cam_id -> terminal_id para la API
+    zone_engines = {}
     cam_configs = config.get("cameras", {})
     print(f"[DEBUG] Configuración de cámaras encontrada: {cam_configs}") # DEBUG
-    
-    if cam_configs:
-        for cam_id_str, settings in cam_configs.items():
-            if not settings: continue
-            line_coords = settings.get("line")
-            terminal_id = settings.get("terminal_id") # ID para la API
-            
-            if line_coords:
-                # Asegurar enteros
-                start_pt = (int(line_coords[0]), int(line_coords[1]))
-                end_pt = (int(line_coords[2]), int(line_coords[3]))
-                
-                # Definir callback para API si hay terminal_id
-                callback = None
-                if terminal_id:
-                    # Usamos una función lambda o closure para capturar el terminal_id actual
-                    # Necesitamos forzar el valor de terminal_id=terminal_id para que no tome el último del bucle
-                    def make_callback(tid):
-                        return lambda label: send_count_data(tid, label)
-                    callback = make_callback(terminal_id)
-                    print(f"[INFO] API Callback configurado para cámara {cam_id_str} (ID: {terminal_id})")
-                else:
-                    print(f"[WARN] Cámara {cam_id_str} no tiene 'terminal_id'. No se enviarán datos a API.")
 
-                counters[int(cam_id_str)] = LineCounter(start_pt, end_pt, model.names, on_count_callback=callback)
-                print(f"[INFO] Contador configurado para cámara {cam_id_str}: {start_pt} -> {end_pt}")
+    def prepare_camera(cam_id, settings, previous=None):
+        """
+        Convierte los ajustes de una cámara sin tocar el estado en uso: todo lo que puede fallar
+        ocurre aquí, así una recarga en caliente se aplica completa o no se aplica.
+        :param previous: Ajustes anteriores de la cámara (recarga en caliente): si las zonas no
+                         cambian se conserva su motor (ocupación y permanencia en curso).
+        :return: Diccionario con imgsz, terminal_id, línea ((x1, y1), (x2, y2)) y motor de zonas.
+        """
+        line_coords = settings.get("line")
+        prepared = {"imgsz": int(settings["imgsz"]) if settings.get("imgsz") else None,
+                    "terminal_id": settings.get("terminal_id"), # ID para la API
+                    "line": None, "zones": None}
+        if line_coords:
+            # Asegurar enteros
+            prepared["line"] = ((int(line_coords[0]), int(line_coords[1])), (int(line_coords[2]), int(line_coords[3])))
+        # Zonas poligonales (ocupación, entradas/salidas y permanencia)
+        if settings.get("zones"):
+            if cam_id in zone_engines and (previous or {}).get("zones") == settings["zones"]:
+                prepared["zones"] = zone_engines[cam_id]
             else:
-                print(f"[WARN] Cámara {cam_id_str} no tiene 'line' configurada.")
-    else:
-        print("[WARN] No se encontró sección 'cameras' en config.yaml o está vacía.")
+                prepared["zones"] = ZoneEngine(settings["zones"])
+        return prepared
+
+    def install_camera(cam_id, prepared):
+        """
+        Crea o actualiza el contador, el terminal de la API y las zonas de una cámara. Si solo
+        cambia la línea, el contador conserva sus totales, ids contados e historia.
+        """
+        if prepared["imgsz"] or cam_id in resolution.base:
+            resolution.set_camera(cam_id, prepared["imgsz"])
+
+        if prepared["line"]:
+            start_pt, end_pt = prepared["line"]
+            terminal_id = prepared["terminal_id"]
+
+            # Los conteos de cada frame se envían a la API en bloque desde el bucle principal
+            if terminal_id:
+                terminals[cam_id] = terminal_id
+                print(f"[INFO] Envío a API configurado para cámara {cam_id} (ID: {terminal_id})")
+            else:
+                terminals.pop(cam_id, None)
+                print(f"[WARN] Cámara {cam_id} no tiene 'terminal_id'. No se enviarán datos a API.")
 
-    # 2. Inicializar Cámaras
-    streams = []
-    
-    if video_source:
-        print(f"[INFO] MODO PRUEBA: Usando archivo de video: {video_source}")
-        print(f"[INFO] Se usará la configuración de la Cámara 1 para conteo y API.")
-        # Creamos un único stream con el video y ID=1
-        stream = RTSPStream(video_source, 1)
-        streams.append(stream)
-    else:
-        # Modo Normal: Leer RTSP desde .env
-        # Intentar leer formato de lista separada por comas (RTSP_CAMERAS)
-        cameras_env = os.getenv("RTSP_CAMERAS")
-        print(f"[DEBUG] Valor crudo de RTSP_CAMERAS: {cameras_env}")
-        
-        if cameras_env:
-            # Dividir por comas y limpiar
-            urls = [u.strip().strip('"').strip("'") for u in cameras_env.split(',') if u.strip()]
-            for i, url in enumerate(urls, 1):
-                print(f"[INFO] Inicializando cámara {i}...")
-                stream = RTSPStream(url, i)
-                streams.append(stream)
+            if cam_id in counters:
+                counters[cam_id].start_point, counters[cam_id].end_point = start_pt, end_pt
+            else:
+                counters[cam_id] = LineCounter(start_pt, end_pt, model.names)
+            print(f"[INFO] Contador configurado para cámara {cam_id}: {start_pt} -> {end_pt}")
         else:
-            # Fallback a formato antiguo RTSP_CAM_1, RTSP_CAM_2...
-            i = 1
-            while True:
-                url = os.getenv(f"RTSP_CAM_{i}")
-                if not url:
-                    break
-                url = url.strip('"').strip("'")
-                if url:
-                    print(f"[INFO] Inicializando cámara {i}...")
-                    stream = RTSPStream(url, i)
-                    streams.append(stream)
-                i += 1
+            counters.pop(cam_id, None)
+            terminals.pop(cam_id, None)
+            print(f"[WARN] Cámara {cam_id} no tiene 'line' configurada.")
 
-        if not streams:
-            print("[ERROR] No se encontraron cámaras configuradas en el archivo .env (Variable RTSP_CAMERAS o RTSP_CAM_X)")
-            return
+        if prepared["zones"] is None:
+            zone_engines.pop(cam_id, None)
+        elif zone_engines.get(cam_id) is not prepared["zones"]:
+            zone_engines[cam_id] = prepared["zones"]
+            print(f"[INFO] {len(prepared['zones'].names)} zonas configuradas para cámara {cam_id}")
 
-    # Iniciar hilos de lectura
-    for stream in streams:
-        stream.start()
+    if cam_configs:
+        for cam_id, settings in camera_settings(config).items():
+            install_camera(cam_id, prepare_camera(cam_id, settings))
+    else:
+        print("[WARN] No se encontró sección 'cameras' en config.yaml o está vacía.")
+
+    # Registro local de eventos de conteo (JSON Lines)
+    event_logger = None if shard else EventLogger(config.get("event_log", "logs/count_events.jsonl"))
+
+    # Snapshots del estado de conteo y tracking (reinicio en caliente tras una caída o un despliegue)
+    snapshots = None
+    restored_trackers = {} # cam_id -> estado del tracker pendiente de aplicar al crearlo
+    restored_max_id = 0 # Último id de track asignado en la ejecución anterior
+    resumed = None # False = estado restaurado y aún sin contar; True = conteo reanudado
+    snap_config = config.get("snapshots", {})
+    if snap_config.get("enabled"):
+        snap_path = snap_config.get("path", "snapshots/state.npz")
+        if shard:
+            # Un snapshot por worker (cada uno tiene sus propias cámaras)
+            root, ext = os.path.splitext(snap_path)
+            snap_path = f"{root}_w{shard.worker_id}{ext}"
+        load_start = time.perf_counter()
+        states, meta = load_snapshot(snap_path, snap_config.get("max_age", 300))
+        if states is None:
+            print(f"[INFO] No se restaura estado previo ({snap_path}: {meta}).")
+        else:
+            restored_max_id = meta["max_track_id"]
+            for cam_id, state in states.items():
+                if cameras is not None and cam_id not in cameras:
+                    continue # Cámara de otro worker
+                if cam_id in counters:
+                    restore_counter(counters[cam_id], state)
+                tracker = {key.split("/", 1)[1]: value for key, value in state.items() if key.startswith("tracker/")}
+                if tracker:
+                    restored_trackers[cam_id] = tracker
+            resumed = False
+            print(f"[INFO] Estado restaurado de {snap_path} (de hace {meta['age']:.0f}s): {len(states)} cámaras "
+                  f"en {1000 * (time.perf_counter() - load_start):.1f} ms")
+        snapshots = SnapshotWriter(snap_path, snap_config.get("interval", 10))
 
     print("[INFO] Iniciando bucle principal de procesamiento...")
     
@@ -197,29 +486,260 @@ def main(video_source=None, headless=False):
     # Calculamos el tamaño del grid (ej. 7 cams -> 3x3 grid)
     num_cams = len(streams)
     cols = 3 # Configurable: número de columnas
-    rows = (num_cams + cols - 1) // cols
     
     # Tamaño objetivo para redimensionar cada cámara en el grid
     target_w, target_h = 640, 360 
 
+    # Parámetros de inferencia y tracking (un tracker independiente por cámara)
+    conf_threshold = config.get("conf_threshold", 0.25)
+    iou_threshold = config.get("iou_threshold", 0.45)
+    tracker_type = config.get("tracker_type", "bytetrack.yaml")
+
+    # Detección cada k frames con propagación de cajas entre keyframes (opcional)
+    kf_config = config.get("keyframes", {})
+    if kf_config.get("enabled"):
+        print(f"[INFO] Modo keyframes activo: detección cada {kf_config.get('k_min', 1)}-{kf_config.get('k_max', 6)} frames.")
+
+    # Cascada de modelos (opcional): nano en todos los frames, el modelo principal solo en frames ambiguos
+    cascade = None
+    cascade_config = config.get("cascade", {})
+    if cascade_config.get("enabled"):
+        fast_path = cascade_config.get("fast_model", "yolov8n.pt")
+        if not os.path.exists(fast_path) and fast_path.endswith("best.pt"):
+            print(f"[WARN] No se encontró el modelo rápido {fast_path}, usando yolov8n.pt base")
+            fast_path = "yolov8n.pt"
+        print(f"[INFO] Cascada activa: rápido={fast_path}, preciso={model_path}")
+        cascade = CascadeDetector(YOLO(fast_path), model, conf=conf_threshold, iou=iou_threshold, device=device,
+                                  conf_band=tuple(cascade_config.get("conf_band", [0.15, 0.5])),
+                                  line_margin=cascade_config.get("line_margin", 40))
+
+    # Ejecución en pipeline (opcional): preproceso, inferencia y postproceso solapados en hilos
+    pipeline = None
+    pipeline_config = config.get("pipeline", {})
+    if pipeline_config.get("enabled"):
+        if kf_config.get("enabled") or cascade or resolution.auto or resolution.base:
+            print("[WARN] El modo pipeline detecta en todos los frames con un solo modelo y un único imgsz: "
+                  "se ignoran 'keyframes', 'cascade' y la resolución por cámara.")
+            kf_config = {**kf_config, "enabled": False}
+            cascade = None
+        warmup_start = time.perf_counter()
+        pipeline = PipelinedDetector(model, streams, imgsz=config.get("imgsz", 640), conf=conf_threshold,
+                                     iou=iou_threshold, device=device,
+                                     queue_size=pipeline_config.get("queue_size", 2)).warmup()
+        print(f"[INFO] Modelo listo en {model_ready:.1f}s (warmup pipeline lote {len(streams)}, "
+              f"imgsz {pipeline.imgsz}: {time.perf_counter() - warmup_start:.1f}s). Cámaras conectadas: "
+              f"{sum(stream.connected for stream in streams)}/{len(streams)}")
+        pipeline.start()
+        print("[INFO] Modo pipeline activo (preproceso / inferencia / postproceso en paralelo).")
+
+    # Planificador por actividad (opcional): lotes de tamaño fijo con las cámaras más prioritarias
+    scheduler = None
+    sched_config = config.get("scheduler", {})
+    if sched_config.get("enabled"):
+        if pipeline:
+            print("[WARN] El planificador no se aplica en modo pipeline (el pipeline agrupa todas las cámaras).")
+        else:
+            scheduler = ActivityScheduler(batch_size=sched_config.get("batch_size", 4),
+                                          min_fps=sched_config.get("min_fps", 2.0),
+                                          max_fps=sched_config.get("max_fps", 30.0),
+                                          weights=sched_config.get("weights"),
+                                          line_margin=sched_config.get("line_margin", 80))
+            for stream in streams:
+                cam_settings = (cam_configs or {}).get(stream.cam_id) or {}
+                counter = counters.get(stream.cam_id)
+                scheduler.add_camera(stream.cam_id, min_fps=cam_settings.get("min_fps"),
+                                     max_fps=cam_settings.get("max_fps"),
+                                     line=(counter.start_point, counter.end_point) if counter else None)
+            print(f"[INFO] Planificador activo: lotes de {scheduler.batch_size} cámaras.")
+    # Con planificador el lote de inferencia tiene tamaño fijo (se rellena si hay menos cámaras)
+    pad_to = scheduler.batch_size if scheduler else None
+    if cascade:
+        cascade.pad_to = pad_to
+
+    # Deduplicación entre cámaras (opcional): un paquete que pasa por varias cámaras cuenta una vez
+    handoff = None
+    handoff_config = config.get("handoff", {})
+    if handoff_config.get("enabled") and handoff_config.get("pairs"):
+        handoff = HandoffMatcher(handoff_config["pairs"], bins=handoff_config.get("bins", [8, 4, 4]),
+                                 capacity=handoff_config.get("capacity", 4096))
+        print(f"[INFO] Deduplicación entre cámaras activa: {handoff.groups()}")
+
+    # Clips de evidencia (opcional): buffer JPEG en memoria por cámara y clip pre/post de cada conteo
+    recorder = None
+    clips_config = config.get("clips", {})
+    if clips_config.get("enabled"):
+        recorder = ClipRecorder(out_dir=clips_config.get("dir", "clips"),
+                                pre_seconds=clips_config.get("pre_seconds", 5),
+                                post_seconds=clips_config.get("post_seconds", 3),
+                                quality=clips_config.get("quality", 70), width=clips_config.get("width", 640),
+                                max_mb_per_camera=clips_config.get("max_mb_per_camera", 32),
+                                encode_threads=clips_config.get("encode_threads", 1),
+                                workers=clips_config.get("workers", 2))
+        print(f"[INFO] Clips de evidencia activos en '{recorder.out_dir}' "
+              f"({recorder.pre_seconds:.0f}s antes / {recorder.post_seconds:.0f}s después). Tecla 'r': clip manual.")
+
+    def build_cam_tracker(cam_id):
+        tracker = create_tracker(tracker_type)
+        if cam_id in restored_trackers:
+            try:
+                restore_tracker(tracker, restored_trackers.pop(cam_id))
+            except Exception as e:
+                print(f"[WARN] CAM {cam_id}: no se pudo restaurar el tracker ({e}). Se empieza de cero.")
+        if kf_config.get("enabled"):
+            counter = counters.get(cam_id)
+            line = (counter.start_point, counter.end_point) if counter else None
+            return KeyframeTracker(tracker, kf_config.get("k_min", 1), kf_config.get("k_max", 6),
+                                   line=line, line_margin=kf_config.get("line_margin", 60))
+        return KeyframeTracker(tracker, 1, 1)
+
+    # Todos los trackers se crean antes del bucle: una cámara que conecta tarde no debe crear
+    # el suyo mientras las demás ya están asignando ids
+    cam_trackers = {stream.cam_id: build_cam_tracker(stream.cam_id) for stream in streams}
+    # Continuar desde el último id del snapshot una vez creados los trackers (el constructor de
+    # Ultralytics reinicia el contador global)
+    reserve_track_ids(restored_max_id)
+
+    def apply_config(new_config):
+        """
+        Aplica una configuración recargada entre dos frames: contadores, líneas, zonas y
+        terminales de las cámaras añadidas, eliminadas o modificadas, y conf / iou. Las cámaras
+        sin cambios y el modelo cargado no se tocan. Si algo falla al preparar los cambios se
+        mantiene la configuración anterior.
+        """
+        nonlocal config, last_config, cam_configs, conf_threshold, iou_threshold
+        apply_start = time.perf_counter()
+        # Los cambios no recargables se comparan con la última versión vista del archivo, no con la
+        # aplicada: si no, se avisaría de ellos de nuevo en cada guardado posterior
+        pending_restart = restart_required(last_config, new_config)
+        last_config = new_config
+        if pending_restart:
+            print(f"[WARN] Cambios en {pending_restart} requieren reiniciar main.py (no se aplican en caliente).")
+
+        added, removed, changed = diff_cameras(config, new_config)
+        old_settings, new_settings = camera_settings(config), camera_settings(new_config)
+        try:
+            prepared = {cam_id: prepare_camera(cam_id, new_settings[cam_id], old_settings.get(cam_id))
+                        for cam_id in added + changed}
+            new_conf = float(new_config.get("conf_threshold", 0.25))
+            new_iou = float(new_config.get("iou_threshold", 0.45))
+            fps_limits = {cam_id: (float(new_settings.get(cam_id, {}).get("min_fps") or scheduler.min_fps),
+                                   float(new_settings.get(cam_id, {}).get("max_fps") or scheduler.max_fps))
+                          for cam_id in added + removed + changed} if scheduler else {}
+        except Exception as e:
+            print(f"[WARN] Recarga de config.yaml no aplicada ({e}). Se mantiene la configuración anterior.")
+            return
+
+        for cam_id in removed:
+            counters.pop(cam_id, None)
+            terminals.pop(cam_id, None)
+            zone_engines.pop(cam_id, None)
+            resolution.set_camera(cam_id)
+            print(f"[INFO] Cámara {cam_id} eliminada de la configuración: deja de contar.")
+        for cam_id in added + changed:
+            install_camera(cam_id, prepared[cam_id])
+
+        # Las líneas también guían los keyframes y el planificador
+        for cam_id in added + removed + changed:
+            counter = counters.get(cam_id)
+            line = (counter.start_point, counter.end_point) if counter else None
+            if cam_id in cam_trackers and kf_config.get("enabled"):
+                cam_trackers[cam_id].line = line
+            if scheduler and cam_id in scheduler.cameras:
+                state = scheduler.cameras[cam_id]
+                state.line = line
+                state.min_fps, state.max_fps = fps_limits[cam_id]
+
+        conf_threshold, iou_threshold = new_conf, new_iou
+        for detector in (cascade, pipeline):
+            if detector:
+                detector.conf, detector.iou = conf_threshold, iou_threshold
+
+        config = {**config, **{key: new_config.get(key) for key in ("cameras", "conf_threshold", "iou_threshold")}}
+        cam_configs = config.get("cameras", {})
+        print(f"[INFO] Configuración recargada en {1000 * (time.perf_counter() - apply_start):.1f} ms: "
+              f"cámaras añadidas {added}, eliminadas {removed}, modificadas {changed}, "
+              f"conf={conf_threshold}, iou={iou_threshold}")
+
+    # Recarga en caliente de config.yaml (opcional)
+    watcher = None
+    last_config = config # Última versión leída del archivo (config es la aplicada)
+    reload_config = config.get("config_reload", {})
+    if reload_config.get("enabled"):
+        watcher = ConfigWatcher("config.yaml", interval=reload_config.get("interval", 1.0))
+        print("[INFO] Recarga en caliente de config.yaml activa.")
+
+    def save_snapshot(final=False):
+        capture_start = time.perf_counter()
+        states = {cam_id: {f"tracker/{key}": value for key, value in tracker_state(cam_tracker.tracker).items()}
+                  for cam_id, cam_tracker in cam_trackers.items()}
+        for cam_id, counter in counters.items():
+            # Solo los tracks que el tracker aún conserva (activos o perdidos) pueden volver a cruzar
+            live_ids = states[cam_id]["tracker/ints"][:, 0].tolist() if cam_id in states else None
+            states.setdefault(cam_id, {}).update(counter_state(counter, live_ids))
+        snapshots.save(states, max_track_id(), time.perf_counter() - capture_start, final=final)
+
+    last_seqs = [0] * num_cams
+    renderer = None if headless else GridRenderer(num_cams, cols, (target_w, target_h))
+    metrics_interval = kf_config.get("metrics_interval", 10)
+    metrics_start = time.time()
+    metrics_base = {}
+    first_inference = {} # Índice de stream -> segundos desde el arranque hasta su primera inferencia
+    last_active = [time.time()] * num_cams # Último momento con tracks por cámara (para el modo inactivo)
+
     try:
         while True:
+            if watcher:
+                new_config = watcher.poll()
+                if new_config is not None:
+                    apply_config(new_config)
+
             frames_to_process = []
             active_streams_indices = []
-
-            # Recolectar frames actuales
-            for idx, stream in enumerate(streams):
-                frame = stream.read()
-                if frame is not None:
-                    frames_to_process.append(frame)
-                    active_streams_indices.append(idx)
-                else:
-                    # Si no hay frame listo, no procesamos nada de esta cámara en este ciclo
-                    pass
+            any_frame = False
+            detections_by_pos = None
+
+            if pipeline:
+                # Los frames ya fueron recogidos e inferidos por las etapas del pipeline
+                batch = pipeline.get(timeout=0.05)
+                post_start = time.perf_counter()
+                if batch is not None:
+                    frames_to_process, active_streams_indices, batch_detections = batch
+                    detections_by_pos = {i: batch_detections.camera(i) for i in range(len(frames_to_process))}
+                any_frame = any(stream.read() is not None for stream in streams)
+            else:
+                # Recolectar frames nuevos (los ya procesados no se repiten)
+                new_seqs = []
+                for idx, stream in enumerate(streams):
+                    seq, frame = stream.read_seq()
+                    if frame is not None:
+                        any_frame = True
+                        if seq != last_seqs[idx]:
+                            new_seqs.append(seq)
+                            frames_to_process.append(frame)
+                            active_streams_indices.append(idx)
+
+                if scheduler and frames_to_process:
+                    # Solo las cámaras elegidas consumen su frame; el resto lo conserva para el siguiente ciclo
+                    chosen = set(scheduler.select([streams[idx].cam_id for idx in active_streams_indices]))
+                    keep = [i for i, idx in enumerate(active_streams_indices) if streams[idx].cam_id in chosen]
+                    frames_to_process = [frames_to_process[i] for i in keep]
+                    active_streams_indices = [active_streams_indices[i] for i in keep]
+                    new_seqs = [new_seqs[i] for i in keep]
+                for idx, seq in zip(active_streams_indices, new_seqs):
+                    last_seqs[idx] = seq
+
+            # Hay cámaras activas pero ningún frame nuevo todavía: esperar sin re-procesar
+            if any_frame and not frames_to_process:
+                time.sleep(0.001)
+                if not headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+                continue
 
             # Si no hay ningún frame activo, esperar un poco
             if not frames_to_process:
                 time.sleep(0.01)
+                if headless:
+                    continue
                 # Mostrar pantalla de carga si no hay nada aún
                 blank_screen = np.zeros((600, 800, 3), dtype=np.uint8)
                 cv2.putText(blank_screen, "Esperando conexiones...", (200, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
@@ -229,110 +749,169 @@ def main(video_source=None, headless=False):
                 continue
 
             # INFERENCIA BATCH (Todo en un solo paso de GPU para eficiencia)
-            # Procesamos todos los frames activos juntos
-            results = model.track(
-                source=frames_to_process, 
-                persist=True, 
-                conf=0.25, 
-                iou=0.45, 
-                tracker="bytetrack.yaml", 
-                device=device, # Forzar uso de GPU/CPU detectado
-                verbose=False
-            )
-
-            # --- LÓGICA DE CONTEO (Ejecutar siempre, con o sin GUI) ---
-            # Procesamos los resultados para actualizar contadores
-            for i, r in enumerate(results):
-                original_cam_idx = active_streams_indices[i]
-                cam_id = streams[original_cam_idx].cam_id
-                
-                if cam_id in counters:
-                    counter = counters[cam_id]
-                    # Extraer cajas y IDs si hay detecciones
-                    if r.boxes and r.boxes.id is not None:
-                        # r.boxes.xyxy tiene coordenadas, r.boxes.id tiene IDs, r.boxes.cls tiene clases
-                        boxes = r.boxes.xyxy.cpu().numpy()
-                        track_ids = r.boxes.id.cpu().numpy()
-                        cls_ids = r.boxes.cls.cpu().numpy()
-                        
-                        detections = []
-                        for box, track_id, cls_id in zip(boxes, track_ids, cls_ids):
-                            x1, y1, x2, y2 = box
-                            detections.append((x1, y1, x2, y2, track_id, cls_id))
-                        
-                        counter.update(detections)
+            # Solo se detecta en las cámaras que están en keyframe; el resto se propaga
+            if detections_by_pos is None:
+                key_positions = [i for i, idx in enumerate(active_streams_indices)
+                                 if cam_trackers[streams[idx].cam_id].needs_detection()]
+                key_frames = [frames_to_process[i] for i in key_positions]
+                key_cams = [streams[active_streams_indices[i]].cam_id for i in key_positions]
+                # Un lote por bucket de resolución (imgsz de cada cámara + forma del frame)
+                key_sizes = [resolution.get(c) for c in key_cams]
+                if cascade:
+                    key_lines = [(counters[c].start_point, counters[c].end_point) if c in counters else None
+                                 for c in key_cams]
+                    key_detections = cascade.detect(key_frames, key_lines, key_sizes)
+                else:
+                    key_detections = predict_bucketed(model, key_frames, key_sizes, pad_to, conf=conf_threshold,
+                                                      iou=iou_threshold, device=device) # Forzar uso de GPU/CPU detectado
+                detections_by_pos = {pos: key_detections.camera(j) for j, pos in enumerate(key_positions)}
+                for j, pos in enumerate(key_positions):
+                    resolution.observe(key_cams[j], detections_by_pos[pos], key_frames[j].shape)
+
+            # Tiempo hasta la primera inferencia (global y por cámara: cada una cuenta en cuanto conecta)
+            for idx in active_streams_indices:
+                if idx not in first_inference:
+                    first_inference[idx] = time.perf_counter() - startup
+                    if len(first_inference) == 1:
+                        print(f"[INFO] Tiempo hasta la primera inferencia: {first_inference[idx]:.1f}s")
+                    connect = streams[idx].connect_time
+                    print(f"[INFO] CAM {streams[idx].cam_id}: primera inferencia a los {first_inference[idx]:.1f}s"
+                          + (f" (conectada a los {connect:.1f}s)" if connect is not None else ""))
+
+            # --- TRACKING Y LÓGICA DE CONTEO (Ejecutar siempre, con o sin GUI) ---
+            # Tracks por cámara: [x1, y1, x2, y2, track_id, conf, cls]; se unen en un único lote columnar
+            tracked = DetectionBatch.from_arrays([
+                cam_trackers[streams[active_streams_indices[i]].cam_id].update(frame, detections_by_pos.get(i))
+                for i, frame in enumerate(frames_to_process)])
+
+            detection_time = None
+            for i in range(len(frames_to_process)):
+                cam_id = streams[active_streams_indices[i]].cam_id
+                if recorder:
+                    recorder.push(cam_id, frames_to_process[i])
+                if idle_after:
+                    # Sin tracks durante idle_after segundos: decodificar solo keyframes
+                    idx = active_streams_indices[i]
+                    if len(tracked.camera(i)):
+                        last_active[idx] = time.time()
+                    streams[idx].set_idle(time.time() - last_active[idx] > idle_after)
+                if scheduler:
+                    scheduler.observe(cam_id, tracked.camera(i))
+                if cam_id in zone_engines:
+                    zone_result = zone_engines[cam_id].update(tracked.camera(i), frames_to_process[i].shape, time.time())
+                    for track_id, zone_name, dwell in zone_result["stuck"]:
+                        print(f"[WARN] CAM {cam_id}: objeto {track_id} lleva {dwell:.0f}s en la zona '{zone_name}'")
+                if cam_id not in counters:
+                    continue
+                cam_tracks = tracked.camera(i)
+                counted = counters[cam_id].update(cam_tracks)
+                if resumed is False:
+                    resumed = True
+                    print(f"[INFO] Conteo reanudado con el estado restaurado a los "
+                          f"{time.perf_counter() - startup:.1f}s del arranque.")
+                duplicates = None
+                clip = recorder.trigger(cam_id) if recorder and len(counted) else None
+                if handoff and len(counted):
+                    # Conteos ya hechos en una cámara anterior del recorrido: se registran pero no se envían
+                    duplicates = handoff.process(cam_id, frames_to_process[i], cam_tracks, counted, time.time())
+                if len(counted) and shard:
+                    events = build_events(cam_id, cam_tracks, counted, model.names, terminals.get(cam_id),
+                                          duplicates=duplicates, clip=clip)
+                    for event in events:
+                        event["event_id"] = shard.next_event_id()
+                    shard.send({"type": "events", "events": events})
+                elif len(counted):
+                    detection_time = detection_time or datetime.datetime.now()
+                    event_logger.log(cam_id, cam_tracks, counted, model.names, terminals.get(cam_id), detection_time,
+                                     duplicates, clip)
+                    if cam_id in terminals:
+                        unique = counted if duplicates is None else counted[~duplicates]
+                        send_counts(terminals[cam_id], cam_tracks, unique, model.names, detection_time)
+
+            if snapshots and snapshots.due():
+                save_snapshot()
+
+            # Métricas periódicas: FPS efectivos (frames trackeados) vs FPS de detección por cámara
+            if time.time() - metrics_start >= metrics_interval:
+                elapsed = time.time() - metrics_start
+                shard_frames = {}
+                for cam_id, cam_tracker in sorted(cam_trackers.items()):
+                    stats = cam_tracker.stats()
+                    base = metrics_base.get(cam_id, {"frames": 0, "keyframes": 0})
+                    shard_frames[cam_id] = stats["frames"] - base["frames"]
+                    print(f"[METRICS] CAM {cam_id}: {(stats['frames'] - base['frames']) / elapsed:.1f} fps efectivos, "
+                          f"{(stats['keyframes'] - base['keyframes']) / elapsed:.1f} fps detección (k={stats['k']})")
+                    metrics_base[cam_id] = stats
+                if cascade:
+                    print(f"[METRICS] Cascada: {cascade.report()}")
+                if pipeline:
+                    print(f"[METRICS] Pipeline: {pipeline.report()}")
+                for stream in streams:
+                    print(f"[METRICS] Conexión {stream.monitor.report()}")
+                if handoff:
+                    print(f"[METRICS] Handoff: {handoff.report()}")
+                for cam_id, zone_engine in sorted(zone_engines.items()):
+                    print(f"[METRICS] Zonas CAM {cam_id}: {zone_engine.report()}")
+                if snapshots:
+                    print(f"[METRICS] Snapshots: {snapshots.report()}")
+                if recorder:
+                    for line in recorder.report():
+                        print(f"[METRICS] Clips {line}")
+                if not pipeline and (resolution.auto or len(set(resolution.base.values())) > 1):
+                    for line in resolution.report():
+                        print(f"[METRICS] Resolución {line}")
+                if scheduler:
+                    for line in scheduler.report():
+                        print(f"[METRICS] Planificador {line}")
+                if renderer:
+                    print(f"[METRICS] GUI: {renderer.report()}")
+                if shard:
+                    shard.send({"type": "metrics", "elapsed": elapsed, "frames": shard_frames,
+                                "connected": sum(stream.connected for stream in streams)})
+                metrics_start = time.time()
 
             # --- Construcción del Grid de Visualización (SOLO SI NO ES HEADLESS) ---
             if not headless:
-                # Crear lista completa de frames para el grid (incluyendo los inactivos/negros)
-                final_display_frames = [None] * num_cams
-                
-                # 1. Rellenar inactivos con negro
+                gui_start = time.thread_time()
+
+                # 1. Tiles de estado (se recomponen solo si el estado cambia)
                 for i in range(num_cams):
-                    blank = np.zeros((target_h, target_w, 3), dtype=np.uint8)
-                    status_text = "NO SIGNAL / CONNECTING..."
-                    color = (0, 0, 255) # Rojo
-                    
-                    # Si la cámara está conectada pero no dio frame en este instante preciso
-                    if streams[i].connected:
-                        status_text = "NO FRAME"
-                        color = (0, 255, 255) # Amarillo
-
-                    cv2.putText(blank, f"CAM {i+1}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-                    cv2.putText(blank, status_text, (50, 180), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-                    final_display_frames[i] = blank
-
-                # 2. Rellenar activos con los resultados procesados visualmente
-                for i, r in enumerate(results):
+                    if not streams[i].connected:
+                        renderer.draw_status(i, streams[i].cam_id, "NO SIGNAL / CONNECTING...", (0, 0, 255)) # Rojo
+                    elif renderer.keys[i] != "frame":
+                        # Conectada pero aún sin frame procesado
+                        renderer.draw_status(i, streams[i].cam_id, "NO FRAME", (0, 255, 255)) # Amarillo
+
+                # 2. Solo se recomponen las cámaras con frame nuevo; el resto conserva su tile
+                for i, frame in enumerate(frames_to_process):
                     original_cam_idx = active_streams_indices[i]
                     cam_id = streams[original_cam_idx].cam_id
-                    
-                    # r.plot() devuelve el frame BGR con anotaciones dibujadas
-                    annotated_frame = r.plot()
-
-                    # Dibujar línea y conteo sobre el frame anotado si hay contador
-                    if cam_id in counters:
-                        annotated_frame = counters[cam_id].draw(annotated_frame)
-                    
-                    # Redimensionar para el grid
-                    annotated_frame = cv2.resize(annotated_frame, (target_w, target_h))
-                    
-                    # Añadir etiqueta de cámara sobre el video
-                    cv2.putText(annotated_frame, f"CAM {cam_id}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    
-                    final_display_frames[original_cam_idx] = annotated_frame
-
-                # 3. Ensamblar Grid
-                grid_rows = []
-                for r in range(rows):
-                    start_idx = r * cols
-                    end_idx = min((r + 1) * cols, num_cams)
-                    row_frames = final_display_frames[start_idx : end_idx]
-                    while len(row_frames) < cols:
-                        row_frames.append(np.zeros((target_h, target_w, 3), dtype=np.uint8))
-                    grid_rows.append(np.hstack(row_frames))
-                
-                if len(grid_rows) > 0:
-                    final_grid = np.vstack(grid_rows)
-                else:
-                    final_grid = np.zeros((target_h, target_w, 3), dtype=np.uint8)
-
-                # 4. Mostrar Grid
-                if final_grid.shape[0] > 1000:
-                    scale_factor = 1000 / final_grid.shape[0]
-                    final_grid = cv2.resize(final_grid, None, fx=scale_factor, fy=scale_factor)
-
-                cv2.imshow("Sistema Multi-Camara IA Tracking", final_grid)
-
-                # Salir con 'q'
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    renderer.draw_frame(original_cam_idx, cam_id, frame, tracked.camera(i), model.names,
+                                        counters.get(cam_id), zone_engines.get(cam_id))
+
+                # 3. Mostrar Grid (solo si algún tile cambió)
+                final_grid = renderer.take()
+                if final_grid is not None:
+                    cv2.imshow("Sistema Multi-Camara IA Tracking", final_grid)
+                renderer.record(time.thread_time() - gui_start)
+
+                # Salir con 'q'; 'r' guarda un clip de todas las cámaras
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
                     break
+                if key == ord('r') and recorder:
+                    for stream in streams:
+                        print(f"[INFO] Clip manual CAM {stream.cam_id}: {recorder.trigger(stream.cam_id)}")
             else:
                 # En modo headless, solo esperamos un poco para no saturar si va muy rápido
                 # Aunque la inferencia ya consume tiempo.
                 # También verificamos si el usuario quiere salir con un mecanismo alternativo, pero KeyboardInterrupt lo maneja.
                 pass
 
+            if pipeline:
+                # Tracking, conteo y dibujo forman parte de la etapa de postproceso
+                pipeline.add_post_time(time.perf_counter() - post_start)
+
     except KeyboardInterrupt:
         print("[INFO] Interrupción de teclado recibida.")
     except Exception as e:
@@ -340,8 +919,21 @@ def main(video_source=None, headless=False):
     finally:
         # Limpieza
         print("[INFO] Deteniendo streams...")
+        if pipeline:
+            pipeline.stop()
         for stream in streams:
             stream.stop()
+        if watcher:
+            watcher.stop()
+        if recorder:
+            recorder.stop() # Escribe los clips pendientes
+        if snapshots:
+            # Snapshot final: un redespliegue limpio continúa exactamente donde se quedó
+            save_snapshot(final=True)
+        if event_logger:
+            event_logger.close()
+        if shard:
+            shard.close()
         cv2.destroyAllWindows()
         print("[INFO] Finalizado.")
 
@@ -0,0 +1,202 @@
+import sys
+import os
+import argparse
+import csv
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from utils.utils import load_config
+from utils.detections import DetectionBatch, DetectionCache, nms_xyxy
+from utils.counter import LineCounter
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Parámetros de la fase de caché: umbral de confianza muy bajo e IoU casi 1 para que el NMS
+# de Ultralytics apenas suprima cajas; el NMS real se repite en CPU para cada combinación.
+CACHE_CONF = 0.01
+CACHE_IOU = 0.95
+
+def build_detection_cache(source, out_path, weights=None):
+    """
+    Ejecuta el detector UNA sola vez sobre el video y guarda las detecciones crudas por frame.
+    """
+    from ultralytics import YOLO
+    from utils.utils import get_device
+
+    config = load_config("config.yaml")
+    device = get_device(config.get("device"))
+    if weights is None:
+        weights = os.path.join(config.get("output_dir", "models/"),
+                               config.get("project_name", "paquetes_tracking"), "weights/best.pt")
+        if not os.path.exists(weights):
+            logger.warning(f"No se encontraron pesos entrenados en {weights}. Usando yolov8n.pt")
+            weights = "yolov8n.pt"
+
+    cap = cv2.VideoCapture(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    cap.release()
+
+    model = YOLO(weights)
+    logger.info(f"Generando caché de detecciones de {source} con {weights}...")
+    start = time.perf_counter()
+    frames = []
+    frame_shape = None
+    for r in model.predict(source=source, stream=True, conf=CACHE_CONF, iou=CACHE_IOU,
+                           imgsz=config.get("imgsz", 640), device=device, verbose=False):
+        data = r.boxes.data.cpu().numpy()
+        frames.append((data[:, :4], data[:, -2], data[:, -1]))
+        frame_shape = r.orig_shape
+
+    meta = {"source": str(source), "weights": weights, "fps": fps, "frame_shape": list(frame_shape or (0, 0)),
+            "names": {int(k): v for k, v in model.names.items()},
+            "cache_conf": CACHE_CONF, "cache_iou": CACHE_IOU}
+    cache = DetectionCache.from_frames(frames, meta)
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    cache.save(out_path)
+    logger.info(f"Caché guardada en {out_path}: {len(cache)} frames, {len(cache.boxes)} detecciones "
+                f"({os.path.getsize(out_path) / 1e6:.1f} MB, {time.perf_counter() - start:.1f}s)")
+
+# --- Fase de barrido (procesos worker, solo CPU) ---
+
+_worker_cache = None
+
+def _init_worker(cache_path):
+    global _worker_cache
+    _worker_cache = DetectionCache.load(cache_path)
+
+def _run_setting(setting):
+    """
+    Repite NMS + tracking + LineCounter sobre la caché para una combinación de parámetros.
+    """
+    from utils.tracking import create_tracker, update_tracker
+
+    cache = _worker_cache
+    meta = cache.meta
+    line = setting["line"]
+    counter = LineCounter((line[0], line[1]), (line[2], line[3]), meta["names"])
+
+    # BoT-SORT necesita el frame para la compensación de movimiento (GMC); la caché no guarda
+    # imágenes, así que se desactiva en el barrido.
+    tracker = create_tracker(setting["tracker"], frame_rate=int(round(meta["fps"])), gmc_method="none")
+    frame_shape = tuple(meta["frame_shape"])
+
+    start = time.perf_counter()
+    for i in range(len(cache)):
+        boxes, conf, cls = cache.frame(i)
+        mask = conf >= setting["conf"]
+        boxes, conf, cls = boxes[mask], conf[mask].astype(np.float32), cls[mask]
+        keep = nms_xyxy(boxes, conf, setting["iou"], classes=cls)
+        tracks = update_tracker(tracker, boxes[keep], conf[keep], cls[keep], frame_shape)
+        counter.update(DetectionBatch.from_arrays([tracks]))
+
+    result = dict(setting)
+    result["line"] = ",".join(str(v) for v in line)
+    result["total"] = counter.total_count
+    result["per_class"] = {k: v for k, v in counter.counts.items() if v}
+    result["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return result
+
+def _score(result, gt):
+    """
+    Error absoluto respecto a la verdad de campo (total + por clase si se conoce).
+    """
+    error = abs(result["total"] - gt["total"])
+    for cls_name, expected in gt.get("per_class", {}).items():
+        error += abs(result["per_class"].get(cls_name, 0) - expected)
+    return error
+
+def run_sweep(cache_path, gt, confs, ious, trackers, lines, workers, out_csv):
+    settings = [{"conf": c, "iou": i, "tracker": t, "line": l}
+                for c, i, t, l in itertools.product(confs, ious, trackers, lines)]
+    cache_meta = DetectionCache.load(cache_path).meta
+    if min(confs) < cache_meta["cache_conf"] or max(ious) > cache_meta["cache_iou"]:
+        logger.warning(f"La caché se generó con conf>={cache_meta['cache_conf']} e iou={cache_meta['cache_iou']}: "
+                       "valores fuera de ese rango no se pueden reproducir con exactitud.")
+
+    logger.info(f"Barriendo {len(settings)} combinaciones con {workers} procesos...")
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_path,)) as pool:
+        results = list(pool.map(_run_setting, settings))
+    logger.info(f"Barrido completado en {time.perf_counter() - start:.1f}s")
+
+    for r in results:
+        r["error"] = _score(r, gt) if gt else None
+    if gt:
+        results.sort(key=lambda r: (r["error"], -r["conf"]))
+
+    print(f"\n{'conf':>6} {'iou':>6} {'tracker':<16} {'line':<18} {'total':>6} {'error':>6}")
+    for r in results:
+        error = "-" if r["error"] is None else r["error"]
+        print(f"{r['conf']:>6.2f} {r['iou']:>6.2f} {r['tracker']:<16} {r['line']:<18} {r['total']:>6} {error:>6}")
+    if gt:
+        print(f"\nVerdad de campo: {gt['total']} | Mejor combinación: conf={results[0]['conf']}, "
+              f"iou={results[0]['iou']}, tracker={results[0]['tracker']}, line=[{results[0]['line']}]")
+
+    os.makedirs(os.path.dirname(out_csv) or ".", exist_ok=True)
+    with open(out_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["conf", "iou", "tracker", "line", "total", "error",
+                                               "per_class", "elapsed_s"])
+        writer.writeheader()
+        for r in results:
+            writer.writerow({**r, "per_class": json.dumps(r["per_class"], ensure_ascii=False)})
+    logger.info(f"Resultados guardados en {out_csv}")
+
+def _parse_line(text):
+    coords = [int(float(v)) for v in text.split(",")]
+    if len(coords) != 4:
+        raise argparse.ArgumentTypeError(f"Línea inválida '{text}'. Formato: x1,y1,x2,y2")
+    return coords
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Barrido de umbrales/tracker/línea sobre detecciones cacheadas")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_cache = sub.add_parser("cache", help="Ejecutar el detector una vez y guardar las detecciones crudas")
+    p_cache.add_argument("--source", required=True, help="Video grabado a procesar")
+    p_cache.add_argument("--out", default=None, help="Archivo .npz de salida (default: runs/sweep/<video>.npz)")
+    p_cache.add_argument("--weights", default=None, help="Ruta al archivo .pt del modelo")
+
+    p_run = sub.add_parser("run", help="Barrer combinaciones de parámetros sobre la caché (solo CPU)")
+    p_run.add_argument("--cache", required=True, help="Archivo .npz generado con 'cache'")
+    p_run.add_argument("--gt", type=int, default=None, help="Conteo total real del video")
+    p_run.add_argument("--gt-file", default=None, help="JSON con verdad de campo {'total': N, 'per_class': {...}}")
+    p_run.add_argument("--conf", type=float, nargs="+", default=[0.15, 0.2, 0.25, 0.3, 0.4])
+    p_run.add_argument("--iou", type=float, nargs="+", default=[0.35, 0.45, 0.55, 0.7])
+    p_run.add_argument("--tracker", nargs="+", default=["bytetrack.yaml", "botsort.yaml"])
+    p_run.add_argument("--line", type=_parse_line, nargs="+", default=None,
+                       help="Líneas candidatas x1,y1,x2,y2 (default: la de --cam en config.yaml)")
+    p_run.add_argument("--cam", type=int, default=1, help="Cámara de config.yaml de la que tomar la línea")
+    p_run.add_argument("--workers", type=int, default=os.cpu_count(), help="Procesos en paralelo")
+    p_run.add_argument("--out", default=None, help="CSV de resultados (default: junto a la caché)")
+
+    args = parser.parse_args()
+
+    if args.command == "cache":
+        out = args.out or os.path.join("runs", "sweep", os.path.splitext(os.path.basename(args.source))[0] + ".npz")
+        build_detection_cache(args.source, out, args.weights)
+    else:
+        gt = None
+        if args.gt_file:
+            with open(args.gt_file, "r", encoding="utf-8") as f:
+                gt = json.load(f)
+        elif args.gt is not None:
+            gt = {"total": args.gt}
+
+        lines = args.line
+        if lines is None:
+            cam_config = (load_config("config.yaml").get("cameras") or {}).get(args.cam) or {}
+            if not cam_config.get("line"):
+                parser.error(f"La cámara {args.cam} no tiene 'line' en config.yaml. Use --line.")
+            lines = [[int(v) for v in cam_config["line"]]]
+
+        out_csv = args.out or os.path.splitext(args.cache)[0] + "_sweep.csv"
+        run_sweep(args.cache, gt, args.conf, args.iou, args.tracker, lines, args.workers, out_csv)
@@ -1,9 +1,19 @@
 import sys
 import os
+import argparse
+import datetime
+import json
+import random
+import shutil
+import time
 # Añadir el directorio raíz al path para poder importar utils
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import yaml
+from torch.utils.data import Dataset
 from ultralytics import YOLO
+from ultralytics.data.dataset import YOLODataset
+from utils.cached_trainer import CachedDetectionTrainer, CachedYOLODataset
 from utils.utils import load_config, get_device
 import logging
 
@@ -11,7 +21,313 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def train_model():
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def _train_kwargs(config, device):
+    """
+    Argumentos comunes de model.train() a partir del config (dispositivo, tamaño, augmentations).
+    """
+    # Mapeamos augmentations del config a argumentos de YOLO
+    aug_config = config.get("augmentations", {})
+    return dict(
+        imgsz=config.get("imgsz", 640),
+        batch=config.get("batch_size", 16),
+        device=device,
+        project=config.get("output_dir", "models/"),
+        exist_ok=True, # Sobrescribir si existe la carpeta del experimento
+
+        # Augmentations
+        degrees=aug_config.get("degrees", 0.0),
+        scale=aug_config.get("scale", 0.5),
+        shear=aug_config.get("shear", 0.0),
+        perspective=aug_config.get("perspective", 0.0),
+        flipud=aug_config.get("flipud", 0.0),
+        fliplr=aug_config.get("fliplr", 0.5),
+        mosaic=aug_config.get("mosaic", 1.0),
+        mixup=aug_config.get("mixup", 0.0),
+
+        verbose=True
+    )
+
+def _dataset_split_dir(data_yaml, split):
+    """
+    Devuelve la carpeta de imágenes de un split ('train'/'val') según dataset.yaml.
+    """
+    with open(data_yaml, "r", encoding="utf-8") as f:
+        data_cfg = yaml.safe_load(f)
+    root = data_cfg.get("path") or os.path.dirname(os.path.abspath(data_yaml))
+    return os.path.join(root, data_cfg[split]), data_cfg
+
+def _list_images(images_dir):
+    if not os.path.isdir(images_dir):
+        return []
+    return sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+def _label_path(image_path):
+    """
+    Ruta de la etiqueta YOLO de una imagen (convención images/ -> labels/).
+    """
+    parts = os.path.normpath(image_path).split(os.sep)
+    if "images" in parts:
+        idx = len(parts) - 1 - parts[::-1].index("images")
+        parts[idx] = "labels"
+    return os.path.splitext(os.sep.join(parts))[0] + ".txt"
+
+def _dominant_class(image_path):
+    """
+    Clase más frecuente en la etiqueta de la imagen (-1 si es fondo o no hay etiqueta).
+    Se usa como estrato para el muestreo de repaso.
+    """
+    counts = {}
+    try:
+        with open(_label_path(image_path), "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if parts:
+                    cls_id = int(float(parts[0]))
+                    counts[cls_id] = counts.get(cls_id, 0) + 1
+    except OSError:
+        return -1
+    if not counts:
+        return -1
+    return max(counts, key=counts.get)
+
+def load_manifest(manifest_path):
+    """
+    Carga el registro de imágenes ya entrenadas: {"images": {nombre: {...}}, "runs": [...]}.
+    """
+    if not os.path.exists(manifest_path):
+        return {"images": {}, "runs": []}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, manifest_path, trained_images, run_info):
+    """
+    Marca las imágenes como entrenadas y guarda el registro de forma atómica.
+    """
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    for name in trained_images:
+        entry = manifest["images"].setdefault(name, {"first_trained": now, "times_trained": 0})
+        entry["last_trained"] = now
+        entry["times_trained"] += 1
+    run_info["date"] = now
+    manifest["runs"].append(run_info)
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Registro de entrenamiento actualizado: {manifest_path} ({len(manifest['images'])} imágenes)")
+
+def replay_strata(images_dir, history):
+    """
+    Agrupa las imágenes históricas por clase dominante: {clase: [nombres]}.
+    """
+    strata = {}
+    for name in history:
+        strata.setdefault(_dominant_class(os.path.join(images_dir, name)), []).append(name)
+    return strata
+
+def stratified_replay_sample(images_dir, history, n_samples, seed=0, strata=None):
+    """
+    Muestra estratificada (por clase dominante) de imágenes históricas.
+    Cada clase recibe una cuota proporcional a su tamaño, con al menos una imagen si existe.
+    :param strata: Resultado de replay_strata, para no releer las etiquetas en cada muestra.
+    """
+    if n_samples <= 0 or not history:
+        return []
+    if n_samples >= len(history):
+        return list(history)
+
+    if strata is None:
+        strata = replay_strata(images_dir, history)
+
+    rng = random.Random(seed)
+    sample = []
+    for cls_id, names in sorted(strata.items()):
+        quota = max(1, round(n_samples * len(names) / len(history)))
+        sample.extend(rng.sample(names, min(quota, len(names))))
+
+    # El redondeo puede quedarse corto o pasarse del objetivo: completar o recortar al azar
+    if len(sample) < n_samples:
+        chosen = set(sample)
+        remaining = [name for name in history if name not in chosen]
+        sample.extend(rng.sample(remaining, n_samples - len(sample)))
+    rng.shuffle(sample)
+    return sample[:n_samples]
+
+def _write_incremental_dataset(data_cfg, images_dir, image_names, run_dir):
+    """
+    Genera un dataset.yaml temporal cuyo 'train' es una lista de imágenes (nuevas + histórico;
+    ReplayEpochs elige en cada época qué imágenes históricas se usan).
+    La validación sigue apuntando al set de validación completo.
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    list_path = os.path.abspath(os.path.join(run_dir, "train_list.txt"))
+    with open(list_path, "w", encoding="utf-8") as f:
+        for name in image_names:
+            f.write(os.path.abspath(os.path.join(images_dir, name)) + "\n")
+
+    inc_cfg = dict(data_cfg)
+    inc_cfg["train"] = list_path
+    yaml_path = os.path.join(run_dir, "dataset_incremental.yaml")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(inc_cfg, f, allow_unicode=True, sort_keys=False)
+    return yaml_path
+
+class _EpochSubset(Dataset):
+    """
+    Mixin para el dataset de entrenamiento: expone solo las posiciones de `epoch_index`
+    (las imágenes de la época actual) sobre el dataset completo. Hereda de Dataset para tener
+    la misma disposición en memoria que el dataset original y poder cambiar su __class__.
+    """
+    epoch_index = ()
+
+    def __len__(self):
+        return len(self.epoch_index)
+
+    def __getitem__(self, index):
+        return super().__getitem__(self.epoch_index[index])
+
+# Clases a nivel de módulo (no creadas al vuelo) para que los workers del DataLoader puedan
+# recibir el dataset por pickle cuando se lanzan con spawn (Windows)
+class ReplayYOLODataset(_EpochSubset, YOLODataset):
+    pass
+
+class ReplayCachedYOLODataset(_EpochSubset, CachedYOLODataset):
+    pass
+
+REPLAY_DATASETS = {YOLODataset: ReplayYOLODataset, CachedYOLODataset: ReplayCachedYOLODataset}
+
+class ReplayEpochs:
+    """
+    Cada época del entrenamiento incremental usa todas las imágenes nuevas más una muestra
+    estratificada de repaso distinta del histórico. El dataset de Ultralytics se construye una
+    vez con nuevas + histórico completo; al inicio de cada época se eligen las posiciones de la
+    época y se relanza el DataLoader (sus workers tienen copia del dataset). El tamaño de la
+    época es constante, por lo que el número de lotes que calcula el trainer sigue siendo válido.
+    """
+    def __init__(self, images_dir, new_images, history, n_replay, seed=0):
+        self.images_dir = images_dir
+        self.new_images = new_images
+        self.history = history
+        self.n_replay = n_replay
+        self.seed = seed
+        self.strata = None
+        self.positions = {}
+        self.used = set() # Imágenes históricas usadas en alguna época (para el manifiesto)
+
+    def install(self, model):
+        model.add_callback("on_pretrain_routine_end", self._on_setup)
+        model.add_callback("on_train_epoch_start", self._on_epoch_start)
+
+    def _on_setup(self, trainer):
+        dataset = trainer.train_loader.dataset
+        self.positions = {os.path.basename(f): i for i, f in enumerate(dataset.im_files)}
+        # Solo lo que el dataset llegó a cargar (sin etiqueta válida o fuera de la caché de shards se descarta)
+        self.new_images = [name for name in self.new_images if name in self.positions]
+        self.history = [name for name in self.history if name in self.positions]
+        self.strata = replay_strata(self.images_dir, self.history)
+        dataset.__class__ = REPLAY_DATASETS[type(dataset)]
+        self._select(trainer, trainer.start_epoch)
+
+    def _on_epoch_start(self, trainer):
+        if trainer.epoch != trainer.start_epoch: # La primera época ya se eligió en _on_setup
+            self._select(trainer, trainer.epoch)
+
+    def _select(self, trainer, epoch):
+        replay = stratified_replay_sample(self.images_dir, self.history, self.n_replay,
+                                          seed=f"{self.seed}-{epoch}", strata=self.strata)
+        self.used.update(replay)
+        trainer.train_loader.dataset.epoch_index = [self.positions[name] for name in self.new_images + replay]
+        trainer.train_loader.reset()
+        logger.info(f"Época {epoch + 1}: {len(self.new_images)} imágenes nuevas + {len(replay)} de repaso")
+
+def _track_epoch_times(model):
+    """
+    Registra callbacks que miden la duración de cada época de entrenamiento (sin validación).
+    :return: Lista que se irá llenando con los tiempos (segundos) de cada época.
+    """
+    times = []
+    state = {}
+
+    def on_epoch_start(trainer):
+        state["start"] = time.perf_counter()
+
+    def on_epoch_end(trainer):
+        if "start" in state:
+            times.append(time.perf_counter() - state.pop("start"))
+
+    model.add_callback("on_train_epoch_start", on_epoch_start)
+    model.add_callback("on_train_epoch_end", on_epoch_end)
+    return times
+
+def _report_epoch_times(times, use_cache, output_dir):
+    """
+    Guarda el tiempo medio por época del modo actual (con/sin caché de shards) y lo compara
+    con la última medición del otro modo, si existe.
+    """
+    if not times:
+        return
+    mode = "shards" if use_cache else "images"
+    report_path = os.path.join(output_dir, "epoch_times.json")
+    report = {}
+    if os.path.exists(report_path):
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+    mean_time = sum(times) / len(times)
+    report[mode] = {"mean_epoch_s": mean_time, "epochs": len(times),
+                    "date": datetime.datetime.now().isoformat(timespec="seconds")}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"Tiempo medio por época ({mode}): {mean_time:.1f}s en {len(times)} épocas")
+    other = report.get("images" if use_cache else "shards")
+    if other:
+        with_cache = report.get("shards", {}).get("mean_epoch_s")
+        without_cache = report.get("images", {}).get("mean_epoch_s")
+        logger.info(f"Comparativa por época -> sin caché: {without_cache:.1f}s, con caché: {with_cache:.1f}s "
+                    f"(x{without_cache / with_cache:.2f})")
+
+def _cache_train_kwargs(config, use_cache):
+    """
+    Argumentos extra de model.train() para entrenar desde la caché de shards (scripts/build_cache.py).
+    """
+    if not use_cache:
+        return {}
+    from utils.shard_cache import cache_imgsz
+    cache_config = config.get("shard_cache", {})
+    CachedDetectionTrainer.cache_root = cache_config.get("dir", "data/cache")
+    imgsz = config.get("imgsz", 640)
+    built = {cache_imgsz(os.path.join(CachedDetectionTrainer.cache_root, split)) for split in ("train", "val")}
+    if built - {imgsz, None}:
+        # Caché construida con otro imgsz: se reconstruye antes de entrenar en lugar de usar letterbox erróneos
+        from scripts.build_cache import build_cache
+        logger.warning(f"La caché de shards usa imgsz {sorted(built - {None})} y el entrenamiento {imgsz}. "
+                       "Reconstruyendo caché...")
+        build_cache(config.get("data_yaml"), CachedDetectionTrainer.cache_root, imgsz,
+                    cache_config.get("shard_size", 256))
+    logger.info(f"Usando caché de shards preprocesados en: {CachedDetectionTrainer.cache_root}")
+    return {"trainer": CachedDetectionTrainer}
+
+def _val_map(weights, data_yaml, config, device):
+    """
+    mAP50-95 del modelo sobre el set de validación completo.
+    """
+    metrics = YOLO(weights).val(
+        data=data_yaml,
+        imgsz=config.get("imgsz", 640),
+        batch=config.get("batch_size", 16),
+        device=device,
+        split="val",
+        verbose=False
+    )
+    return float(metrics.box.map)
+
+def train_model(use_cache=False):
     # Cargar configuración
     try:
         config = load_config("config.yaml")
@@ -30,62 +346,147 @@ def train_model():
         logger.warning("Por favor asegúrese de tener un archivo dataset.yaml válido en la carpeta data/")
         # No retornamos aquí para permitir que YOLO intente descargar datasets de prueba si es el caso,
         # o fallará más adelante con un error claro.
-    
+
     # Inicializar modelo
     # Verificar si existe un modelo entrenado previamente para continuar el entrenamiento
     project_name = config.get("project_name", "yolo_project")
     output_dir = config.get("output_dir", "models/")
     trained_weights = os.path.join(output_dir, project_name, "weights/best.pt")
-    
+
     if os.path.exists(trained_weights):
         model_name = trained_weights
         logger.info(f"Encontrado modelo previo. Continuando entrenamiento desde: {model_name}")
     else:
         model_name = config.get("model", "yolov8n.pt")
         logger.info(f"No se encontró modelo previo. Iniciando desde base: {model_name}")
-        
-    model = YOLO(model_name)
 
-    # Configurar argumentos de entrenamiento
-    # Se pueden pasar muchos argumentos en el método train()
-    # Mapeamos augmentations del config a argumentos de YOLO
-    aug_config = config.get("augmentations", {})
-    
-    project_name = config.get("project_name", "yolo_project")
-    output_dir = config.get("output_dir", "models/")
+    model = YOLO(model_name)
+    epoch_times = _track_epoch_times(model)
 
     logger.info("Iniciando entrenamiento...")
-    
+
     try:
-        results = model.train(
+        # Se pueden pasar muchos argumentos en el método train()
+        model.train(
             data=data_yaml,
-            imgsz=config.get("imgsz", 640),
             epochs=config.get("epochs", 50),
-            batch=config.get("batch_size", 16),
-            device=device,
-            project=output_dir,
             name=project_name,
-            exist_ok=True, # Sobrescribir si existe la carpeta del experimento
-            
-            # Augmentations
-            degrees=aug_config.get("degrees", 0.0),
-            scale=aug_config.get("scale", 0.5),
-            shear=aug_config.get("shear", 0.0),
-            perspective=aug_config.get("perspective", 0.0),
-            flipud=aug_config.get("flipud", 0.0),
-            fliplr=aug_config.get("fliplr", 0.5),
-            mosaic=aug_config.get("mosaic", 1.0),
-            mixup=aug_config.get("mixup", 0.0),
-            
-            verbose=True
+            **_train_kwargs(config, device),
+            **_cache_train_kwargs(config, use_cache)
         )
         logger.info("Entrenamiento completado exitosamente.")
-        
+        _report_epoch_times(epoch_times, use_cache, output_dir)
+
         # Guardar resultados o realizar acciones post-entrenamiento si es necesario
         # Ultralytics guarda automáticamente en project/name/weights/best.pt
-        
+
+        # Registrar qué imágenes se usaron para que el modo incremental sepa qué es nuevo
+        inc_config = config.get("incremental", {})
+        manifest_path = inc_config.get("manifest", "data/trained_manifest.json")
+        images_dir, _ = _dataset_split_dir(data_yaml, "train")
+        train_images = _list_images(images_dir)
+        save_manifest(load_manifest(manifest_path), manifest_path, train_images,
+                      {"mode": "full", "new": len(train_images), "replay": 0})
+
     except Exception as e:
         logger.error(f"Error durante el entrenamiento: {e}")
 
+def train_incremental(use_cache=False):
+    """
+    Re-entrenamiento incremental: cada época usa todas las imágenes nuevas (no registradas
+    en el manifiesto) más una muestra estratificada de repaso del histórico, con un presupuesto
+    corto de épocas y early stopping sobre el set de validación completo.
+    El modelo nuevo solo reemplaza a best.pt si el mAP de validación no cae más de lo tolerado.
+    """
+    try:
+        config = load_config("config.yaml")
+    except Exception as e:
+        logger.error(f"No se pudo cargar la configuración: {e}")
+        return
+
+    device = get_device(config.get("device"))
+    inc_config = config.get("incremental", {})
+    manifest_path = inc_config.get("manifest", "data/trained_manifest.json")
+
+    project_name = config.get("project_name", "yolo_project")
+    output_dir = config.get("output_dir", "models/")
+    trained_weights = os.path.join(output_dir, project_name, "weights/best.pt")
+    if not os.path.exists(trained_weights):
+        logger.warning(f"No existe modelo previo en {trained_weights}. Se realizará entrenamiento completo.")
+        train_model(use_cache)
+        return
+
+    data_yaml = config.get("data_yaml")
+    images_dir, data_cfg = _dataset_split_dir(data_yaml, "train")
+    all_images = _list_images(images_dir)
+    manifest = load_manifest(manifest_path)
+    if not manifest["images"]:
+        logger.warning(f"El registro {manifest_path} está vacío: todas las imágenes se considerarán nuevas. "
+                       "Ejecute un entrenamiento completo para inicializarlo.")
+
+    new_images = [name for name in all_images if name not in manifest["images"]]
+    history = [name for name in all_images if name in manifest["images"]]
+    if not new_images:
+        logger.info("No hay imágenes nuevas desde el último entrenamiento. Nada que hacer.")
+        return
+
+    n_replay = max(int(len(new_images) * inc_config.get("replay_ratio", 1.0)),
+                   inc_config.get("min_replay", 200))
+    replay_epochs = ReplayEpochs(images_dir, new_images, history, n_replay, seed=len(manifest["runs"]))
+    logger.info(f"Incremental: {len(new_images)} imágenes nuevas + {min(n_replay, len(history))} de repaso "
+                f"por época (histórico: {len(history)})")
+
+    inc_name = f"{project_name}_incremental"
+    run_dir = os.path.join(output_dir, inc_name)
+    inc_yaml = _write_incremental_dataset(data_cfg, images_dir, new_images + history, run_dir)
+
+    # mAP de referencia antes de entrenar (guarda contra el olvido catastrófico)
+    map_before = _val_map(trained_weights, data_yaml, config, device)
+    logger.info(f"mAP50-95 de validación antes: {map_before:.4f}")
+
+    model = YOLO(trained_weights)
+    epoch_times = _track_epoch_times(model)
+    replay_epochs.install(model)
+    try:
+        model.train(
+            data=inc_yaml,
+            epochs=inc_config.get("epochs", 20),
+            patience=inc_config.get("patience", 5),
+            name=inc_name,
+            **_train_kwargs(config, device),
+            **_cache_train_kwargs(config, use_cache)
+        )
+    except Exception as e:
+        logger.error(f"Error durante el entrenamiento incremental: {e}")
+        return
+    _report_epoch_times(epoch_times, use_cache, output_dir)
+
+    candidate = os.path.join(run_dir, "weights/best.pt")
+    map_after = _val_map(candidate, data_yaml, config, device)
+    logger.info(f"mAP50-95 de validación después: {map_after:.4f} (antes: {map_before:.4f})")
+
+    max_drop = inc_config.get("max_map_drop", 0.01)
+    if map_after < map_before - max_drop:
+        logger.warning(f"El mAP cayó más de {max_drop}. Se conserva el modelo anterior; "
+                       f"candidato disponible en {candidate}")
+        return
+
+    shutil.copy2(candidate, trained_weights)
+    logger.info(f"Modelo incremental promovido a {trained_weights}")
+    replay = sorted(replay_epochs.used)
+    save_manifest(manifest, manifest_path, new_images + replay,
+                  {"mode": "incremental", "new": len(new_images), "replay": len(replay),
+                   "map_before": map_before, "map_after": map_after})
+
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo YOLO")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Entrenar solo con imágenes nuevas + muestra de repaso del histórico")
+    parser.add_argument("--cache-shards", action="store_true",
+                        help="Leer imágenes desde la caché de shards (generar antes con scripts/build_cache.py)")
+    args = parser.parse_args()
+
+    if args.incremental:
+        train_incremental(args.cache_shards)
+    else:
+        train_model(args.cache_shards)
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.config_watch import diff_cameras, restart_required, validate_config
+
+VALID = {"conf_threshold": 0.5, "iou_threshold": 0.7,
+         "cameras": {1: {"line": [0, 0, 100, 100], "terminal_id": "T1", "min_fps": 2, "max_fps": 15, "imgsz": 640,
+                         "zones": [{"name": "cinta", "polygon": [[0, 0], [10, 0], [10, 10]], "max_dwell": 30}]},
+                     "2": None}}
+
+def test_valid_config_has_no_errors():
+    assert validate_config(VALID) == []
+    assert validate_config({}) == []
+
+def test_invalid_values_are_reported():
+    assert validate_config([1, 2]) == ["el archivo no contiene un diccionario YAML"]
+    assert len(validate_config({"conf_threshold": 1.5, "iou_threshold": True})) == 2
+    assert validate_config({"cameras": [1]}) == ["'cameras' debe ser un diccionario {id: ajustes}"]
+    errors = validate_config({"cameras": {"cam": {"line": [0, 0, 1], "terminal_id": 7, "max_fps": 0,
+                                                  "imgsz": 640.0, "decode_threads": -1,
+                                                  "zones": [{"polygon": [[0, 0], [1, 1]], "max_dwell": -1}, "x"]}}})
+    assert len(errors) == 9
+    assert errors[0] == "id de cámara no numérico: 'cam'"
+    assert any("'polygon' necesita al menos 3 puntos" in e for e in errors)
+
+def test_diff_cameras():
+    new = {"cameras": {"1": {"line": [0, 0, 200, 200]}, 3: {"line": [0, 0, 1, 1]}}}
+    # Las claves texto y entero son la misma cámara; la entrada vacía "2" no cuenta
+    assert diff_cameras(VALID, new) == ([3], [], [1])
+    assert diff_cameras(VALID, VALID) == ([], [], [])
+    assert diff_cameras(None, new) == ([1, 3], [], [])
+    assert diff_cameras(new, {}) == ([], [1, 3], [])
+
+def test_restart_required_ignores_reloadable_sections():
+    old = dict(VALID, model="yolov8n.pt")
+    new = dict(VALID, model="yolov8s.pt", conf_threshold=0.3, cameras={})
+    assert restart_required(old, new) == ["model"]
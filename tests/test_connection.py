@@ -0,0 +1,42 @@
+import os
+import sys
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.connection import BACKOFF, CONNECTED, STALLED, Backoff, ConnectionMonitor
+
+def test_backoff_grows_exponentially_up_to_maximum():
+    backoff = Backoff(base=0.5, maximum=4.0, jitter=0.0)
+    # El primer reintento es inmediato
+    assert [backoff.next_delay() for _ in range(7)] == [0.0, 0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+    backoff.reset()
+    assert backoff.attempt == 0 and backoff.next_delay() == 0.0
+
+def test_backoff_jitter_stays_within_bounds():
+    backoff = Backoff(base=1.0, maximum=30.0, jitter=0.2)
+    backoff.next_delay()
+    delays = [backoff.next_delay() for _ in range(4)]
+    for n, delay in enumerate(delays):
+        assert 0.8 * 2 ** n <= delay <= 1.2 * 2 ** n
+    # Varias cámaras con el mismo número de intento no reintentan sincronizadas
+    others = [Backoff(base=1.0, jitter=0.2) for _ in range(5)]
+    for other in others:
+        other.attempt = 3
+    assert len({other.next_delay() for other in others}) > 1
+
+def test_monitor_counts_outages_and_reconnects():
+    monitor = ConnectionMonitor(1)
+    monitor.lost() # Primer intento fallido: aún no es una caída
+    assert monitor.connected() is not None
+    stats = monitor.stats()
+    assert stats["outages"] == 0 and stats["reconnects"] == 0 and stats["failed_attempts"] == 1
+
+    monitor.lost(STALLED)
+    monitor.lost(BACKOFF)
+    assert monitor.state == BACKOFF
+    latency = monitor.connected()
+    stats = monitor.stats()
+    assert monitor.state == CONNECTED
+    assert stats["outages"] == 1 and stats["reconnects"] == 1 and stats["failed_attempts"] == 2
+    assert stats["last_reconnect_s"] == round(latency, 2)
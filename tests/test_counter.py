@@ -0,0 +1,83 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.counter import LineCounter
+from utils.detections import DetectionBatch
+
+CLASS_NAMES = {0: "paquete", 1: "caja"}
+
+def batch(rows):
+    """
+    Lote de una cámara desde filas [x1, y1, x2, y2, track_id, conf, cls].
+    """
+    return DetectionBatch.from_arrays([np.array(rows, dtype=np.float32).reshape(-1, 7)])
+
+# _has_crossed_line usa np.cross con vectores 2D (obsoleto en NumPy 2)
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_crossed_mask_matches_scalar_version():
+    rng = np.random.default_rng(0)
+    lines = [((320, 0), (320, 360)), ((0, 180), (640, 180)), ((100, 50), (500, 300)), ((200, 200), (200, 200))]
+    for start, end in lines:
+        counter = LineCounter(start, end, CLASS_NAMES)
+        prev = rng.integers(0, 640, size=(500, 2))
+        current = rng.integers(0, 640, size=(500, 2))
+        # Casos límite: puntos exactamente sobre la línea y sin movimiento
+        prev[:10] = current[:10]
+        prev[10:20, 0] = current[10:20, 0] = start[0]
+        expected = [counter._has_crossed_line(a, b) for a, b in zip(prev.tolist(), current.tolist())]
+        assert counter._crossed_mask(prev, current).tolist() == expected
+
+def test_update_counts_each_track_once_and_returns_rows():
+    counter = LineCounter((320, 0), (320, 360), CLASS_NAMES)
+    assert len(counter.update(batch([[280, 100, 300, 120, 1, 0.9, 0], [100, 100, 120, 120, 2, 0.9, 1]]))) == 0
+    # Fila 0 sin track (-1), fila 1 cruza: el índice devuelto es la fila del lote original
+    rows = counter.update(batch([[0, 0, 10, 10, -1, 0.9, 0], [340, 100, 360, 120, 1, 0.9, 0],
+                                 [110, 100, 130, 120, 2, 0.9, 1]]))
+    assert rows.tolist() == [1]
+    assert counter.total_count == 1 and counter.counts == {"paquete": 1, "caja": 0}
+    # Volver a cruzar no cuenta de nuevo
+    counter.update(batch([[280, 100, 300, 120, 1, 0.9, 0]]))
+    assert counter.total_count == 1
+
+def test_update_accepts_legacy_tuples():
+    counter = LineCounter((320, 0), (320, 360), CLASS_NAMES)
+    counter.update([(280, 100, 300, 120, 7, 1)])
+    assert counter.update([(340, 100, 360, 120, 7, 1)]).tolist() == [0]
+    assert counter.counts["caja"] == 1
+
+def test_camera_returns_views():
+    detections = DetectionBatch.from_arrays([np.array([[0, 0, 10, 10, 0.9, 0]], np.float32),
+                                             np.array([[5, 5, 15, 15, 0.8, 1], [20, 20, 30, 30, 0.7, 0]], np.float32)])
+    assert detections.num_cameras == 2 and detections.offsets.tolist() == [0, 1, 3]
+    cam = detections.camera(1)
+    assert len(cam) == 2 and cam.cls.tolist() == [1, 0]
+    for column in ("boxes", "conf", "cls", "track_id", "cam_idx"):
+        assert np.shares_memory(getattr(cam, column), getattr(detections, column))
+    cam.boxes += 1 # Escribir en la vista modifica el lote (es lo que hace el reescalado del pipeline)
+    assert detections.boxes[1, 0] == 6
+
+def test_select_keeps_cameras():
+    detections = DetectionBatch.from_arrays([np.array([[0, 0, 10, 10, 0.9, 0]], np.float32),
+                                             np.zeros((0, 6), np.float32),
+                                             np.array([[5, 5, 15, 15, 0.8, 1], [20, 20, 30, 30, 0.2, 0]], np.float32)])
+    selected = detections.select(detections.conf > 0.5)
+    assert selected.num_cameras == 3
+    assert selected.offsets.tolist() == [0, 1, 1, 2]
+    assert selected.camera(2).conf.tolist() == [np.float32(0.8)]
+    assert selected.cam_idx.tolist() == [0, 2]
+
+def test_concat_one_camera_per_view():
+    a = DetectionBatch.from_arrays([np.array([[0, 0, 10, 10, 3, 0.9, 0]], np.float32),
+                                    np.array([[5, 5, 15, 15, 4, 0.8, 1]], np.float32)])
+    merged = DetectionBatch.concat([a.camera(1), DetectionBatch.empty(1), a.camera(0)])
+    assert merged.num_cameras == 3
+    assert merged.offsets.tolist() == [0, 1, 1, 2]
+    assert merged.track_id.tolist() == [4, 3]
+    assert merged.cam_idx.tolist() == [0, 2]
+    assert DetectionBatch.concat([]).num_cameras == 0
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.detections import DetectionBatch
+from utils.handoff import AppearanceGallery, HandoffMatcher, appearance_signature
+
+def unit(*values):
+    v = np.array(values, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+def test_match_respects_class_window_and_threshold():
+    gallery = AppearanceGallery(dim=3, capacity=8)
+    gallery.add(unit(1, 0, 0), timestamp=10.0, cls_id=0)
+    gallery.add(unit(0, 1, 0), timestamp=10.0, cls_id=1)
+    # Otra clase, fuera de la ventana [min_dt, max_dt] o por debajo del umbral: sin coincidencia
+    assert gallery.match(unit(0, 1, 0), 15.0, cls_id=0, min_dt=0, max_dt=30, threshold=0.8) is None
+    assert gallery.match(unit(1, 0, 0), 10.5, cls_id=0, min_dt=1, max_dt=30, threshold=0.8) is None
+    assert gallery.match(unit(1, 0, 0), 50.0, cls_id=0, min_dt=0, max_dt=30, threshold=0.8) is None
+    assert gallery.match(unit(1, 1, 0), 15.0, cls_id=0, min_dt=0, max_dt=30, threshold=0.8) is None
+    assert gallery.match(unit(1, 0.1, 0), 15.0, cls_id=0, min_dt=0, max_dt=30, threshold=0.8) > 0.99
+
+def test_match_consumes_entry_and_prefers_most_similar():
+    gallery = AppearanceGallery(dim=3, capacity=8)
+    gallery.add(unit(1, 1, 0), timestamp=0.0, cls_id=0)
+    gallery.add(unit(1, 0, 0), timestamp=0.0, cls_id=0)
+    assert gallery.match(unit(1, 0, 0), 1.0, 0, 0, 10, 0.5) == 1.0
+    # La entrada idéntica ya se consumió: ahora empareja con la otra
+    assert abs(gallery.match(unit(1, 0, 0), 1.0, 0, 0, 10, 0.5) - unit(1, 1, 0)[0]) < 1e-6
+    assert gallery.match(unit(1, 0, 0), 1.0, 0, 0, 10, 0.5) is None
+    assert len(gallery) == 0
+
+def test_evict_and_ring_overwrite():
+    gallery = AppearanceGallery(dim=3, capacity=2)
+    gallery.add(unit(1, 0, 0), 0.0, 0)
+    gallery.add(unit(0, 1, 0), 5.0, 0)
+    gallery.evict(before=1.0)
+    assert len(gallery) == 1
+    # Llena: se sobrescribe la posición más antigua
+    gallery.add(unit(0, 0, 1), 6.0, 0)
+    gallery.add(unit(1, 0, 0), 7.0, 0)
+    assert len(gallery) == 2
+    assert sorted(gallery.times.tolist()) == [6.0, 7.0]
+
+def test_matcher_flags_duplicate_in_destination_camera():
+    frame = np.zeros((100, 100, 3), dtype=np.uint8)
+    frame[10:40, 10:40] = (0, 0, 255)
+    detections = DetectionBatch.from_arrays([np.array([[10, 10, 40, 40, 1, 0.9, 0]], np.float32)])
+    matcher = HandoffMatcher([{"from": 1, "to": 2, "min_transit": 1.0, "max_transit": 10.0, "threshold": 0.9}])
+    assert matcher.process(1, frame, detections, np.array([0]), 0.0).tolist() == [False]
+    assert matcher.process(2, frame, detections, np.array([0]), 3.0).tolist() == [True]
+    # El conteo de origen ya se consumió
+    assert matcher.process(2, frame, detections, np.array([0]), 4.0).tolist() == [False]
+    assert matcher.duplicates == 1
+
+def test_signature_is_unit_norm_and_empty_outside_frame():
+    frame = np.random.default_rng(0).integers(0, 255, (50, 50, 3), dtype=np.uint8)
+    signature = appearance_signature(frame, (5, 5, 30, 30))
+    assert abs(float(signature @ signature) - 1.0) < 1e-5
+    assert not appearance_signature(frame, (60, 60, 80, 80)).any()
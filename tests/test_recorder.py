@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.recorder import FrameRing
+
+def jpeg(nbytes):
+    return np.zeros(nbytes, dtype=np.uint8)
+
+def test_ring_drops_frames_older_than_seconds():
+    ring = FrameRing(seconds=2.0, max_bytes=10_000)
+    for t in range(6):
+        ring.append(float(t), jpeg(100))
+    # Solo quedan los frames de [t - 2, t]; la antigüedad no cuenta como descarte por memoria
+    assert [t for t, _ in ring.frames] == [3.0, 4.0, 5.0]
+    assert ring.bytes == 300 and ring.evicted == 0
+    assert ring.latest() == 5.0 and ring.span() == 2.0
+
+def test_ring_stays_within_max_bytes():
+    ring = FrameRing(seconds=60.0, max_bytes=250)
+    for t in range(5):
+        ring.append(float(t), jpeg(100))
+        assert ring.bytes <= 250
+    assert len(ring) == 2 and ring.evicted == 3
+    assert ring.bytes == sum(data.nbytes for _, data in ring.frames)
+
+def test_ring_between_and_empty():
+    ring = FrameRing(seconds=10.0, max_bytes=10_000)
+    assert ring.latest() is None and ring.span() == 0.0
+    for t in (1.0, 2.0, 3.0, 4.0):
+        ring.append(t, jpeg(10))
+    assert [t for t, _ in ring.between(2.0, 3.0)] == [2.0, 3.0]
+    assert ring.between(5.0, 6.0) == []
+
+def test_oversized_frame_empties_ring():
+    ring = FrameRing(seconds=60.0, max_bytes=100)
+    ring.append(0.0, jpeg(50))
+    ring.append(1.0, jpeg(200))
+    assert len(ring) == 0 and ring.bytes == 0
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import numpy as np
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.detections import DetectionBatch
+from utils.resolution import ResolutionTiers
+
+FRAME_SHAPE = (360, 640)
+
+def boxes(*sides):
+    """
+    Lote de una cámara con una caja cuadrada por lado (en píxeles del frame).
+    """
+    rows = [[0, 0, side, side, 0.9, 0] for side in sides]
+    return DetectionBatch.from_arrays([np.array(rows, dtype=np.float32).reshape(-1, 6)])
+
+def test_steps_down_only_after_full_window():
+    tiers = ResolutionTiers(default=640, auto=True, min_box_px=48, window=3)
+    assert tiers.observe(1, boxes(200), FRAME_SHAPE) == 640
+    assert tiers.observe(1, boxes(200, 300), FRAME_SHAPE) == 640
+    # Con la ventana completa baja al escalón menor en el que la caja de 200 px sigue midiendo >= 48
+    assert tiers.observe(1, boxes(200), FRAME_SHAPE) == 320
+    assert tiers.get(1) == 320
+
+def test_steps_back_up_on_small_box():
+    tiers = ResolutionTiers(default=640, auto=True, min_box_px=48, window=3)
+    for _ in range(3):
+        tiers.observe(1, boxes(200), FRAME_SHAPE)
+    # Una caja de 80 px mide 40 px a 320: sube de inmediato, sin esperar a la ventana
+    assert tiers.observe(1, boxes(80), FRAME_SHAPE) == 480
+    assert tiers.observe(1, boxes(20), FRAME_SHAPE) == 640
+    # Mientras la caja pequeña siga en la ventana no vuelve a bajar
+    for _ in range(2):
+        assert tiers.observe(1, boxes(200), FRAME_SHAPE) == 640
+    assert tiers.observe(1, boxes(200), FRAME_SHAPE) == 320
+
+def test_never_exceeds_configured_imgsz():
+    tiers = ResolutionTiers(default=640, auto=True, min_box_px=48, window=1)
+    tiers.set_camera(2, 480)
+    assert tiers.observe(2, boxes(10), FRAME_SHAPE) == 480
+    assert tiers.observe(2, boxes(100), FRAME_SHAPE) == 320
+
+def test_fixed_without_auto_or_detections():
+    tiers = ResolutionTiers(default=640, auto=False, window=1)
+    assert tiers.observe(1, boxes(300), FRAME_SHAPE) == 640
+    auto = ResolutionTiers(default=640, auto=True, window=1)
+    assert auto.observe(1, boxes(), FRAME_SHAPE) == 640
+    assert auto.report() == ["CAM 1: imgsz 640 (config 640) | 640: 100%"]
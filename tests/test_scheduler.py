@@ -0,0 +1,64 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("ultralytics") # utils.scheduler -> utils.propagation -> utils.tracking
+from utils.scheduler import ActivityScheduler
+from utils.tracking import predict_bucketed
+
+def test_select_caps_at_batch_size_and_keeps_order():
+    scheduler = ActivityScheduler(batch_size=2, min_fps=1.0, max_fps=30.0)
+    for cam_id in (1, 2, 3):
+        scheduler.add_camera(cam_id).last_served = 0.0
+    scheduler.cameras[3].activity = 0.9
+    scheduler.cameras[1].proximity = 0.5
+    assert scheduler.select([1, 2, 3], now=0.5) == [1, 3]
+    assert scheduler.cameras[2].skipped == 1
+
+def test_select_returns_all_eligible_when_fewer_than_batch_size():
+    scheduler = ActivityScheduler(batch_size=4, max_fps=10.0)
+    assert scheduler.select([1, 2], now=0.0) == [1, 2]
+    # Atendidas hace menos de 1 / max_fps: no se repiten (el lote se rellena en la inferencia)
+    assert scheduler.select([1, 2], now=0.05) == []
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = data
+
+class _Result:
+    def __init__(self, value):
+        import torch
+        self.boxes = _Boxes(torch.tensor([[0, 0, 10, 10, 0.9, value]], dtype=torch.float32))
+
+class _Model:
+    """
+    Modelo falso que registra el tamaño de cada lote y devuelve una caja por frame cuya clase
+    es el valor del frame.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, source, **_):
+        self.batches.append(len(source))
+        return [_Result(float(frame[0, 0, 0])) for frame in source]
+
+def test_predict_pads_single_bucket_to_batch_size():
+    frames = [np.full((360, 640, 3), k, dtype=np.uint8) for k in range(2)]
+    model = _Model()
+    detections = predict_bucketed(model, frames, [640, 640], pad_to=4)
+    assert model.batches == [4]
+    assert detections.num_cameras == 2
+
+def test_predict_pads_only_free_slots_across_buckets():
+    frames = [np.full((360, 640, 3), k, dtype=np.uint8) for k in range(3)]
+    model = _Model()
+    detections = predict_bucketed(model, frames, [640, 640, 320], pad_to=4)
+    # El hueco libre va al bucket más grande: 4 imágenes en total, no 4 por bucket
+    assert model.batches == [3, 1]
+    assert detections.num_cameras == 3
+    assert [int(detections.camera(i).cls[0]) for i in range(3)] == [0, 1, 2]
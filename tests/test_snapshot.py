@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.counter import LineCounter
+from utils.snapshot import SnapshotWriter, counter_state, load_snapshot, restore_counter
+
+def counter_with_tracks():
+    counter = LineCounter((320, 0), (320, 360), {0: "paquete"})
+    counter.update([(280, 100, 300, 120, 1, 0), (280, 200, 300, 220, 2, 0), (100, 100, 120, 120, 3, 0)])
+    counter.update([(340, 100, 360, 120, 1, 0), (340, 200, 360, 220, 2, 0), (110, 100, 130, 120, 3, 0)])
+    return counter
+
+def test_counter_state_keeps_only_live_tracks():
+    counter = counter_with_tracks()
+    state = counter_state(counter, live_ids=[2, 3])
+    assert state["counted"].tolist() == [2]
+    assert sorted(state["hist_ids"].tolist()) == [2, 3]
+    # Los totales no dependen de los tracks vivos
+    assert int(state["total"]) == 2
+    restored = LineCounter((320, 0), (320, 360), {0: "paquete"})
+    restore_counter(restored, state)
+    assert restored.counts == {"paquete": 2} and restored.counted_ids == {2}
+    assert restored.track_history[3] == counter.track_history[3]
+    # Sin live_ids se guarda todo
+    assert sorted(counter_state(counter)["counted"].tolist()) == [1, 2]
+
+def test_final_save_is_synchronous(tmp_path):
+    path = str(tmp_path / "state.npz")
+    writer = SnapshotWriter(path, interval=10)
+    states = {1: counter_state(counter_with_tracks())}
+    assert writer.save(states, 7)
+    # El snapshot final espera a la escritura en curso y ya está en disco al volver
+    assert writer.save(states, 9, final=True)
+    loaded, meta = load_snapshot(path, max_age=60)
+    assert meta["max_track_id"] == 9
+    assert loaded[1]["total"] == 2
+    assert writer.saved == 2 and writer.skipped == 0
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("ultralytics")
+from utils.tracking import (create_tracker, update_tracker, tracker_state, restore_tracker, max_track_id,
+                            reserve_track_ids)
+
+FRAME_SHAPE = (360, 640)
+
+def detections(step):
+    boxes = np.array([[100, 100, 160, 160], [300, 200, 380, 260]], dtype=np.float32)
+    boxes[:, 0::2] += 5 * step
+    return boxes, np.array([0.9, 0.8], dtype=np.float32), np.array([0, 1], dtype=np.float32)
+
+def test_restored_ids_survive_tracker_creation():
+    # Como al arrancar con snapshot: se reservan los ids y después se crean los trackers
+    create_tracker()
+    reserve_track_ids(max_track_id() + 500)
+    restored = max_track_id()
+    tracker = create_tracker()
+    create_tracker() # Una segunda cámara tampoco debe reiniciar el contador
+    tracks = update_tracker(tracker, *detections(0), FRAME_SHAPE)
+    assert len(tracks)
+    assert tracks[:, 4].min() > restored
+
+def test_tracker_state_roundtrip_without_pickle(tmp_path):
+    tracker = create_tracker()
+    for step in range(5):
+        expected = update_tracker(tracker, *detections(step), FRAME_SHAPE)
+
+    path = tmp_path / "state.npz"
+    np.savez(path, **tracker_state(tracker))
+    with np.load(path, allow_pickle=False) as data:
+        state = {key: data[key] for key in data.files}
+
+    restored = create_tracker()
+    restore_tracker(restored, state)
+    assert restored.frame_id == tracker.frame_id
+    # El siguiente frame da los mismos ids y cajas en el tracker original y en el restaurado
+    original = update_tracker(tracker, *detections(5), FRAME_SHAPE)
+    resumed = update_tracker(restored, *detections(5), FRAME_SHAPE)
+    assert sorted(original[:, 4]) == sorted(resumed[:, 4]) == sorted(expected[:, 4])
+    np.testing.assert_allclose(original[np.argsort(original[:, 4]), :4], resumed[np.argsort(resumed[:, 4]), :4],
+                               atol=1e-3)
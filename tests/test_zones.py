@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.detections import DetectionBatch
+from utils.zones import ZoneEngine
+
+FRAME_SHAPE = (360, 640)
+ZONES = [{"name": "cinta", "polygon": [[0, 0], [200, 0], [200, 360], [0, 360]], "max_dwell": 2.0},
+         {"name": "salida", "polygon": [[400, 0], [640, 0], [640, 360], [400, 360]]}]
+
+def tracks(*points):
+    """
+    Lote de una cámara con un track por (track_id, x, y) (caja de 10x10 centrada en x, y).
+    """
+    rows = [[x - 5, y - 5, x + 5, y + 5, tid, 0.9, 0] for tid, x, y in points]
+    return DetectionBatch.from_arrays([np.array(rows, dtype=np.float32).reshape(-1, 7)])
+
+def test_enter_exit_and_occupancy():
+    engine = ZoneEngine(ZONES)
+    # Aparecer ya dentro de una zona no es una entrada (no se vio cruzar el borde)
+    events = engine.update(tracks((1, 100, 100), (2, 300, 100)), FRAME_SHAPE, 0.0)
+    assert events["entered"].tolist() == [0, 0, 0]
+    assert engine.occupancy.tolist() == [1, 1, 0]
+
+    events = engine.update(tracks((1, 300, 100), (2, 500, 100)), FRAME_SHAPE, 1.0)
+    assert events["exited"].tolist() == [0, 1, 0]
+    assert events["entered"].tolist() == [0, 0, 1]
+    assert engine.occupancy.tolist() == [1, 0, 1]
+    assert engine.entered.tolist() == [0, 0, 1] and engine.exited.tolist() == [0, 1, 0]
+
+def test_dwell_alert_once_and_reset_on_exit():
+    engine = ZoneEngine(ZONES)
+    engine.update(tracks((1, 100, 100)), FRAME_SHAPE, 0.0)
+    assert engine.update(tracks((1, 100, 110)), FRAME_SHAPE, 1.5)["stuck"] == []
+    stuck = engine.update(tracks((1, 100, 120)), FRAME_SHAPE, 2.5)["stuck"]
+    assert stuck == [(1, "cinta", 2.5)]
+    # La alerta no se repite mientras siga en la zona
+    assert engine.update(tracks((1, 100, 130)), FRAME_SHAPE, 3.0)["stuck"] == []
+    assert engine.alerts == 1
+    assert engine.dwell_times(3.0) == {"cinta": 3.0}
+
+    # Salir y volver a entrar reinicia el tiempo de permanencia
+    engine.update(tracks((1, 300, 130)), FRAME_SHAPE, 3.5)
+    engine.update(tracks((1, 100, 130)), FRAME_SHAPE, 4.0)
+    assert engine.update(tracks((1, 100, 130)), FRAME_SHAPE, 5.0)["stuck"] == []
+    assert engine.update(tracks((1, 100, 130)), FRAME_SHAPE, 6.5)["stuck"] == [(1, "cinta", 2.5)]
+
+def test_zone_without_max_dwell_never_alerts():
+    engine = ZoneEngine(ZONES)
+    engine.update(tracks((1, 500, 100)), FRAME_SHAPE, 0.0)
+    assert engine.update(tracks((1, 500, 100)), FRAME_SHAPE, 1000.0)["stuck"] == []
+
+def test_forgets_tracks_after_ttl():
+    engine = ZoneEngine(ZONES, track_ttl=5.0)
+    engine.update(tracks((1, 100, 100), (2, 500, 100)), FRAME_SHAPE, 0.0)
+    engine.update(tracks((2, 500, 100)), FRAME_SHAPE, 10.0)
+    assert engine.ids.tolist() == [2]
+    # Un track olvidado que reaparece es nuevo: no genera salida/entrada
+    events = engine.update(tracks((1, 500, 100), (2, 500, 100)), FRAME_SHAPE, 11.0)
+    assert events["entered"].sum() == 0 and events["exited"].sum() == 0
+
+def test_untracked_detections_are_ignored():
+    engine = ZoneEngine(ZONES)
+    engine.update(tracks((-1, 100, 100), (3, 500, 100)), FRAME_SHAPE, 0.0)
+    assert engine.ids.tolist() == [3]
+    assert engine.occupancy.tolist() == [0, 0, 1]
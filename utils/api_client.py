@@ -30,6 +30,47 @@ def send_count_data(terminal_id, package_type, detection_time=None):
     thread.daemon = True
     thread.start()
 
+def send_counts(terminal_id, detections, rows, class_names, detection_time=None):
+    """
+    Envía a la API los conteos de un frame leyendo directamente las columnas del DetectionBatch.
+    Todos los payloads del frame se envían desde un único hilo.
+
+    :param terminal_id: ID de la cámara (ObjectId de MongoDB como string).
+    :param detections: DetectionBatch de una cámara.
+    :param rows: Índices de las filas contadas (lo que devuelve LineCounter.update).
+    :param class_names: Diccionario {class_id: nombre}.
+    :param detection_time: Fecha/hora de detección (datetime). Si es None, usa ahora.
+    """
+    if not len(rows):
+        return
+    if detection_time is None:
+        detection_time = datetime.datetime.now()
+
+    timestamp = detection_time.isoformat()
+    payloads = [{"detectionTime": timestamp, "tipoPaquete": class_names.get(cls_id, "unknown"), "terminal": terminal_id}
+                for cls_id in detections.cls[rows].tolist()]
+
+    thread = threading.Thread(target=_send_requests, args=(payloads,))
+    thread.daemon = True
+    thread.start()
+
+def send_events(events):
+    """
+    Envía a la API eventos de conteo ya construidos (ver utils.event_log.build_events),
+    p. ej. los que el coordinador recibe de los workers. Se omiten los eventos sin terminal.
+    """
+    payloads = [{"detectionTime": e["time"], "tipoPaquete": e["class"], "terminal": e["terminal"]}
+                for e in events if e.get("terminal")]
+    if not payloads:
+        return
+    thread = threading.Thread(target=_send_requests, args=(payloads,))
+    thread.daemon = True
+    thread.start()
+
+def _send_requests(payloads):
+    for payload in payloads:
+        _send_request(payload)
+
 def _send_request(payload):
     try:
         # Log del envío
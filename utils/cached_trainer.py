@@ -0,0 +1,81 @@
+import os
+import functools
+import numpy as np
+from ultralytics.data import build as data_build
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer
+
+from utils.shard_cache import ShardCache
+
+class CachedYOLODataset(YOLODataset):
+    """
+    YOLODataset que lee imágenes ya decodificadas y en letterbox desde los shards
+    generados por scripts/build_cache.py, en lugar de decodificar JPEG en cada época.
+    """
+    def __init__(self, *args, cache_dir=None, **kwargs):
+        # Debe existir antes de super().__init__, que llama a get_labels()
+        self.shard_cache = ShardCache(cache_dir)
+        imgsz = kwargs.get("imgsz", 640)
+        if self.shard_cache.imgsz != imgsz:
+            # Las imágenes ya están en letterbox: con otro imgsz las cajas y la escala no corresponderían
+            raise ValueError(f"La caché {cache_dir} se construyó con imgsz={self.shard_cache.imgsz} y el "
+                             f"entrenamiento usa imgsz={imgsz}. Ejecute scripts/build_cache.py --imgsz {imgsz}.")
+        super().__init__(*args, **kwargs)
+
+    def get_labels(self):
+        size = self.shard_cache.imgsz
+        labels = []
+        missing = 0
+        for im_file in self.im_files:
+            name = os.path.basename(im_file)
+            if name not in self.shard_cache:
+                missing += 1
+                continue
+            lb = self.shard_cache.labels(name)
+            labels.append({
+                "im_file": im_file,
+                "shape": (size, size),
+                "cls": lb[:, 0:1].copy(),
+                "bboxes": lb[:, 1:5].copy(),
+                "segments": [],
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        if missing:
+            print(f"[WARN] {missing} imágenes no están en la caché {self.shard_cache.cache_dir}. "
+                  "Ejecute scripts/build_cache.py para actualizarla.")
+        if not labels:
+            raise FileNotFoundError(f"Ninguna imagen de {self.img_path} está en la caché de shards.")
+        self.im_files = [lb["im_file"] for lb in labels]
+        return labels
+
+    def load_image(self, i, rect_mode=True):
+        # Copia desde el memmap (las augmentations modifican la imagen in-place)
+        im = np.array(self.shard_cache.image(os.path.basename(self.im_files[i])))
+        hw = im.shape[:2]
+        if self.augment:
+            # Mosaic elige sus compañeros de self.buffer: solo guardamos índices, no imágenes,
+            # para que la RAM no crezca con el dataset.
+            self.buffer.append(i)
+            if len(self.buffer) > self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, hw, hw
+
+class CachedDetectionTrainer(DetectionTrainer):
+    """
+    DetectionTrainer que construye sus datasets a partir de la caché de shards.
+    La raíz de la caché se fija en el atributo de clase `cache_root` antes de entrenar.
+    """
+    cache_root = "data/cache"
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        # Se reutiliza build_dataset / build_yolo_dataset de Ultralytics cambiando solo la clase del
+        # dataset, para no copiar sus argumentos (cambian entre versiones del rango fijado)
+        cache_dir = os.path.join(self.cache_root, "train" if mode == "train" else "val")
+        original = data_build.YOLODataset
+        data_build.YOLODataset = functools.partial(CachedYOLODataset, cache_dir=cache_dir)
+        try:
+            return super().build_dataset(img_path, mode, batch)
+        finally:
+            data_build.YOLODataset = original
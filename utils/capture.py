@@ -0,0 +1,270 @@
+import shutil
+import subprocess
+import threading
+import cv2
+import numpy as np
+
+# Backends de captura intercambiables para RTSPStream. Todos exponen la misma interfaz que
+# cv2.VideoCapture (isOpened / read / release) más set_idle() para decodificar solo keyframes.
+# Todos entregan frames BGR de 3 canales; width/height es opcional y se conserva la relación de aspecto.
+
+def _is_rtsp(url):
+    return str(url).lower().startswith("rtsp://")
+
+def fit_size(src_w, src_h, width=None, height=None):
+    """
+    Tamaño de salida que cabe en width x height conservando la relación de aspecto del origen
+    (sin ampliar y con dimensiones pares, como pide swscale en YUV 4:2:0).
+    :return: (ancho, alto). Sin width ni height, el tamaño de origen.
+    """
+    scale = min(width / src_w if width else 1.0, height / src_h if height else 1.0, 1.0)
+    if scale == 1.0:
+        return src_w, src_h
+    return max(2, int(src_w * scale) // 2 * 2), max(2, int(src_h * scale) // 2 * 2)
+
+class OpenCVCapture:
+    """
+    Captura con cv2.VideoCapture (backend por defecto y fallback). Decodifica a resolución
+    completa; si se pide width/height, redimensiona después de decodificar (conservando la
+    relación de aspecto).
+    """
+    name = "opencv"
+
+    def __init__(self, url, width=None, height=None, open_timeout=5.0, read_timeout=3.0, **_):
+        self.box = (width, height)
+        if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+            self.cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG,
+                                        [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(open_timeout * 1000),
+                                         cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(read_timeout * 1000)])
+        else:
+            self.cap = cv2.VideoCapture(url)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self):
+        grabbed, frame = self.cap.read()
+        if grabbed and any(self.box):
+            size = fit_size(frame.shape[1], frame.shape[0], *self.box)
+            if size != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return grabbed, frame
+
+    def set_idle(self, idle):
+        pass # OpenCV no permite saltar frames no-clave en el decodificador
+
+    def abort(self):
+        # Liberar la captura mientras otro hilo está en read() no es seguro en OpenCV: el lector
+        # la libera él mismo cuando su read() vuelve (CAP_PROP_READ_TIMEOUT_MSEC) y RTSPStream
+        # limita cuántos lectores bloqueados puede haber a la vez
+        pass
+
+    def release(self):
+        self.cap.release()
+
+class PyAVCapture:
+    """
+    Captura con PyAV (libav en proceso). El escalado y la conversión de formato se hacen en
+    una sola pasada de swscale desde YUV, sin generar antes el frame BGR a resolución completa.
+    En modo inactivo el decodificador descarta los frames que no son clave.
+    """
+    name = "pyav"
+
+    def __init__(self, url, width=None, height=None, threads=0, open_timeout=5.0, read_timeout=3.0, **_):
+        import av
+
+        self.av = av
+        self.width, self.height = width, height
+        self.idle = self.want_idle = False
+        self.container = None
+        options = {"rtsp_transport": "tcp"} if _is_rtsp(url) else {}
+        try:
+            self.container = av.open(str(url), options=options, timeout=(open_timeout, read_timeout))
+            self.stream = self.container.streams.video[0]
+            self.stream.thread_type = "AUTO"
+            self.stream.codec_context.thread_count = threads # 0 = automático
+            self.frames = self.container.decode(self.stream)
+        except Exception as e:
+            print(f"[WARN] PyAV no pudo abrir {url}: {e}")
+            self.release()
+
+    def isOpened(self):
+        return self.container is not None
+
+    def read(self):
+        if self.container is None:
+            return False, None
+        if self.want_idle != self.idle:
+            # skip_frame se cambia desde el hilo lector: el códec no admite cambios mientras decodifica
+            self.idle = self.want_idle
+            self.stream.codec_context.skip_frame = "NONKEY" if self.idle else "DEFAULT"
+        try:
+            frame = next(self.frames)
+        except (StopIteration, self.av.error.FFmpegError, OSError):
+            return False, None
+        kwargs = {"format": "bgr24"}
+        if self.width or self.height:
+            width, height = fit_size(frame.width, frame.height, self.width, self.height)
+            kwargs.update(width=width, height=height)
+        return True, frame.to_ndarray(**kwargs)
+
+    def set_idle(self, idle):
+        self.want_idle = idle # Se aplica en el siguiente read()
+
+    def abort(self):
+        pass # av.open ya aplica el timeout de lectura
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+
+class FFmpegCapture:
+    """
+    Captura con un subproceso ffmpeg que escribe frames raw por stdout. El tamaño de origen se
+    obtiene con ffprobe al abrir (rawvideo no lleva cabecera) y el escalado, si se pide, lo hace
+    ffmpeg con -vf scale. Cambiar a modo inactivo relanza el proceso con -skip_frame nokey
+    (lo hace el hilo lector en su siguiente read(), no quien llama a set_idle).
+    """
+    name = "ffmpeg"
+
+    def __init__(self, url, width=None, height=None, threads=0, open_timeout=5.0, read_timeout=3.0, **_):
+        self.url = str(url)
+        self.threads = threads
+        self.open_timeout = open_timeout
+        self.read_timeout = read_timeout
+        self.idle = self.want_idle = False
+        self.aborted = False
+        self.proc = None
+        self.pending = None
+        self.lock = threading.Lock()
+        size = self._probe_size()
+        if size is None:
+            print(f"[WARN] ffprobe no pudo leer la resolución de {url}")
+            return
+        self.width, self.height = fit_size(*size, width, height)
+        self.frame_bytes = self.width * self.height * 3
+        self._start()
+        # ffmpeg no informa si abrió el stream hasta que entrega datos: se lee el primer frame aquí
+        grabbed, self.pending = self._read_frame()
+        if not grabbed:
+            self.release()
+
+    def _probe_size(self):
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=width,height",
+               "-of", "csv=p=0:s=x"]
+        if _is_rtsp(self.url):
+            cmd += ["-rtsp_transport", "tcp", "-timeout", str(int(self.open_timeout * 1e6))]
+        try:
+            out = subprocess.run(cmd + [self.url], capture_output=True, text=True, stdin=subprocess.DEVNULL,
+                                 timeout=self.open_timeout * 2).stdout
+            width, height = out.split()[0].split("x")[:2]
+            return int(width), int(height)
+        except (OSError, subprocess.TimeoutExpired, ValueError, IndexError):
+            return None
+
+    def _command(self):
+        cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if _is_rtsp(self.url):
+            cmd += ["-rtsp_transport", "tcp", "-timeout", str(int(self.open_timeout * 1e6))]
+        cmd += ["-threads", str(self.threads)]
+        if self.idle:
+            cmd += ["-skip_frame", "nokey"]
+        # -vsync 0: sin él ffmpeg duplica frames para mantener la tasa y anula el ahorro de -skip_frame
+        cmd += ["-i", self.url, "-an", "-vsync", "0", "-vf", f"scale={self.width}:{self.height}",
+                "-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+        return cmd
+
+    def _start(self):
+        try:
+            self.proc = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                         bufsize=self.frame_bytes)
+        except OSError as e:
+            print(f"[WARN] No se pudo lanzar ffmpeg: {e}")
+            self.proc = None
+
+    def isOpened(self):
+        return self.proc is not None
+
+    def _read_frame(self):
+        proc = self.proc
+        if proc is None:
+            return False, None
+        data = proc.stdout.read(self.frame_bytes)
+        if len(data) != self.frame_bytes:
+            return False, None
+        return True, np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+
+    def read(self):
+        if self.pending is not None:
+            frame, self.pending = self.pending, None
+            return True, frame
+        if self.want_idle != self.idle:
+            with self.lock:
+                # Una captura liberada o abortada no se relanza (quedaría un ffmpeg huérfano)
+                if self.proc is not None and not self.aborted:
+                    self.idle = self.want_idle
+                    self._stop()
+                    self._start()
+        return self._read_frame()
+
+    def set_idle(self, idle):
+        # Solo se anota: relanzar ffmpeg (reconexión RTSP) aquí bloquearía al hilo de inferencia
+        self.want_idle = idle
+
+    def _stop(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def abort(self):
+        """
+        Mata el proceso para desbloquear un read() colgado en otro hilo.
+        """
+        with self.lock:
+            self.aborted = True
+            if self.proc is not None:
+                self.proc.kill()
+
+    def release(self):
+        with self.lock:
+            self._stop()
+
+BACKENDS = {"opencv": OpenCVCapture, "pyav": PyAVCapture, "ffmpeg": FFmpegCapture}
+
+def backend_available(backend):
+    if backend == "pyav":
+        try:
+            import av # noqa: F401
+        except ImportError:
+            return False
+    elif backend == "ffmpeg":
+        return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+    return backend in BACKENDS
+
+def create_capture(url, backend="opencv", **options):
+    """
+    Abre una captura con el backend pedido; si no está disponible (PyAV no instalado,
+    ffmpeg fuera del PATH) se usa OpenCV.
+    :param options: width, height, threads, open_timeout, read_timeout.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de captura desconocido: '{backend}'. Opciones: {list(BACKENDS)}")
+    # Modelo, dibujo y grabación trabajan con frames BGR de 3 canales
+    if options.pop("pix_fmt", "bgr24") != "bgr24":
+        raise ValueError("Solo se admite pix_fmt 'bgr24' (el resto del sistema espera frames BGR de 3 canales)")
+    if not backend_available(backend):
+        print(f"[WARN] Backend de captura '{backend}' no disponible, usando OpenCV.")
+        backend = "opencv"
+    return BACKENDS[backend](url, **options)
+
+def substream_url(url, replace=None):
+    """
+    Convierte la URL del stream principal en la del substream de baja resolución
+    (ej. replace=["/Channels/101", "/Channels/102"] en cámaras Hikvision).
+    """
+    if not replace or not _is_rtsp(url):
+        return url
+    old, new = replace
+    return url.replace(old, new)
@@ -0,0 +1,108 @@
+import time
+import numpy as np
+
+from utils.detections import DetectionBatch
+from utils.propagation import point_segment_distance
+from utils.tracking import predict_bucketed, predict_detections
+
+class CascadeDetector:
+    """
+    Cascada de dos modelos: el rápido (nano) procesa todos los frames y solo los frames
+    ambiguos se re-procesan, en un único lote entre cámaras, con el modelo preciso (small).
+
+    Un frame es ambiguo si tiene alguna detección con confianza dentro de `conf_band`
+    o alguna detección cuyo centroide está a menos de `line_margin` px de la línea de conteo
+    (donde un error cambia el conteo).
+    """
+    def __init__(self, fast_model, accurate_model, conf=0.25, iou=0.45, device=None,
+                 conf_band=(0.15, 0.5), line_margin=40):
+        self.fast_model = fast_model
+        self.accurate_model = accurate_model
+        self.conf = conf
+        self.iou = iou
+        self.device = device
+        self.band_low, self.band_high = conf_band
+        self.line_margin = line_margin
+        self.pad_to = None # Tamaño fijo de lote (planificador), ver utils.tracking.predict_detections
+
+        if dict(fast_model.names) != dict(accurate_model.names):
+            print("[WARN] Los modelos de la cascada tienen clases distintas: "
+                  f"{fast_model.names} vs {accurate_model.names}")
+
+        self.frames = 0
+        self.escalated = 0
+        self.fast_batches = 0
+        self.fast_time = 0.0
+        self.accurate_batches = 0
+        self.accurate_time = 0.0
+
+    def _is_ambiguous(self, detections, line):
+        boxes, conf = detections.boxes, detections.conf
+        if not len(conf):
+            return False
+        if np.any((conf >= self.band_low) & (conf < self.band_high)):
+            return True
+        if line is not None and self.line_margin > 0:
+            relevant = conf >= self.band_low
+            if np.any(relevant):
+                centroids = (boxes[relevant, :2] + boxes[relevant, 2:]) / 2
+                return bool(point_segment_distance(centroids, *line).min() < self.line_margin)
+        return False
+
+    def _predict(self, model, frames, sizes, conf):
+        if sizes is None:
+            return predict_detections(model, frames, self.pad_to, conf=conf, iou=self.iou, device=self.device)
+        return predict_bucketed(model, frames, sizes, self.pad_to, conf=conf, iou=self.iou, device=self.device)
+
+    def detect(self, frames, lines=None, sizes=None):
+        """
+        :param frames: Lista de frames BGR (uno por cámara).
+        :param lines: Lista paralela de líneas ((x1, y1), (x2, y2)) o None por cámara.
+        :param sizes: Lista paralela de imgsz por cámara (ver utils.resolution) o None.
+        :return: DetectionBatch (una cámara por frame).
+        """
+        if not frames:
+            return DetectionBatch.empty(0)
+        lines = lines or [None] * len(frames)
+
+        # El modelo rápido usa el umbral inferior de la banda para ver también las detecciones dudosas
+        start = time.perf_counter()
+        fast_conf = min(self.conf, self.band_low)
+        fast = self._predict(self.fast_model, frames, sizes, fast_conf)
+        self.fast_time += time.perf_counter() - start
+        self.fast_batches += 1
+
+        escalate = [i for i, line in enumerate(lines) if self._is_ambiguous(fast.camera(i), line)]
+        views = [fast.camera(i) for i in range(len(frames))]
+
+        if escalate:
+            start = time.perf_counter()
+            accurate = self._predict(self.accurate_model, [frames[i] for i in escalate],
+                                     [sizes[i] for i in escalate] if sizes is not None else None, self.conf)
+            self.accurate_time += time.perf_counter() - start
+            self.accurate_batches += 1
+            for j, i in enumerate(escalate):
+                views[i] = accurate.camera(j)
+
+        self.frames += len(frames)
+        self.escalated += len(escalate)
+        batch = DetectionBatch.concat(views)
+        if fast_conf < self.conf:
+            # Las detecciones del modelo rápido bajo el umbral final solo servían para decidir el escalado
+            batch = batch.select(batch.conf >= self.conf)
+        return batch
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "escalated": self.escalated,
+            "escalation_rate": self.escalated / self.frames if self.frames else 0.0,
+            "fast_ms_per_batch": 1000 * self.fast_time / self.fast_batches if self.fast_batches else 0.0,
+            "accurate_ms_per_batch": 1000 * self.accurate_time / self.accurate_batches if self.accurate_batches else 0.0,
+        }
+
+    def report(self):
+        s = self.stats()
+        return (f"escalado {100 * s['escalation_rate']:.1f}% de {s['frames']} frames | "
+                f"rápido {s['fast_ms_per_batch']:.1f} ms/lote | preciso {s['accurate_ms_per_batch']:.1f} ms/lote "
+                f"({self.accurate_batches} lotes)")
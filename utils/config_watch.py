@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+import yaml
+
+# Secciones que se aplican en caliente; el resto (modelo, captura, pipeline...) requiere reiniciar
+RELOADABLE = ("cameras", "conf_threshold", "iou_threshold")
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_point(value):
+    return isinstance(value, (list, tuple)) and len(value) == 2 and all(_is_number(v) for v in value)
+
+def validate_config(config):
+    """
+    Comprueba las secciones recargables antes de aplicarlas.
+    :return: Lista de errores (vacía si la configuración es válida).
+    """
+    if not isinstance(config, dict):
+        return ["el archivo no contiene un diccionario YAML"]
+    errors = []
+    for key in ("conf_threshold", "iou_threshold"):
+        value = config.get(key)
+        if value is not None and not (_is_number(value) and 0 <= value <= 1):
+            errors.append(f"{key} debe estar entre 0 y 1 (valor: {value!r})")
+    cameras = config.get("cameras") or {}
+    if not isinstance(cameras, dict):
+        return errors + ["'cameras' debe ser un diccionario {id: ajustes}"]
+    for cam_id, settings in cameras.items():
+        if not isinstance(cam_id, int) and not str(cam_id).isdigit():
+            errors.append(f"id de cámara no numérico: {cam_id!r}")
+        if settings is None:
+            continue
+        if not isinstance(settings, dict):
+            errors.append(f"cámara {cam_id}: los ajustes deben ser un diccionario")
+            continue
+        line = settings.get("line")
+        if line is not None and not (isinstance(line, list) and len(line) == 4 and all(_is_number(v) for v in line)):
+            errors.append(f"cámara {cam_id}: 'line' debe ser [x1, y1, x2, y2] (valor: {line!r})")
+        terminal_id = settings.get("terminal_id")
+        if terminal_id is not None and not isinstance(terminal_id, str):
+            errors.append(f"cámara {cam_id}: 'terminal_id' debe ser texto")
+        for key in ("min_fps", "max_fps"):
+            value = settings.get(key)
+            if value is not None and not (_is_number(value) and value > 0):
+                errors.append(f"cámara {cam_id}: '{key}' debe ser un número positivo")
+        for key, minimum in (("imgsz", 1), ("decode_threads", 0)):
+            value = settings.get(key)
+            if value is not None and not (_is_int(value) and value >= minimum):
+                errors.append(f"cámara {cam_id}: '{key}' debe ser un entero >= {minimum} (valor: {value!r})")
+        zones = settings.get("zones") or []
+        if not isinstance(zones, list):
+            errors.append(f"cámara {cam_id}: 'zones' debe ser una lista")
+            continue
+        for k, zone in enumerate(zones):
+            if not isinstance(zone, dict):
+                errors.append(f"cámara {cam_id}, zona {k + 1}: debe ser un diccionario")
+                continue
+            polygon = zone.get("polygon")
+            if not (isinstance(polygon, list) and len(polygon) >= 3 and all(_is_point(p) for p in polygon)):
+                errors.append(f"cámara {cam_id}, zona {k + 1}: 'polygon' necesita al menos 3 puntos [x, y]")
+            max_dwell = zone.get("max_dwell")
+            if max_dwell is not None and not (_is_number(max_dwell) and max_dwell > 0):
+                errors.append(f"cámara {cam_id}, zona {k + 1}: 'max_dwell' debe ser un número positivo "
+                              f"(valor: {max_dwell!r})")
+    return errors
+
+def camera_settings(config):
+    """
+    :return: {cam_id (int): ajustes} sin las entradas vacías.
+    """
+    return {int(cam_id): settings for cam_id, settings in ((config or {}).get("cameras") or {}).items() if settings}
+
+def diff_cameras(old_config, new_config):
+    """
+    :return: (añadidas, eliminadas, modificadas) como listas ordenadas de cam_id.
+    """
+    old, new = camera_settings(old_config), camera_settings(new_config)
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    changed = sorted(cam_id for cam_id in set(old) & set(new) if old[cam_id] != new[cam_id])
+    return added, removed, changed
+
+def restart_required(old_config, new_config):
+    """
+    :return: Secciones modificadas que no se pueden aplicar en caliente.
+    """
+    keys = set(old_config or {}) | set(new_config or {})
+    return sorted(k for k in keys if k not in RELOADABLE and (old_config or {}).get(k) != (new_config or {}).get(k))
+
+class ConfigWatcher:
+    """
+    Vigila config.yaml (mtime y tamaño, sondeado en un hilo) y valida cada versión nueva.
+    El bucle principal recoge la configuración válida con poll() y la aplica entre dos
+    frames, así que una recarga se aplica completa o no se aplica.
+    """
+    def __init__(self, path="config.yaml", interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.signature = self._signature()
+        self.pending = None
+        self.lock = threading.Lock()
+        self.reloads = 0
+        self.rejected = 0
+        self.stopped = False
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _watch_loop(self):
+        while not self.stopped:
+            time.sleep(self.interval)
+            signature = self._signature()
+            if signature is None or signature == self.signature:
+                continue
+            # Esperar a que el editor termine de escribir (el archivo deja de cambiar)
+            time.sleep(0.2)
+            if self._signature() != signature:
+                continue
+            self.signature = signature
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    config = yaml.safe_load(f)
+            except (OSError, yaml.YAMLError) as e:
+                print(f"[WARN] Recarga de {self.path} rechazada: no se pudo leer ({e})")
+                self.rejected += 1
+                continue
+            errors = validate_config(config)
+            if errors:
+                print(f"[WARN] Recarga de {self.path} rechazada: {'; '.join(errors)}")
+                self.rejected += 1
+                continue
+            with self.lock:
+                self.pending = config
+
+    def poll(self):
+        """
+        :return: Nueva configuración validada pendiente de aplicar, o None.
+        """
+        with self.lock:
+            config, self.pending = self.pending, None
+        if config is not None:
+            self.reloads += 1
+        return config
+
+    def stop(self):
+        self.stopped = True
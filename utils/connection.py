@@ -0,0 +1,111 @@
+import random
+import threading
+import time
+
+# Estados de la conexión de una cámara
+CONNECTING = "connecting" # Abriendo el stream
+CONNECTED = "connected"   # Recibiendo frames
+BACKOFF = "backoff"       # Esperando antes del siguiente intento
+STALLED = "stalled"       # Sin frames dentro del timeout de lectura (stream congelado)
+STOPPED = "stopped"
+
+class Backoff:
+    """
+    Espera entre reintentos: el primero es inmediato y los siguientes crecen
+    exponencialmente (base * 2^n, hasta `maximum`) con un jitter aleatorio para que
+    varias cámaras caídas a la vez no reintenten sincronizadas.
+    """
+    def __init__(self, base=0.5, maximum=30.0, jitter=0.2):
+        self.base = base
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempt = 0
+
+    def next_delay(self):
+        attempt = self.attempt
+        self.attempt += 1
+        if attempt == 0:
+            return 0.0
+        delay = min(self.maximum, self.base * 2 ** (attempt - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reset(self):
+        self.attempt = 0
+
+class ConnectionMonitor:
+    """
+    Máquina de estados de la conexión de una cámara con métricas de disponibilidad:
+    caídas, reconexiones, latencia de reconexión y tiempo total sin señal.
+    """
+    def __init__(self, cam_id):
+        self.cam_id = cam_id
+        self.state = CONNECTING
+        self.state_since = time.perf_counter()
+        self.outage_start = None   # Inicio de la caída actual (None si está conectada)
+        self.ever_connected = False
+        self.outages = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.downtime = 0.0        # Segundos acumulados de caídas ya cerradas
+        self.reconnect_latencies = []
+        self.lock = threading.Lock()
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_since = time.perf_counter()
+
+    def set_state(self, state):
+        with self.lock:
+            self._set_state(state)
+
+    def connected(self):
+        """
+        :return: Latencia de reconexión en segundos (None si es la primera conexión).
+        """
+        with self.lock:
+            latency = None
+            if self.outage_start is not None:
+                latency = time.perf_counter() - self.outage_start
+                self.downtime += latency
+                self.outage_start = None
+                if self.ever_connected:
+                    self.reconnects += 1
+                    self.reconnect_latencies.append(latency)
+            self.ever_connected = True
+            self._set_state(CONNECTED)
+            return latency
+
+    def lost(self, state=BACKOFF):
+        """
+        Registra una caída (lectura fallida o stream congelado) o un intento de conexión fallido.
+        """
+        with self.lock:
+            if self.outage_start is None:
+                self.outage_start = time.perf_counter()
+                if self.ever_connected:
+                    self.outages += 1
+            if state != STALLED and self.state != CONNECTED:
+                self.failed_attempts += 1
+            self._set_state(state)
+
+    def stats(self):
+        with self.lock:
+            current = time.perf_counter() - self.outage_start if self.outage_start is not None else 0.0
+            latencies = self.reconnect_latencies
+            return {
+                "state": self.state,
+                "outages": self.outages,
+                "reconnects": self.reconnects,
+                "failed_attempts": self.failed_attempts,
+                "downtime_s": round(self.downtime + current, 2),
+                "last_reconnect_s": round(latencies[-1], 2) if latencies else None,
+                "mean_reconnect_s": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            }
+
+    def report(self):
+        s = self.stats()
+        text = (f"CAM {self.cam_id}: {s['state']} | caídas {s['outages']}, reconexiones {s['reconnects']}, "
+                f"intentos fallidos {s['failed_attempts']} | sin señal {s['downtime_s']:.1f}s")
+        if s["last_reconnect_s"] is not None:
+            text += f" | reconexión última {s['last_reconnect_s']:.1f}s, media {s['mean_reconnect_s']:.1f}s"
+        return text
@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from utils.detections import DetectionBatch
+
 class LineCounter:
     """
     Clase para contar objetos que cruzan una línea definida.
@@ -31,36 +33,75 @@ class LineCounter:
     def update(self, detections):
         """
         Actualiza el estado del contador con nuevas detecciones.
-        :param detections: Lista de objetos detectados [(x1, y1, x2, y2, track_id, class_id), ...]
+        :param detections: DetectionBatch de una cámara (con track_id), o lista en el formato
+                           anterior [(x1, y1, x2, y2, track_id, class_id), ...]
+        :return: Índices (filas de `detections`) de los objetos contados en esta llamada.
         """
-        for x1, y1, x2, y2, track_id, class_id in detections:
-            track_id = int(track_id)
-            class_id = int(class_id)
-            
-            # Calcular centroide actual
-            cx, cy = int((x1 + x2) / 2), int((y1 + y2) / 2)
-            current_point = (cx, cy)
-            
-            # Si ya conocemos este objeto, verificamos si cruzó la línea
-            if track_id in self.track_history:
-                prev_point = self.track_history[track_id]
-                
-                if self._has_crossed_line(prev_point, current_point):
-                    if track_id not in self.counted_ids:
-                        class_name = self.class_names.get(class_id, "unknown")
-                        self.counts[class_name] = self.counts.get(class_name, 0) + 1
-                        self.total_count += 1
-                        self.counted_ids.add(track_id)
-                        
-                        # Ejecutar callback si existe
-                        if self.on_count_callback:
-                            try:
-                                self.on_count_callback(class_name)
-                            except Exception as e:
-                                print(f"[ERROR] Fallo en callback de conteo: {e}")
-            
-            # Actualizar historia
-            self.track_history[track_id] = current_point
+        if not isinstance(detections, DetectionBatch):
+            detections = DetectionBatch.from_tuples(detections)
+        tracked = detections.track_id >= 0
+        if not tracked.all():
+            rows = np.flatnonzero(tracked)
+            detections = detections.select(tracked)
+        else:
+            rows = None
+        if not len(detections):
+            return np.zeros(0, dtype=np.int64)
+
+        # Centroides actuales (truncados a píxel entero, como en la historia)
+        current = detections.centroids().astype(np.int64)
+        ids = detections.track_id.tolist()
+
+        # Posición anterior de cada track (si ya lo conocíamos)
+        prev_points = [self.track_history.get(tid) for tid in ids]
+        known = np.array([p is not None for p in prev_points], dtype=bool)
+        prev = np.array([p if p is not None else (0, 0) for p in prev_points], dtype=np.int64).reshape(-1, 2)
+
+        crossed = known & self._crossed_mask(prev, current)
+        counted = []
+        for i in np.flatnonzero(crossed):
+            track_id = ids[i]
+            if track_id in self.counted_ids:
+                continue
+            class_name = self.class_names.get(int(detections.cls[i]), "unknown")
+            self.counts[class_name] = self.counts.get(class_name, 0) + 1
+            self.total_count += 1
+            self.counted_ids.add(track_id)
+            counted.append(i)
+
+            # Ejecutar callback si existe
+            if self.on_count_callback:
+                try:
+                    self.on_count_callback(class_name)
+                except Exception as e:
+                    print(f"[ERROR] Fallo en callback de conteo: {e}")
+
+        # Actualizar historia
+        self.track_history.update(zip(ids, map(tuple, current.tolist())))
+
+        counted = np.array(counted, dtype=np.int64)
+        return rows[counted] if rows is not None else counted
+
+    def _crossed_mask(self, prev, current):
+        """
+        Versión vectorizada de _has_crossed_line para N pares de puntos (arrays (N, 2)).
+        """
+        p1 = np.array(self.start_point, dtype=np.int64)
+        p2 = np.array(self.end_point, dtype=np.int64)
+        lx, ly = p2 - p1
+
+        # Producto cruz (2D) de la línea con los vectores P1->A y P1->B
+        cross_a = lx * (prev[:, 1] - p1[1]) - ly * (prev[:, 0] - p1[0])
+        cross_b = lx * (current[:, 1] - p1[1]) - ly * (current[:, 0] - p1[0])
+        opposite = (np.sign(cross_a) != np.sign(cross_b)) & (cross_a != 0) & (cross_b != 0)
+
+        # Bounding box check de los segmentos
+        x_min_l, x_max_l = min(p1[0], p2[0]), max(p1[0], p2[0])
+        y_min_l, y_max_l = min(p1[1], p2[1]), max(p1[1], p2[1])
+        x_min_o, x_max_o = np.minimum(prev[:, 0], current[:, 0]), np.maximum(prev[:, 0], current[:, 0])
+        y_min_o, y_max_o = np.minimum(prev[:, 1], current[:, 1]), np.maximum(prev[:, 1], current[:, 1])
+        overlap = (x_max_l >= x_min_o) & (x_max_o >= x_min_l) & (y_max_l >= y_min_o) & (y_max_o >= y_min_l)
+        return opposite & overlap
 
     def _has_crossed_line(self, point_a, point_b):
         """
@@ -104,19 +145,36 @@ class LineCounter:
         """
         Dibuja la línea y el contador en el frame.
         """
-        # Dibujar línea amarilla
-        cv2.line(frame, self.start_point, self.end_point, (0, 255, 255), 2)
-        
+        self.draw_line(frame)
+        return self.draw_counts(frame)
+
+    def draw_line(self, frame, scale=(1.0, 1.0)):
+        """
+        Dibuja la línea amarilla.
+        :param scale: Factores (sx, sy) para dibujar sobre un frame redimensionado.
+        """
+        sx, sy = scale
+        start = (int(round(self.start_point[0] * sx)), int(round(self.start_point[1] * sy)))
+        end = (int(round(self.end_point[0] * sx)), int(round(self.end_point[1] * sy)))
+        cv2.line(frame, start, end, (0, 255, 255), 2)
+        return frame
+
+    def draw_counts(self, frame, font_scale=1.0):
+        """
+        Dibuja el conteo total y el desglose por clase.
+        :param font_scale: Escala del texto y sus posiciones (1.0 = frame de 640x360).
+        """
         # Dibujar conteo total
         # Posición del texto: esquina superior izquierda o cerca de la línea
         text = f"Total: {self.total_count}"
-        cv2.putText(frame, text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+        cv2.putText(frame, text, (10, int(60 * font_scale)), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 255), 2)
         
         # Opcional: dibujar desglose por clase
         y_offset = 90
         for cls, count in self.counts.items():
             # Color del texto (B, G, R): (0, 0, 0) es Negro
-            cv2.putText(frame, f"{cls}: {count}", (10, y_offset), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+            cv2.putText(frame, f"{cls}: {count}", (10, int(y_offset * font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.6 * font_scale, (0, 0, 0), 2)
             y_offset += 25
             
         return frame
@@ -0,0 +1,210 @@
+import json
+import numpy as np
+
+# Desplazamiento por clase para hacer NMS por clase en una sola pasada (igual que Ultralytics)
+_CLASS_OFFSET = 7680
+
+def nms_xyxy(boxes, scores, iou_threshold, classes=None, max_det=300):
+    """
+    Non-Maximum Suppression greedy en NumPy (CPU).
+    :param boxes: Array (N, 4) en formato xyxy.
+    :param scores: Array (N,) de confianzas.
+    :param iou_threshold: IoU a partir del cual una caja se suprime.
+    :param classes: Array (N,) de clases. Si se indica, la supresión es por clase.
+    :return: Índices (ordenados por confianza descendente) de las cajas conservadas.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    b = boxes.astype(np.float32)
+    if classes is not None:
+        b = b + (classes.astype(np.float32) * _CLASS_OFFSET)[:, None]
+    x1, y1, x2, y2 = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+class DetectionCache:
+    """
+    Detecciones crudas (umbral bajo, antes del NMS final) de un video, guardadas por frame
+    en arrays planos: boxes (N, 4) float32, conf (N,) float16, cls (N,) uint8 y
+    frame_offsets (F + 1,) para localizar las detecciones de cada frame.
+    """
+    def __init__(self, boxes, conf, cls, frame_offsets, meta):
+        self.boxes = boxes
+        self.conf = conf
+        self.cls = cls
+        self.frame_offsets = frame_offsets
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.frame_offsets) - 1
+
+    def frame(self, i):
+        """
+        :return: (boxes, conf, cls) del frame i (vistas, sin copia).
+        """
+        a, b = self.frame_offsets[i], self.frame_offsets[i + 1]
+        return self.boxes[a:b], self.conf[a:b], self.cls[a:b]
+
+    @classmethod
+    def from_frames(cls, frames, meta):
+        """
+        :param frames: Lista de tuplas (boxes, conf, cls) por frame.
+        :param meta: Diccionario con metadatos (fps, frame_shape, names, source...).
+        """
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        for i, (boxes, _, _) in enumerate(frames):
+            offsets[i + 1] = offsets[i] + len(boxes)
+        if frames:
+            boxes = np.concatenate([f[0] for f in frames]).astype(np.float32).reshape(-1, 4)
+            conf = np.concatenate([f[1] for f in frames]).astype(np.float16)
+            classes = np.concatenate([f[2] for f in frames]).astype(np.uint8)
+        else:
+            boxes = np.zeros((0, 4), dtype=np.float32)
+            conf = np.zeros(0, dtype=np.float16)
+            classes = np.zeros(0, dtype=np.uint8)
+        return cls(boxes, conf, classes, offsets, meta)
+
+    def save(self, path):
+        np.savez_compressed(path, boxes=self.boxes, conf=self.conf, cls=self.cls,
+                            frame_offsets=self.frame_offsets, meta=np.array(json.dumps(self.meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            # JSON convierte las claves de class_names a texto
+            if "names" in meta:
+                meta["names"] = {int(k): v for k, v in meta["names"].items()}
+            return cls(data["boxes"], data["conf"], data["cls"], data["frame_offsets"], meta)
+
+class DetectionBatch:
+    """
+    Detecciones de un lote completo de cámaras en formato columnar: arrays NumPy contiguos
+    boxes (N, 4) float32 xyxy, conf (N,) float32, cls (N,) int32, track_id (N,) int64
+    (-1 si no tiene track) y cam_idx (N,) int32 (posición de la cámara en el lote).
+
+    Las filas están ordenadas por cámara; `offsets` (C + 1,) delimita cada cámara y
+    camera(i) devuelve un DetectionBatch cuyas columnas son vistas (sin copia).
+    """
+    def __init__(self, boxes, conf, cls, track_id, cam_idx, offsets):
+        self.boxes = boxes
+        self.conf = conf
+        self.cls = cls
+        self.track_id = track_id
+        self.cam_idx = cam_idx
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.conf)
+
+    @property
+    def num_cameras(self):
+        return len(self.offsets) - 1
+
+    def camera(self, i):
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return DetectionBatch(self.boxes[a:b], self.conf[a:b], self.cls[a:b], self.track_id[a:b],
+                              self.cam_idx[a:b], np.array([0, b - a], dtype=np.int64))
+
+    def centroids(self):
+        return (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+
+    def select(self, mask):
+        """
+        Nuevo lote solo con las filas donde `mask` es True (conserva el número de cámaras).
+        """
+        local_cam = np.repeat(np.arange(self.num_cameras), np.diff(self.offsets))
+        offsets = np.zeros(self.num_cameras + 1, dtype=np.int64)
+        np.cumsum(np.bincount(local_cam[mask], minlength=self.num_cameras), out=offsets[1:])
+        return DetectionBatch(self.boxes[mask], self.conf[mask], self.cls[mask], self.track_id[mask],
+                              self.cam_idx[mask], offsets)
+
+    @classmethod
+    def empty(cls, num_cameras=1):
+        return cls.from_arrays([np.zeros((0, 6), dtype=np.float32)] * num_cameras)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        :param arrays: Lista (una entrada por cámara) de arrays (n, 6) [x1, y1, x2, y2, conf, cls]
+                       o (n, 7) [x1, y1, x2, y2, track_id, conf, cls].
+        """
+        counts = np.array([len(a) for a in arrays], dtype=np.int64)
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        width = max((a.shape[1] for a in arrays if a.ndim == 2), default=6)
+        data = np.concatenate([a.reshape(-1, width) for a in arrays]) if arrays else np.zeros((0, width))
+        return cls._from_data(data.astype(np.float32, copy=False), offsets)
+
+    @classmethod
+    def from_tensors(cls, tensors):
+        """
+        Construye el lote desde tensores (n, 6) por cámara (salida del NMS) con UNA sola
+        transferencia acelerador -> CPU para todo el lote.
+        """
+        import torch
+        counts = np.array([len(t) for t in tensors], dtype=np.int64)
+        offsets = np.zeros(len(tensors) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if not tensors:
+            return cls.empty(0)
+        data = torch.cat(list(tensors)).float().cpu().numpy()
+        return cls._from_data(data, offsets)
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Lote desde una lista de Results de Ultralytics (una transferencia para todo el lote).
+        """
+        return cls.from_tensors([r.boxes.data for r in results])
+
+    @classmethod
+    def from_tuples(cls, detections):
+        """
+        Compatibilidad con el formato anterior [(x1, y1, x2, y2, track_id, class_id), ...] (una cámara).
+        """
+        rows = np.array(detections, dtype=np.float32).reshape(-1, 6)
+        data = np.concatenate([rows[:, :5], np.ones((len(rows), 1), np.float32), rows[:, 5:]], axis=1)
+        return cls._from_data(data, np.array([0, len(rows)], dtype=np.int64))
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        Une varios lotes (o vistas de cámara) en uno nuevo, una cámara por lote de entrada
+        si cada uno es de una sola cámara.
+        """
+        offsets = [0]
+        for b in batches:
+            offsets.extend(offsets[-1] + b.offsets[1:])
+        offsets = np.array(offsets, dtype=np.int64)
+        cam_idx = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+        return cls(
+            np.concatenate([b.boxes for b in batches]) if batches else np.zeros((0, 4), np.float32),
+            np.concatenate([b.conf for b in batches]) if batches else np.zeros(0, np.float32),
+            np.concatenate([b.cls for b in batches]) if batches else np.zeros(0, np.int32),
+            np.concatenate([b.track_id for b in batches]) if batches else np.zeros(0, np.int64),
+            cam_idx, offsets)
+
+    @classmethod
+    def _from_data(cls, data, offsets):
+        n = len(data)
+        tracked = data.shape[1] == 7
+        cam_idx = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+        return cls(
+            np.ascontiguousarray(data[:, :4], dtype=np.float32),
+            np.ascontiguousarray(data[:, 5 if tracked else 4], dtype=np.float32),
+            data[:, 6 if tracked else 5].astype(np.int32),
+            data[:, 4].astype(np.int64) if tracked else np.full(n, -1, dtype=np.int64),
+            cam_idx, offsets)
@@ -0,0 +1,137 @@
+import cv2
+import numpy as np
+
+# Paleta BGR por clase (se repite cíclicamente si hay más clases)
+PALETTE = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+           (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0)]
+
+def class_color(class_id):
+    return PALETTE[int(class_id) % len(PALETTE)]
+
+def draw_detections(frame, detections, class_names, scale=1.0):
+    """
+    Dibuja las cajas de un DetectionBatch (vista de una cámara) directamente desde sus columnas.
+    :param scale: Factor a aplicar a las coordenadas (para dibujar sobre un frame redimensionado):
+                  escalar o array [sx, sy, sx, sy].
+    """
+    if not len(detections):
+        return frame
+    boxes = np.round(detections.boxes * scale).astype(np.int32)
+    for (x1, y1, x2, y2), track_id, conf, cls_id in zip(boxes.tolist(), detections.track_id.tolist(),
+                                                        detections.conf.tolist(), detections.cls.tolist()):
+        color = class_color(cls_id)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        label = f"{class_names.get(cls_id, cls_id)} {conf:.2f}"
+        if track_id >= 0:
+            label = f"id:{track_id} {label}"
+        cv2.putText(frame, label, (x1, max(y1 - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+    return frame
+
+class GridRenderer:
+    """
+    Grid de visualización multi-cámara con caché por tile.
+
+    Cada frame nuevo se redimensiona primero al tamaño del tile y las cajas se dibujan
+    escaladas sobre la imagen pequeña. Lo estático (línea de conteo y etiqueta de la cámara,
+    pantallas de estado) se renderiza una vez por cámara y se reutiliza. El grid es un lienzo
+    preasignado: solo se reescriben los tiles que cambiaron y ya se crea con el tamaño final
+    (sin redimensionar el grid completo en cada refresco).
+    """
+    def __init__(self, num_cams, cols=3, tile_size=(640, 360), max_height=1000):
+        self.cols = cols
+        rows = max(1, (num_cams + cols - 1) // cols)
+        scale = min(1.0, max_height / (rows * tile_size[1]))
+        self.tile_w, self.tile_h = int(tile_size[0] * scale), int(tile_size[1] * scale)
+        self.font_scale = self.tile_w / 640
+        self.canvas = np.zeros((rows * self.tile_h, cols * self.tile_w, 3), dtype=np.uint8)
+        self.keys = [None] * num_cams # Contenido de cada tile: "frame" o ("status", texto)
+        self.overlays = {}            # idx -> (firma, píxeles, colores) de lo estático
+        self.status_tiles = {}        # (cam_id, texto) -> tile de estado
+        self.dirty = True
+
+        self.refreshes = 0
+        self.tiles_drawn = 0
+        self.cpu_time = 0.0
+
+    def _slot(self, idx):
+        r, c = divmod(idx, self.cols)
+        return self.canvas[r * self.tile_h:(r + 1) * self.tile_h, c * self.tile_w:(c + 1) * self.tile_w]
+
+    def _overlay(self, idx, cam_id, counter, scale):
+        line = (counter.start_point, counter.end_point) if counter else None
+        signature = (cam_id, line, scale)
+        cached = self.overlays.get(idx)
+        if cached is None or cached[0] != signature:
+            overlay = np.zeros((self.tile_h, self.tile_w, 3), dtype=np.uint8)
+            if counter:
+                counter.draw_line(overlay, scale)
+            cv2.putText(overlay, f"CAM {cam_id}", (10, int(30 * self.font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                        self.font_scale, (0, 255, 0), 2)
+            # Solo se guardan los píxeles dibujados (índices planos + color): componer es una
+            # asignación indexada de unos pocos miles de píxeles, no una copia enmascarada del tile
+            pixels = np.flatnonzero(overlay.any(axis=2))
+            cached = (signature, pixels, overlay.reshape(-1, 3)[pixels])
+            self.overlays[idx] = cached
+        return cached[1], cached[2]
+
+    def draw_frame(self, idx, cam_id, frame, detections, class_names, counter=None, zones=None):
+        """
+        Compone el tile de una cámara con un frame nuevo.
+        """
+        h, w = frame.shape[:2]
+        tile = cv2.resize(frame, (self.tile_w, self.tile_h))
+        sx, sy = self.tile_w / w, self.tile_h / h
+        draw_detections(tile, detections, class_names, scale=np.array([sx, sy, sx, sy], dtype=np.float32))
+        if zones:
+            zones.draw(tile, (sx, sy))
+        pixels, colors = self._overlay(idx, cam_id, counter, (sx, sy))
+        tile.reshape(-1, 3)[pixels] = colors
+        if counter:
+            counter.draw_counts(tile, self.font_scale)
+        self._slot(idx)[:] = tile
+        self.keys[idx] = "frame"
+        self.tiles_drawn += 1
+        self.dirty = True
+
+    def draw_status(self, idx, cam_id, status, color):
+        """
+        Tile de estado (sin señal, sin frame); solo se recompone si cambia.
+        """
+        key = ("status", status)
+        if self.keys[idx] == key:
+            return
+        tile = self.status_tiles.get((cam_id, status))
+        if tile is None:
+            tile = np.zeros((self.tile_h, self.tile_w, 3), dtype=np.uint8)
+            cv2.putText(tile, f"CAM {cam_id}", (10, int(30 * self.font_scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                        self.font_scale, (255, 255, 255), 2)
+            cv2.putText(tile, status, (int(50 * self.font_scale), self.tile_h // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.8 * self.font_scale, color, 2)
+            self.status_tiles[(cam_id, status)] = tile
+        self._slot(idx)[:] = tile
+        self.keys[idx] = key
+        self.tiles_drawn += 1
+        self.dirty = True
+
+    def take(self):
+        """
+        :return: El lienzo si algo cambió desde el último refresco, None si no hace falta mostrarlo.
+        """
+        if not self.dirty:
+            return None
+        self.dirty = False
+        return self.canvas
+
+    def record(self, cpu_time):
+        """
+        :param cpu_time: Segundos de CPU del hilo de la GUI en un refresco (composición + imshow).
+        """
+        self.refreshes += 1
+        self.cpu_time += cpu_time
+
+    def report(self):
+        n = max(self.refreshes, 1)
+        report = (f"{1000 * self.cpu_time / n:.2f} ms de CPU por refresco, {self.tiles_drawn / n:.1f} tiles "
+                  f"recompuestos por refresco ({self.refreshes} refrescos, tiles de {self.tile_w}x{self.tile_h})")
+        self.refreshes, self.tiles_drawn, self.cpu_time = 0, 0, 0.0
+        return report
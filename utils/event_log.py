@@ -0,0 +1,66 @@
+import os
+import json
+import datetime
+import threading
+
+def build_events(cam_id, detections, rows, class_names, terminal_id=None, detection_time=None, duplicates=None,
+                 clip=None):
+    """
+    Construye los eventos de conteo (diccionarios) desde las columnas del DetectionBatch.
+    :param detections: DetectionBatch de una cámara.
+    :param rows: Índices de las filas contadas (lo que devuelve LineCounter.update).
+    :param duplicates: Array bool paralelo a rows (ver utils.handoff); añade el campo 'duplicate'.
+    :param clip: Ruta del clip de evidencia (ver utils.recorder); añade el campo 'clip'.
+    """
+    if not len(rows):
+        return []
+    if detection_time is None:
+        detection_time = datetime.datetime.now()
+    timestamp = detection_time.isoformat()
+    boxes = detections.boxes[rows].round(1).tolist()
+    events = [{"time": timestamp, "cam_id": cam_id, "terminal": terminal_id, "track_id": track_id,
+             "class": class_names.get(cls_id, "unknown"), "conf": round(conf, 3), "box": box}
+            for track_id, cls_id, conf, box in zip(detections.track_id[rows].tolist(),
+                                                   detections.cls[rows].tolist(),
+                                                   detections.conf[rows].tolist(), boxes)]
+    if duplicates is not None:
+        for event, duplicate in zip(events, duplicates.tolist()):
+            event["duplicate"] = duplicate
+    if clip is not None:
+        for event in events:
+            event["clip"] = clip
+    return events
+
+class EventLogger:
+    """
+    Registro de eventos de conteo en formato JSON Lines (un evento por línea).
+    Los eventos se construyen directamente desde las columnas del DetectionBatch.
+    """
+    def __init__(self, path="logs/count_events.jsonl"):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def log(self, cam_id, detections, rows, class_names, terminal_id=None, detection_time=None, duplicates=None,
+            clip=None):
+        """
+        :param detections: DetectionBatch de una cámara.
+        :param rows: Índices de las filas contadas (lo que devuelve LineCounter.update).
+        :return: Lista de eventos (diccionarios) registrados.
+        """
+        events = build_events(cam_id, detections, rows, class_names, terminal_id, detection_time, duplicates, clip)
+        self.write(events)
+        return events
+
+    def write(self, events):
+        if not events:
+            return
+        with self.lock:
+            for event in events:
+                self.file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
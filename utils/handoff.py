@@ -0,0 +1,128 @@
+import cv2
+import numpy as np
+
+def appearance_signature(frame, box, bins=(8, 4, 4)):
+    """
+    Firma de apariencia barata: histograma HSV del recorte, con raíz cuadrada y norma L2.
+    El producto escalar entre dos firmas es el coeficiente de Bhattacharyya (1 = idénticas).
+    :return: Vector float32 de tamaño prod(bins) (ceros si la caja queda fuera del frame).
+    """
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = (int(round(v)) for v in box)
+    x1, y1, x2, y2 = max(0, x1), max(0, y1), min(w, x2), min(h, y2)
+    size = int(np.prod(bins))
+    if x2 <= x1 or y2 <= y1:
+        return np.zeros(size, dtype=np.float32)
+    hsv = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, list(bins), [0, 180, 0, 256, 0, 256]).ravel()
+    hist = np.sqrt(hist / max(hist.sum(), 1.0))
+    return hist.astype(np.float32)
+
+class AppearanceGallery:
+    """
+    Galería acotada de firmas en arrays preasignados (buffer circular). La búsqueda es un
+    único producto matriz-vector sobre toda la galería más máscaras de tiempo y clase, sin
+    recorrer entradas en Python.
+    """
+    def __init__(self, dim, capacity=4096):
+        self.features = np.zeros((capacity, dim), dtype=np.float32)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.cls = np.zeros(capacity, dtype=np.int32)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.capacity = capacity
+        self.next = 0 # Posición a sobrescribir (la entrada más antigua si está llena)
+
+    def __len__(self):
+        return int(self.valid.sum())
+
+    def add(self, signature, timestamp, cls_id):
+        i = self.next
+        self.features[i] = signature
+        self.times[i] = timestamp
+        self.cls[i] = cls_id
+        self.valid[i] = True
+        self.next = (i + 1) % self.capacity
+
+    def evict(self, before):
+        """
+        Invalida las entradas anteriores a `before` (ya no pueden llegar dentro de la ventana).
+        """
+        self.valid &= self.times >= before
+
+    def match(self, signature, timestamp, cls_id, min_dt, max_dt, threshold):
+        """
+        Busca la entrada más parecida de la misma clase registrada entre `max_dt` y `min_dt`
+        segundos antes de `timestamp`. Si supera el umbral se consume (no vuelve a emparejarse).
+        :return: Similitud de la coincidencia, o None si no hay.
+        """
+        dt = timestamp - self.times
+        candidates = self.valid & (self.cls == cls_id) & (dt >= min_dt) & (dt <= max_dt)
+        if not candidates.any():
+            return None
+        sims = self.features @ signature
+        sims[~candidates] = -1.0
+        best = int(sims.argmax())
+        if sims[best] < threshold:
+            return None
+        self.valid[best] = False
+        return float(sims[best])
+
+class HandoffMatcher:
+    """
+    Deduplicación de conteos entre cámaras consecutivas (ej. clasificadora -> cinta de salida).
+    Para cada par configurado, los conteos de la cámara de origen entran en la galería del par
+    y un conteo en la cámara de destino es duplicado si coincide con uno de origen dentro de la
+    ventana de tránsito esperada.
+    """
+    def __init__(self, pairs, bins=(8, 4, 4), capacity=4096):
+        """
+        :param pairs: Lista de dicts {from, to, min_transit, max_transit, threshold}.
+        """
+        self.bins = tuple(bins)
+        dim = int(np.prod(self.bins))
+        self.pairs = []
+        for pair in pairs:
+            self.pairs.append({"from": int(pair["from"]), "to": int(pair["to"]),
+                               "min_transit": float(pair.get("min_transit", 0.0)),
+                               "max_transit": float(pair.get("max_transit", 30.0)),
+                               "threshold": float(pair.get("threshold", 0.8)),
+                               "gallery": AppearanceGallery(dim, capacity),
+                               "matches": 0})
+        self.cameras = {p["from"] for p in self.pairs} | {p["to"] for p in self.pairs}
+        self.duplicates = 0
+
+    def process(self, cam_id, frame, detections, rows, timestamp):
+        """
+        :param detections: DetectionBatch de la cámara.
+        :param rows: Filas contadas en este frame (lo que devuelve LineCounter.update).
+        :return: Array bool (len(rows),): True si el conteo ya se había hecho en una cámara anterior.
+        """
+        duplicate = np.zeros(len(rows), dtype=bool)
+        if cam_id not in self.cameras or not len(rows):
+            return duplicate
+        for j, row in enumerate(rows):
+            signature = appearance_signature(frame, detections.boxes[row], self.bins)
+            cls_id = int(detections.cls[row])
+            for pair in self.pairs:
+                if pair["to"] == cam_id and not duplicate[j]:
+                    gallery = pair["gallery"]
+                    gallery.evict(timestamp - pair["max_transit"])
+                    if gallery.match(signature, timestamp, cls_id, pair["min_transit"], pair["max_transit"],
+                                     pair["threshold"]) is not None:
+                        duplicate[j] = True
+                        pair["matches"] += 1
+                if pair["from"] == cam_id:
+                    pair["gallery"].add(signature, timestamp, cls_id)
+        self.duplicates += int(duplicate.sum())
+        return duplicate
+
+    def groups(self):
+        """
+        Pares de cámaras que deben procesarse en el mismo proceso (ver utils.sharding).
+        """
+        return [(p["from"], p["to"]) for p in self.pairs]
+
+    def report(self):
+        parts = [f"{p['from']}->{p['to']}: {p['matches']} duplicados, galería {len(p['gallery'])}"
+                 for p in self.pairs]
+        return f"{self.duplicates} duplicados | " + " | ".join(parts)
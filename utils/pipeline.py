@@ -0,0 +1,251 @@
+import collections
+import copy
+import threading
+import time
+import cv2
+import numpy as np
+import torch
+try:
+    from ultralytics.utils.nms import non_max_suppression # 8.3.x tardías
+except ImportError:
+    from ultralytics.utils.ops import non_max_suppression
+
+from utils.detections import DetectionBatch
+
+PAD_VALUE = 114 # Mismo gris de relleno que usa Ultralytics en el letterbox
+
+class DropOldestQueue:
+    """
+    Cola acotada que nunca bloquea al productor: si está llena, descarta el elemento más
+    antiguo. Así la latencia extremo a extremo queda acotada por el tamaño de la cola.
+    """
+    def __init__(self, maxsize, on_drop=None):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                old = self.items.popleft()
+                self.dropped += 1
+                if self.on_drop:
+                    self.on_drop(old)
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """
+        :return: El elemento más antiguo, o None si no llegó ninguno antes del timeout.
+        """
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            return self.items.popleft() if self.items else None
+
+class StageStats:
+    """
+    Tiempo ocupado de una etapa para calcular su ocupación (fracción del tiempo de pared).
+    """
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.items = 0
+        self.start = time.perf_counter()
+
+    def add(self, seconds):
+        self.busy += seconds
+        self.items += 1
+
+    def occupancy(self):
+        wall = time.perf_counter() - self.start
+        return self.busy / wall if wall > 0 else 0.0
+
+    def reset(self):
+        self.busy, self.items, self.start = 0.0, 0, time.perf_counter()
+
+def letterbox_into(image, out, imgsz):
+    """
+    Letterbox de `image` (BGR) escrito directamente en `out` (imgsz x imgsz x 3, RGB, uint8),
+    sin reservar memoria para la salida.
+    :return: (escala, (pad_x, pad_y)) para revertir las coordenadas.
+    """
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    new_w, new_h = int(round(w0 * r)), int(round(h0 * r))
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if r != 1 else image
+    out[:] = PAD_VALUE
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized[..., ::-1] # BGR -> RGB
+    return r, (pad_x, pad_y)
+
+class PipelinedDetector:
+    """
+    Ejecución en tres etapas solapadas:
+      1. Preproceso (hilo): recoge frames nuevos, letterbox + normalización del lote N+1
+         en buffers preasignados (pinned memory si hay GPU).
+      2. Inferencia (hilo): modelo + NMS del lote N en el acelerador.
+      3. Postproceso (hilo principal, vía get()): paso a CPU y reescalado del lote N-1;
+         tracking, conteo y dibujo los hace quien consume.
+    Las etapas se conectan con colas DropOldestQueue para que la latencia no crezca.
+    """
+    def __init__(self, model, streams, imgsz=640, conf=0.25, iou=0.45, device="cpu", queue_size=2):
+        self.streams = streams
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.device = torch.device("cpu" if device == "cpu" else f"cuda:{device}")
+        self.half = self.device.type == "cuda"
+
+        # Se usa la red directamente (sin el predictor de Ultralytics) para alimentar el tensor ya preparado.
+        # fuse() y half() modifican la red in-place: se aplican sobre una copia propia para no alterar
+        # el model.model que comparten model.predict, la cascada y el resto de caminos.
+        self.net = copy.deepcopy(model.model).to(self.device).fuse(verbose=False).eval()
+        if self.half:
+            self.net = self.net.half()
+
+        batch = len(streams)
+        n_buffers = queue_size + 2 # uno en preproceso, uno en inferencia y los que caben en la cola
+        pin = self.device.type == "cuda"
+        self.staging = [np.empty((batch, imgsz, imgsz, 3), dtype=np.uint8) for _ in range(n_buffers)]
+        self.buffers = [torch.empty((batch, 3, imgsz, imgsz), dtype=torch.float32, pin_memory=pin)
+                        for _ in range(n_buffers)]
+        self.free_buffers = collections.deque(range(n_buffers))
+        self.free_cond = threading.Condition()
+
+        self.pre_queue = DropOldestQueue(queue_size, on_drop=lambda job: self._release(job["buffer"]))
+        self.post_queue = DropOldestQueue(queue_size)
+        self.stats = {name: StageStats(name) for name in ("pre", "infer", "post")}
+        self.last_seqs = [0] * len(streams)
+        self.stopped = False
+        self.threads = [threading.Thread(target=self._preprocess_loop, daemon=True),
+                        threading.Thread(target=self._infer_loop, daemon=True)]
+
+    def warmup(self):
+        """
+        Ejecuta un lote ficticio del tamaño de producción por el mismo camino que los hilos
+        (buffers preasignados, red fusionada y NMS) para no pagar la inicialización de kernels
+        y memoria con los primeros frames reales. Llamar antes de start().
+        """
+        dummy = np.zeros((720, 1280, 3), dtype=np.uint8)
+        self._prepare(0, [dummy] * len(self.streams))
+        self._infer(0, len(self.streams))
+        return self
+
+    def start(self):
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        for t in self.threads:
+            t.join(timeout=2)
+
+    def _acquire(self):
+        with self.free_cond:
+            while not self.free_buffers and not self.stopped:
+                self.free_cond.wait(0.1)
+            return self.free_buffers.popleft() if self.free_buffers else None
+
+    def _release(self, buffer_idx):
+        with self.free_cond:
+            self.free_buffers.append(buffer_idx)
+            self.free_cond.notify()
+
+    def _preprocess_loop(self):
+        while not self.stopped:
+            frames, indices = [], []
+            for idx, stream in enumerate(self.streams):
+                seq, frame = stream.read_seq()
+                if frame is not None and seq != self.last_seqs[idx]:
+                    self.last_seqs[idx] = seq
+                    frames.append(frame)
+                    indices.append(idx)
+            if not frames:
+                time.sleep(0.001)
+                continue
+
+            buffer_idx = self._acquire()
+            if buffer_idx is None:
+                break
+            start = time.perf_counter()
+            transforms = self._prepare(buffer_idx, frames)
+            self.stats["pre"].add(time.perf_counter() - start)
+
+            self.pre_queue.put({"buffer": buffer_idx, "n": len(frames), "frames": frames, "indices": indices,
+                                "transforms": transforms})
+
+    def _prepare(self, buffer_idx, frames):
+        """
+        Letterbox + normalización de `frames` en el buffer `buffer_idx`.
+        :return: Transformaciones (escala, padding) por frame.
+        """
+        staging = self.staging[buffer_idx]
+        transforms = [letterbox_into(frame, staging[j], self.imgsz) for j, frame in enumerate(frames)]
+        n = len(frames)
+        tensor = self.buffers[buffer_idx][:n]
+        tensor.copy_(torch.from_numpy(staging[:n]).permute(0, 3, 1, 2))
+        tensor.div_(255.0)
+        return transforms
+
+    def _infer(self, buffer_idx, n):
+        """
+        Red + NMS sobre los n primeros elementos del buffer `buffer_idx`.
+        """
+        with torch.inference_mode():
+            x = self.buffers[buffer_idx][:n].to(self.device, non_blocking=True)
+            if self.half:
+                x = x.half()
+            dets = non_max_suppression(self.net(x), self.conf, self.iou, max_det=300)
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+        return dets
+
+    def _infer_loop(self):
+        while not self.stopped:
+            job = self.pre_queue.get(timeout=0.1)
+            if job is None:
+                continue
+            start = time.perf_counter()
+            job["dets"] = self._infer(job["buffer"], job["n"])
+            self.stats["infer"].add(time.perf_counter() - start)
+            self._release(job.pop("buffer"))
+            self.post_queue.put(job)
+
+    def get(self, timeout=0.05):
+        """
+        Etapa 3: recupera el siguiente lote inferido y lo convierte a coordenadas del frame original.
+        :return: (frames, índices de stream, DetectionBatch) o None si no hay lote listo.
+        """
+        job = self.post_queue.get(timeout)
+        if job is None:
+            return None
+        start = time.perf_counter()
+        # Una sola transferencia para todo el lote; el reescalado se hace sobre vistas por cámara
+        detections = DetectionBatch.from_tensors(job["dets"])
+        for i, (frame, (r, (pad_x, pad_y))) in enumerate(zip(job["frames"], job["transforms"])):
+            boxes = detections.camera(i).boxes
+            boxes -= np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)
+            boxes /= r
+            h, w = frame.shape[:2]
+            np.clip(boxes[:, 0::2], 0, w, out=boxes[:, 0::2])
+            np.clip(boxes[:, 1::2], 0, h, out=boxes[:, 1::2])
+        self.stats["post"].add(time.perf_counter() - start)
+        return job["frames"], job["indices"], detections
+
+    def add_post_time(self, seconds):
+        """
+        Suma al postproceso el tiempo de tracking/conteo/dibujo que hace el hilo principal.
+        """
+        self.stats["post"].busy += seconds
+
+    def report(self):
+        occ = " | ".join(f"{s.name} {100 * s.occupancy():.0f}%" for s in self.stats.values())
+        text = (f"ocupación {occ} | descartados: pre->infer {self.pre_queue.dropped}, "
+                f"infer->post {self.post_queue.dropped}")
+        for s in self.stats.values():
+            s.reset()
+        return text
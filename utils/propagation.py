@@ -0,0 +1,151 @@
+import cv2
+import numpy as np
+
+from utils.tracking import update_tracker
+
+def _empty_detections():
+    return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+def point_segment_distance(points, start_point, end_point):
+    """
+    Distancia de cada punto (N, 2) al segmento start_point -> end_point.
+    """
+    p1 = np.asarray(start_point, dtype=np.float32)
+    seg = np.asarray(end_point, dtype=np.float32) - p1
+    seg_len2 = float(seg @ seg) or 1.0
+    t = np.clip(((points - p1) @ seg) / seg_len2, 0.0, 1.0)
+    closest = p1 + t[:, None] * seg
+    return np.linalg.norm(points - closest, axis=1)
+
+class BoxPropagator:
+    """
+    Propaga las cajas del último keyframe a los frames intermedios mediante flujo óptico
+    disperso (Lucas-Kanade) sobre una rejilla de puntos dentro de cada caja.
+    Si una caja se queda sin puntos válidos, se usa una predicción de velocidad constante.
+    """
+    def __init__(self, scale=0.5, grid=3):
+        """
+        :param scale: Escala a la que se calcula el flujo (0.5 = mitad de resolución).
+        :param grid: Puntos por lado de la rejilla muestreada en cada caja.
+        """
+        self.scale = scale
+        self.grid = grid
+        self.prev_gray = None
+        self.boxes, self.conf, self.cls = _empty_detections()
+        self.velocity = np.zeros((0, 2), dtype=np.float32)
+
+    def _gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1:
+            gray = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def reset(self, frame, boxes, conf, cls):
+        """
+        Nuevo keyframe: guarda las detecciones reales y estima la velocidad de cada caja
+        respecto a la propagación anterior (emparejando por centroide más cercano).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        velocity = np.zeros((len(boxes), 2), dtype=np.float32)
+        if len(boxes) and len(self.boxes):
+            new_c = (boxes[:, :2] + boxes[:, 2:]) / 2
+            old_c = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+            dist = np.linalg.norm(new_c[:, None] - old_c[None], axis=2)
+            nearest = dist.argmin(axis=1)
+            velocity = self.velocity[nearest] if len(self.velocity) else velocity
+        self.boxes, self.conf, self.cls = boxes, np.asarray(conf, np.float32), np.asarray(cls, np.float32)
+        self.velocity = velocity
+        self.prev_gray = self._gray(frame)
+
+    def propagate(self, frame):
+        """
+        :return: (boxes, conf, cls) estimados para el frame actual.
+        """
+        gray = self._gray(frame)
+        if self.prev_gray is None or not len(self.boxes) or gray.shape != self.prev_gray.shape:
+            self.prev_gray = gray
+            return self.boxes, self.conf, self.cls
+
+        n, g = len(self.boxes), self.grid
+        # Rejilla g x g dentro del 50% central de cada caja (evita puntos del fondo)
+        frac = (np.arange(g, dtype=np.float32) + 0.5) / g * 0.5 + 0.25
+        x1, y1, x2, y2 = (self.boxes[:, i:i + 1] for i in range(4))
+        xs = x1 + (x2 - x1) * frac[None, :]
+        ys = y1 + (y2 - y1) * frac[None, :]
+        pts = np.stack([np.repeat(xs, g, axis=1), np.tile(ys, (1, g))], axis=2).reshape(-1, 1, 2)
+        pts = (pts * self.scale).astype(np.float32)
+
+        new_pts, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, pts, None,
+                                                      winSize=(15, 15), maxLevel=2)
+        flow = ((new_pts - pts).reshape(n, g * g, 2)) / self.scale
+        valid = status.reshape(n, g * g).astype(bool)
+
+        shift = self.velocity.copy()
+        for i in np.flatnonzero(valid.any(axis=1)):
+            shift[i] = np.median(flow[i][valid[i]], axis=0)
+
+        self.velocity = shift
+        self.boxes = self.boxes + np.hstack([shift, shift])
+        self.prev_gray = gray
+        return self.boxes, self.conf, self.cls
+
+class KeyframeTracker:
+    """
+    Tracking por cámara con detección solo cada k frames. En los frames intermedios las cajas
+    se propagan con BoxPropagator y se entregan igualmente al tracker, de modo que el
+    LineCounter recibe tracks en todos los frames.
+
+    k se adapta a la actividad: k_min si hay objetos cerca de la línea de conteo,
+    un valor intermedio si hay objetos en escena, y crece hasta k_max si la cámara está inactiva.
+    """
+    def __init__(self, tracker, k_min=1, k_max=6, line=None, line_margin=60, propagator=None):
+        self.tracker = tracker
+        self.k_min = max(1, k_min)
+        self.k_max = max(self.k_min, k_max)
+        self.line = line
+        self.line_margin = line_margin
+        self.propagator = propagator or BoxPropagator()
+
+        self.k = self.k_min
+        self.since_keyframe = None # None = aún no hubo keyframe
+        self.frames = 0
+        self.keyframes = 0
+
+    def needs_detection(self):
+        return self.since_keyframe is None or self.since_keyframe + 1 >= self.k
+
+    def update(self, frame, detections=None):
+        """
+        :param frame: Frame BGR actual.
+        :param detections: DetectionBatch (una cámara) del detector si es keyframe, None para propagar.
+        :return: Tracks (M, 7) [x1, y1, x2, y2, track_id, conf, cls].
+        """
+        if detections is not None:
+            boxes, conf, cls = detections.boxes, detections.conf, detections.cls
+            if self.k_max > 1: # Sin propagación posible (k=1) no hace falta guardar estado
+                self.propagator.reset(frame, boxes, conf, cls)
+            self.since_keyframe = 0
+            self.keyframes += 1
+        else:
+            boxes, conf, cls = self.propagator.propagate(frame)
+            self.since_keyframe = (self.since_keyframe or 0) + 1
+        self.frames += 1
+
+        tracks = update_tracker(self.tracker, boxes, conf, cls, frame.shape, frame)
+        if detections is not None:
+            self._adapt(tracks)
+        return tracks
+
+    def _adapt(self, tracks):
+        if not len(tracks):
+            self.k = min(self.k + 1, self.k_max)
+            return
+        if self.line is not None:
+            centroids = (tracks[:, :2] + tracks[:, 2:4]) / 2
+            if point_segment_distance(centroids, *self.line).min() < self.line_margin:
+                self.k = self.k_min
+                return
+        self.k = max(self.k_min, (self.k_min + self.k_max) // 2)
+
+    def stats(self):
+        return {"frames": self.frames, "keyframes": self.keyframes, "k": self.k}
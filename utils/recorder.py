@@ -0,0 +1,211 @@
+import collections
+import datetime
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+class FrameRing:
+    """
+    Buffer circular de una cámara con los últimos frames comprimidos en JPEG, acotado por
+    segundos y por bytes (lo que se alcance primero).
+    """
+    def __init__(self, seconds, max_bytes):
+        self.frames = collections.deque() # (timestamp, jpeg)
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evicted = 0 # Frames descartados por el límite de memoria (no por antigüedad)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def append(self, timestamp, data):
+        self.frames.append((timestamp, data))
+        self.bytes += data.nbytes
+        while self.frames and (self.bytes > self.max_bytes or self.frames[0][0] < timestamp - self.seconds):
+            if self.bytes > self.max_bytes:
+                self.evicted += 1
+            _, old = self.frames.popleft()
+            self.bytes -= old.nbytes
+
+    def between(self, start, end):
+        return [(t, data) for t, data in self.frames if start <= t <= end]
+
+    def latest(self):
+        return self.frames[-1][0] if self.frames else None
+
+    def span(self):
+        return self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0.0
+
+class ClipRecorder:
+    """
+    Clips de evidencia alrededor de cada conteo sin grabar los streams completos.
+
+    El bucle principal solo encola la referencia del frame (nunca bloquea: si la cola está
+    llena el frame se descarta); hilos de compresión lo pasan a JPEG y lo guardan en el
+    FrameRing de su cámara. Al disparar un clip se devuelve su ruta de inmediato y, cuando ya
+    hay frames posteriores suficientes, un pool de escritura lo codifica a disco.
+    """
+    def __init__(self, out_dir="clips", pre_seconds=5.0, post_seconds=3.0, quality=70, width=640,
+                 max_mb_per_camera=32, encode_threads=1, workers=2, queue_size=32):
+        """
+        :param width: Ancho máximo del frame guardado (se escala antes de comprimir; 0 = original).
+        :param max_mb_per_camera: Límite de memoria del buffer de cada cámara.
+        :param workers: Hilos que escriben los clips a disco.
+        """
+        self.out_dir = out_dir
+        self.pre_seconds = float(pre_seconds)
+        self.post_seconds = float(post_seconds)
+        self.quality = int(quality)
+        self.width = int(width or 0)
+        self.max_bytes = int(max_mb_per_camera * 1024 * 1024)
+        # El buffer guarda el doble de la ventana para poder alargar clips con conteos seguidos
+        self.ring_seconds = 2 * (self.pre_seconds + self.post_seconds)
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.rings = {}
+        self.pending = [] # Clips esperando sus frames posteriores
+        self.lock = threading.Lock()
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.writers = ThreadPoolExecutor(max_workers=workers)
+
+        self.pushed = 0
+        self.dropped = 0
+        self.encode_time = 0.0
+        self.encoded = 0
+        self.written = 0
+        self.failed = 0
+        self.stopped = False
+        self.threads = [threading.Thread(target=self._encode_loop, daemon=True) for _ in range(max(1, encode_threads))]
+        for thread in self.threads:
+            thread.start()
+
+    def push(self, cam_id, frame, timestamp=None):
+        """
+        Encola un frame para el buffer de la cámara. No bloquea ni copia el frame
+        (los frames de RTSPStream no se reutilizan tras leerlos).
+        """
+        self.pushed += 1
+        try:
+            self.inbox.put_nowait((cam_id, timestamp or time.time(), frame))
+        except queue.Full:
+            self.dropped += 1
+
+    def trigger(self, cam_id, timestamp=None):
+        """
+        Pide un clip de [t - pre_seconds, t + post_seconds]. Un conteo que cae dentro de un
+        clip pendiente de la misma cámara lo alarga en lugar de crear otro.
+        :return: Ruta donde quedará el clip (se escribe en segundo plano).
+        """
+        timestamp = timestamp or time.time()
+        with self.lock:
+            for clip in self.pending:
+                if clip["cam_id"] == cam_id and clip["end"] >= timestamp:
+                    clip["end"] = min(timestamp + self.post_seconds, clip["start"] + self.ring_seconds)
+                    return clip["path"]
+            name = datetime.datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S_%f")[:-3]
+            path = os.path.join(self.out_dir, f"cam{cam_id}_{name}.mp4")
+            self.pending.append({"cam_id": cam_id, "path": path, "start": timestamp - self.pre_seconds,
+                                 "end": timestamp + self.post_seconds})
+            return path
+
+    def _encode(self, frame):
+        h, w = frame.shape[:2]
+        if self.width and w > self.width:
+            frame = cv2.resize(frame, (self.width, int(round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return data if ok else None
+
+    def _encode_loop(self):
+        while not self.stopped:
+            try:
+                cam_id, timestamp, frame = self.inbox.get(timeout=0.5)
+            except queue.Empty:
+                self._flush_ready()
+                continue
+            start = time.perf_counter()
+            data = self._encode(frame)
+            self.encode_time += time.perf_counter() - start
+            self.encoded += 1
+            if data is not None:
+                with self.lock:
+                    if cam_id not in self.rings:
+                        self.rings[cam_id] = FrameRing(self.ring_seconds, self.max_bytes)
+                    self.rings[cam_id].append(timestamp, data)
+            self._flush_ready()
+
+    def _flush_ready(self, force=False):
+        """
+        Envía al pool de escritura los clips que ya tienen sus frames posteriores (o cuya
+        cámara dejó de enviar frames).
+        """
+        now = time.time()
+        ready = []
+        with self.lock:
+            for clip in list(self.pending):
+                ring = self.rings.get(clip["cam_id"])
+                latest = ring.latest() if ring else None
+                if force or (latest is not None and latest >= clip["end"]) or now > clip["end"] + 2.0:
+                    self.pending.remove(clip)
+                    ready.append((clip, ring.between(clip["start"], clip["end"]) if ring else []))
+        for clip, frames in ready:
+            self.writers.submit(self._write_safe, clip, frames)
+
+    def _write_safe(self, clip, frames):
+        try:
+            self._write(clip, frames)
+        except Exception as e:
+            print(f"[WARN] No se pudo escribir el clip {clip['path']}: {e}")
+            self.failed += 1
+
+    def _write(self, clip, frames):
+        if not frames:
+            print(f"[WARN] Clip {clip['path']} sin frames en el buffer. Se omite.")
+            self.failed += 1
+            return
+        frames.sort(key=lambda item: item[0])
+        duration = frames[-1][0] - frames[0][0]
+        fps = min(max((len(frames) - 1) / duration, 1.0), 30.0) if duration > 0 else 1.0
+        first = cv2.imdecode(frames[0][1], cv2.IMREAD_COLOR)
+        h, w = first.shape[:2]
+        tmp_path = clip["path"][:-4] + ".tmp.mp4"
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        try:
+            writer.write(first)
+            for _, data in frames[1:]:
+                frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                if frame.shape[:2] != (h, w):
+                    frame = cv2.resize(frame, (w, h))
+                writer.write(frame)
+        finally:
+            writer.release()
+        # Renombrado atómico: el clip solo aparece en su ruta cuando está completo
+        os.replace(tmp_path, clip["path"])
+        self.written += 1
+
+    def memory(self):
+        with self.lock:
+            return {cam_id: ring.bytes for cam_id, ring in self.rings.items()}
+
+    def report(self):
+        lines = []
+        with self.lock:
+            for cam_id, ring in sorted(self.rings.items()):
+                lines.append(f"CAM {cam_id}: {ring.bytes / 2**20:.1f}/{self.max_bytes / 2**20:.0f} MB, "
+                             f"{len(ring)} frames ({ring.span():.1f}s), {ring.evicted} descartados por memoria")
+            pending = len(self.pending)
+        encode_ms = 1000 * self.encode_time / self.encoded if self.encoded else 0.0
+        lines.append(f"clips escritos {self.written}, pendientes {pending}, fallidos {self.failed} | "
+                     f"compresión {encode_ms:.1f} ms/frame, descartados en cola {self.dropped}/{self.pushed}")
+        return lines
+
+    def stop(self):
+        self.stopped = True
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        self._flush_ready(force=True)
+        self.writers.shutdown(wait=True)
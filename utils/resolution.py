@@ -0,0 +1,60 @@
+import collections
+import numpy as np
+
+class ResolutionTiers:
+    """
+    Resolución de inferencia (imgsz) por cámara. Cada cámara usa su `imgsz` de config.yaml
+    (o el global) y, con `auto`, baja al escalón menor en el que la caja más pequeña vista en
+    sus últimos `window` keyframes seguiría midiendo al menos `min_box_px` píxeles a la
+    entrada del modelo. En cuanto aparece una caja más pequeña vuelve a subir.
+    """
+    def __init__(self, default=640, tiers=(320, 480, 640), auto=False, min_box_px=48, window=30):
+        self.default = int(default)
+        self.tiers = sorted(int(t) for t in tiers)
+        self.auto = auto
+        self.min_box_px = min_box_px
+        self.window = window
+        self.base = {}    # cam_id -> imgsz configurado
+        self.recent = {}  # cam_id -> lado mínimo de caja / lado mayor del frame, por keyframe
+        self.current = {} # cam_id -> imgsz en uso
+        self.usage = collections.defaultdict(collections.Counter) # cam_id -> {imgsz: keyframes}
+
+    def set_camera(self, cam_id, imgsz=None):
+        self.base[cam_id] = int(imgsz or self.default)
+        self.recent[cam_id] = collections.deque(maxlen=self.window)
+        self.current[cam_id] = self.base[cam_id]
+
+    def get(self, cam_id):
+        if cam_id not in self.base:
+            self.set_camera(cam_id)
+        return self.current[cam_id]
+
+    def observe(self, cam_id, detections, frame_shape):
+        """
+        Registra las detecciones de un keyframe y actualiza el imgsz de la cámara.
+        :param detections: DetectionBatch de la cámara (salida del detector).
+        """
+        size = self.get(cam_id)
+        self.usage[cam_id][size] += 1
+        if not self.auto or not len(detections):
+            return size
+        boxes = detections.boxes
+        smallest = float(np.minimum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]).min())
+        recent = self.recent[cam_id]
+        recent.append(smallest / max(frame_shape[:2]))
+        base = self.base[cam_id]
+        if len(recent) < recent.maxlen and min(recent) * size >= self.min_box_px:
+            return size # Sin historia suficiente solo se permite volver a subir
+        relative = min(recent)
+        fits = [t for t in self.tiers if t <= base and relative * t >= self.min_box_px]
+        self.current[cam_id] = min(fits) if fits else base
+        return self.current[cam_id]
+
+    def report(self):
+        lines = []
+        for cam_id in sorted(self.base):
+            usage = self.usage[cam_id]
+            total = sum(usage.values()) or 1
+            shares = ", ".join(f"{size}: {100 * n / total:.0f}%" for size, n in sorted(usage.items()))
+            lines.append(f"CAM {cam_id}: imgsz {self.current[cam_id]} (config {self.base[cam_id]}) | {shares}")
+        return lines
@@ -0,0 +1,146 @@
+import time
+import numpy as np
+
+from utils.propagation import point_segment_distance
+
+class CameraState:
+    """
+    Estado de planificación de una cámara: actividad reciente, cercanía a la línea y
+    momentos en que fue atendida (para calcular FPS logrado y antigüedad del frame).
+    """
+    def __init__(self, cam_id, min_fps, max_fps, line=None):
+        self.cam_id = cam_id
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.line = line
+        self.activity = 0.0    # EMA de tracks activos, normalizada a [0, 1)
+        self.proximity = 0.0   # EMA de cercanía a la línea de conteo en [0, 1]
+        self.last_served = None
+        self.served = 0        # Frames incluidos en un lote
+        self.forced = 0        # Incluidos por estar por debajo de min_fps
+        self.skipped = 0       # Veces que tenía frame nuevo pero otras cámaras tuvieron prioridad
+
+    def staleness(self, now):
+        """
+        Segundos desde la última vez que se atendió, relativos al periodo mínimo (1 / min_fps).
+        """
+        if self.last_served is None:
+            return float("inf")
+        return (now - self.last_served) * self.min_fps
+
+class ActivityScheduler:
+    """
+    Elige qué cámaras entran en cada lote de inferencia de tamaño fijo. El modelo ve siempre
+    lotes de batch_size frames: si hay menos cámaras elegibles (con frame nuevo y sin superar
+    max_fps), el lote se completa repitiendo el último frame y esos resultados se descartan
+    (pad_to en utils.tracking.predict_bucketed; con varios escalones de imgsz el relleno va al
+    bucket más grande y el total por paso sigue siendo batch_size).
+
+    Cada cámara con frame nuevo recibe una prioridad:
+        w_activity * actividad + w_line * cercanía a la línea + w_staleness * antigüedad
+    con dos restricciones por cámara:
+      - max_fps: no se vuelve a atender antes de 1 / max_fps segundos.
+      - min_fps: si pasó más de 1 / min_fps sin atenderla, entra antes que cualquier otra
+        (las más atrasadas primero).
+    """
+    def __init__(self, batch_size=4, min_fps=2.0, max_fps=30.0, weights=None, line_margin=80, ema=0.3):
+        """
+        :param batch_size: Tamaño fijo del lote de inferencia (cámaras máximas por lote).
+        :param min_fps: FPS mínimo por defecto de cada cámara.
+        :param max_fps: FPS máximo por defecto de cada cámara.
+        :param weights: Pesos {'activity', 'line', 'staleness'} de la prioridad.
+        :param line_margin: px: a partir de esta distancia a la línea la cercanía es 0.
+        :param ema: Factor de suavizado de actividad y cercanía (1 = solo el último frame).
+        """
+        self.batch_size = batch_size
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        weights = weights or {}
+        self.w_activity = weights.get("activity", 1.0)
+        self.w_line = weights.get("line", 2.0)
+        self.w_staleness = weights.get("staleness", 0.5)
+        self.line_margin = line_margin
+        self.ema = ema
+        self.cameras = {}
+        self.batches = 0
+        self.report_start = time.time()
+        self.report_base = {}
+
+    def add_camera(self, cam_id, min_fps=None, max_fps=None, line=None):
+        self.cameras[cam_id] = CameraState(cam_id, min_fps or self.min_fps, max_fps or self.max_fps, line)
+        return self.cameras[cam_id]
+
+    def _camera(self, cam_id):
+        return self.cameras.get(cam_id) or self.add_camera(cam_id)
+
+    def select(self, cam_ids, now=None):
+        """
+        :param cam_ids: Cámaras que tienen un frame nuevo disponible.
+        :return: Lista de cam_ids elegidos para el lote, en el orden recibido: las batch_size más
+                 prioritarias, o todas las elegibles si hay menos (el resto del lote es relleno).
+        """
+        now = time.time() if now is None else now
+        forced, candidates = [], []
+        for cam_id in cam_ids:
+            state = self._camera(cam_id)
+            staleness = state.staleness(now)
+            if state.last_served is not None and now - state.last_served < 1.0 / state.max_fps:
+                continue
+            if staleness >= 1.0:
+                forced.append((-staleness, cam_id))
+            else:
+                score = (self.w_activity * state.activity + self.w_line * state.proximity
+                         + self.w_staleness * staleness)
+                candidates.append((-score, cam_id))
+
+        ranked = [cam_id for _, cam_id in sorted(forced)] + [cam_id for _, cam_id in sorted(candidates)]
+        chosen = set(ranked[:self.batch_size])
+        forced_ids = {cam_id for _, cam_id in forced}
+        for cam_id in ranked:
+            state = self.cameras[cam_id]
+            if cam_id in chosen:
+                state.served += 1
+                state.forced += cam_id in forced_ids
+                state.last_served = now
+            else:
+                state.skipped += 1
+        if chosen:
+            self.batches += 1
+        return [cam_id for cam_id in cam_ids if cam_id in chosen]
+
+    def observe(self, cam_id, detections):
+        """
+        Actualiza la actividad de una cámara con sus tracks del frame recién procesado.
+        :param detections: DetectionBatch de una cámara.
+        """
+        state = self._camera(cam_id)
+        activity = 1.0 - float(np.exp(-len(detections) / 3.0))
+        proximity = 0.0
+        if state.line is not None and len(detections):
+            distance = point_segment_distance(detections.centroids(), *state.line).min()
+            proximity = max(0.0, 1.0 - float(distance) / self.line_margin)
+        state.activity += self.ema * (activity - state.activity)
+        state.proximity += self.ema * (proximity - state.proximity)
+
+    def stats(self):
+        return {cam_id: {"served": s.served, "forced": s.forced, "skipped": s.skipped,
+                         "activity": round(s.activity, 3), "proximity": round(s.proximity, 3)}
+                for cam_id, s in self.cameras.items()}
+
+    def report(self):
+        """
+        :return: Líneas de texto con FPS logrado y decisiones por cámara desde el último reporte.
+        """
+        elapsed = time.time() - self.report_start
+        lines = []
+        for cam_id, s in sorted(self.stats().items()):
+            base = self.report_base.get(cam_id, {"served": 0, "forced": 0, "skipped": 0})
+            fps = (s["served"] - base["served"]) / elapsed if elapsed > 0 else 0.0
+            state = self.cameras[cam_id]
+            lines.append(f"CAM {cam_id}: {fps:.1f} fps (min {state.min_fps:g}, max {state.max_fps:g}) | "
+                         f"atendida {s['served'] - base['served']}, forzada {s['forced'] - base['forced']}, "
+                         f"omitida {s['skipped'] - base['skipped']} | actividad {s['activity']:.2f}, "
+                         f"línea {s['proximity']:.2f}")
+            self.report_base[cam_id] = s
+        self.report_start = time.time()
+        return lines
@@ -0,0 +1,298 @@
+import os
+import json
+import heapq
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+PAD_VALUE = 114 # Mismo gris de relleno que usa Ultralytics en el letterbox
+
+def letterbox(image, imgsz, pad_value=PAD_VALUE):
+    """
+    Redimensiona manteniendo la relación de aspecto y rellena hasta imgsz x imgsz (centrado).
+    :return: (imagen_cuadrada, escala, (pad_x, pad_y))
+    """
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    new_w, new_h = int(round(w0 * r)), int(round(h0 * r))
+    interp = cv2.INTER_AREA if r < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, (new_w, new_h), interpolation=interp) if r != 1 else image
+
+    out = np.full((imgsz, imgsz, 3), pad_value, dtype=np.uint8)
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = resized
+    return out, r, (pad_x, pad_y)
+
+def letterbox_labels(labels, orig_shape, imgsz):
+    """
+    Transforma etiquetas YOLO [cls, x, y, w, h] normalizadas a la imagen original
+    en etiquetas normalizadas a la imagen letterbox imgsz x imgsz.
+    """
+    if len(labels) == 0:
+        return labels
+    h0, w0 = orig_shape
+    r = imgsz / max(h0, w0)
+    pad_x = (imgsz - int(round(w0 * r))) // 2
+    pad_y = (imgsz - int(round(h0 * r))) // 2
+
+    out = labels.copy()
+    out[:, 1] = (labels[:, 1] * w0 * r + pad_x) / imgsz
+    out[:, 2] = (labels[:, 2] * h0 * r + pad_y) / imgsz
+    out[:, 3] = labels[:, 3] * w0 * r / imgsz
+    out[:, 4] = labels[:, 4] * h0 * r / imgsz
+    return out
+
+def labels_dir_for(images_dir):
+    """
+    Carpeta de etiquetas correspondiente a una carpeta de imágenes (convención images/ -> labels/).
+    """
+    parts = os.path.normpath(images_dir).split(os.sep)
+    if "images" in parts:
+        parts[len(parts) - 1 - parts[::-1].index("images")] = "labels"
+    return os.sep.join(parts)
+
+def read_yolo_labels(label_path):
+    """
+    Lee un archivo de etiquetas YOLO. Devuelve array (n, 5) float32 (vacío si no existe).
+    """
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5), dtype=np.float32)
+    rows = []
+    with open(label_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 5:
+                rows.append([float(v) for v in parts[:5]])
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+def _shard_path(cache_dir, shard_idx):
+    return os.path.join(cache_dir, f"shard_{shard_idx:04d}.u8")
+
+def _load_index(cache_dir):
+    index_path = os.path.join(cache_dir, "index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_json_atomic(data, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _compact(index, cache_dir):
+    """
+    Mueve las imágenes de los slots más altos a los slots libres más bajos hasta que los slots
+    usados quedan contiguos, y borra los shards que quedan vacíos. Solo se escribe en slots que
+    el índice guardado ya da por libres, así que una interrupción a medias no corrompe la caché.
+
+    :return: Número de imágenes movidas.
+    """
+    imgsz, shard_size = index["imgsz"], index["shard_size"]
+    by_pos = {e["shard"] * shard_size + e["slot"]: e for e in index["images"].values()}
+    used = sorted(by_pos)
+    free = [pos for pos in range(sum(index["shards"])) if pos not in by_pos]
+    free.reverse() # pop() devuelve el slot libre más bajo
+
+    open_shards = {}
+
+    def shard(shard_idx):
+        if shard_idx not in open_shards:
+            open_shards[shard_idx] = np.memmap(_shard_path(cache_dir, shard_idx), dtype=np.uint8, mode="r+",
+                                               shape=(shard_size, imgsz, imgsz, 3))
+        return open_shards[shard_idx]
+
+    moved = 0
+    while free and used and free[-1] < used[-1]:
+        target, source = free.pop(), used.pop()
+        entry = by_pos[source]
+        shard(target // shard_size)[target % shard_size] = shard(source // shard_size)[source % shard_size]
+        entry["shard"], entry["slot"] = divmod(target, shard_size)
+        moved += 1
+    for mm in open_shards.values():
+        mm.flush()
+    open_shards.clear()
+
+    full, rest = divmod(len(index["images"]), shard_size)
+    old_count = len(index["shards"])
+    index["shards"] = [shard_size] * full + ([rest] if rest else [])
+    _save_json_atomic(index, os.path.join(cache_dir, "index.json"))
+    for shard_idx in range(len(index["shards"]), old_count):
+        os.remove(_shard_path(cache_dir, shard_idx))
+    return moved
+
+def build_split(images_dir, labels_dir, cache_dir, imgsz=640, shard_size=256):
+    """
+    Construye (o actualiza de forma incremental) la caché de un split.
+
+    Cada shard es un archivo uint8 de tamaño fijo (shard_size, imgsz, imgsz, 3) con las imágenes
+    ya en letterbox. Solo se decodifican las imágenes nuevas o modificadas (según mtime);
+    las etiquetas (baratas de leer) se regeneran completas en labels.npz en cada ejecución.
+    Los slots de imágenes eliminadas se reutilizan y, si llegan a sumar un shard entero,
+    la caché se compacta.
+
+    :return: Diccionario con estadísticas {'new', 'updated', 'skipped', 'removed', 'compacted'}.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index = _load_index(cache_dir)
+    if index and (index.get("imgsz") != imgsz or index.get("shard_size") != shard_size):
+        logger.warning(f"La caché en {cache_dir} usa otro imgsz/shard_size. Se reconstruirá desde cero.")
+        for f in os.listdir(cache_dir):
+            os.remove(os.path.join(cache_dir, f))
+        index = None
+    if index is None:
+        index = {"imgsz": imgsz, "shard_size": shard_size, "shards": [], "images": {}}
+
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    stats = {"new": 0, "updated": 0, "skipped": 0, "removed": 0, "compacted": 0}
+
+    # Las imágenes borradas del dataset se quitan del índice (su slot queda libre)
+    current = set(names)
+    for name in [n for n in index["images"] if n not in current]:
+        del index["images"][name]
+        stats["removed"] += 1
+
+    # Slots ya asignados que no usa ninguna imagen: se reutilizan (el más bajo primero) antes de crecer
+    used = {(e["shard"], e["slot"]) for e in index["images"].values()}
+    free = [(shard_idx, slot) for shard_idx, count in enumerate(index["shards"])
+            for slot in range(count) if (shard_idx, slot) not in used]
+    heapq.heapify(free)
+
+    open_shards = {}
+
+    def slot_for(name):
+        entry = index["images"].get(name)
+        if entry is not None:
+            return entry["shard"], entry["slot"]
+        if free:
+            return heapq.heappop(free)
+        if not index["shards"] or index["shards"][-1] >= shard_size:
+            index["shards"].append(0)
+        shard_idx = len(index["shards"]) - 1
+        slot = index["shards"][shard_idx]
+        index["shards"][shard_idx] += 1
+        return shard_idx, slot
+
+    def shard(shard_idx):
+        if shard_idx not in open_shards:
+            path = _shard_path(cache_dir, shard_idx)
+            mode = "r+" if os.path.exists(path) else "w+"
+            open_shards[shard_idx] = np.memmap(path, dtype=np.uint8, mode=mode,
+                                               shape=(shard_size, imgsz, imgsz, 3))
+        return open_shards[shard_idx]
+
+    for name in names:
+        img_path = os.path.join(images_dir, name)
+        mtime = os.path.getmtime(img_path)
+        entry = index["images"].get(name)
+        if entry is not None and entry["mtime"] == mtime:
+            stats["skipped"] += 1
+            continue
+
+        image = cv2.imread(img_path)
+        if image is None:
+            logger.warning(f"No se pudo leer la imagen: {img_path}. Se omitirá.")
+            if entry is not None:
+                # La versión en caché ya no corresponde al archivo: se quita y su slot queda libre
+                del index["images"][name]
+                heapq.heappush(free, (entry["shard"], entry["slot"]))
+                stats["removed"] += 1
+            continue
+
+        shard_idx, slot = slot_for(name)
+        boxed, _, _ = letterbox(image, imgsz)
+        shard(shard_idx)[slot] = boxed
+        index["images"][name] = {"shard": shard_idx, "slot": slot, "mtime": mtime,
+                                 "orig_shape": list(image.shape[:2])}
+        stats["updated" if entry is not None else "new"] += 1
+
+    for mm in open_shards.values():
+        mm.flush()
+    open_shards.clear()
+
+    # Etiquetas: arrays planos con offsets por imagen, en el orden del índice
+    ordered = sorted(index["images"])
+    offsets = np.zeros(len(ordered) + 1, dtype=np.int64)
+    all_labels = []
+    for i, name in enumerate(ordered):
+        labels = read_yolo_labels(os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt"))
+        labels = letterbox_labels(labels, index["images"][name]["orig_shape"], imgsz)
+        all_labels.append(labels)
+        offsets[i + 1] = offsets[i] + len(labels)
+    labels_arr = np.concatenate(all_labels) if all_labels else np.zeros((0, 5), dtype=np.float32)
+
+    tmp_labels = os.path.join(cache_dir, "labels.tmp.npz")
+    np.savez(tmp_labels, names=np.array(ordered), offsets=offsets, labels=labels_arr)
+    os.replace(tmp_labels, os.path.join(cache_dir, "labels.npz"))
+    _save_json_atomic(index, os.path.join(cache_dir, "index.json"))
+
+    # Con un shard entero de huecos se compacta (después de guardar el índice: ver _compact)
+    if len(free) >= shard_size:
+        stats["compacted"] = _compact(index, cache_dir)
+    return stats
+
+def cache_imgsz(cache_dir):
+    """
+    imgsz con el que se construyó la caché de un split (None si no existe).
+    """
+    index = _load_index(cache_dir)
+    return index["imgsz"] if index else None
+
+class ShardCache:
+    """
+    Lector de la caché de un split. Las imágenes se leen mediante np.memmap en modo
+    solo lectura, por lo que la RAM usada queda acotada por la caché de páginas del SO
+    y no por el tamaño del dataset.
+    """
+    def __init__(self, cache_dir):
+        index = _load_index(cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"No se encontró caché de shards en: {cache_dir}")
+        self.cache_dir = cache_dir
+        self.imgsz = index["imgsz"]
+        self.shard_size = index["shard_size"]
+        self.entries = index["images"]
+
+        with np.load(os.path.join(cache_dir, "labels.npz")) as data:
+            self.names = [str(n) for n in data["names"]]
+            self.offsets = data["offsets"]
+            self.labels_arr = data["labels"]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def _shard(self, shard_idx):
+        # Se abre de forma perezosa: cada worker del DataLoader abre sus propios memmaps
+        if shard_idx not in self._shards:
+            self._shards[shard_idx] = np.memmap(_shard_path(self.cache_dir, shard_idx), dtype=np.uint8,
+                                                mode="r", shape=(self.shard_size, self.imgsz, self.imgsz, 3))
+        return self._shards[shard_idx]
+
+    def image(self, name):
+        """
+        Vista (sin copia) de la imagen letterbox imgsz x imgsz x 3 BGR.
+        """
+        entry = self.entries[name]
+        return self._shard(entry["shard"])[entry["slot"]]
+
+    def labels(self, name):
+        """
+        Etiquetas (n, 5) [cls, x, y, w, h] normalizadas a la imagen letterbox.
+        """
+        i = self.positions[name]
+        return self.labels_arr[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getstate__(self):
+        # Los memmaps no se serializan hacia los workers del DataLoader; se reabren allí
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
@@ -0,0 +1,224 @@
+import collections
+import ipaddress
+import itertools
+import os
+import queue
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from utils.connection import Backoff
+
+AUTH_EXIT_CODE = 3 # Código de salida de un worker cuya clave rechaza el coordinador
+
+def authkey():
+    """
+    Clave compartida entre coordinador y workers: variable SHARD_AUTHKEY del .env (o la que el
+    coordinador pasa a sus workers locales). None si no está definida.
+    """
+    key = os.getenv("SHARD_AUTHKEY")
+    return key.encode() if key else None
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def parse_address(text):
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+def split_cameras(cam_ids, num_workers, groups=None):
+    """
+    Reparte las cámaras entre workers en round-robin (cámaras contiguas en workers distintos,
+    para que una zona con mucha actividad no caiga entera en el mismo worker).
+    :param groups: Pares de cámaras que deben ir al mismo worker (ej. pares de utils.handoff).
+                   Los grupos unidos se asignan al worker con menos cámaras.
+    :return: Lista de listas de cam_ids (sin listas vacías).
+    """
+    if not groups:
+        shards = [list(cam_ids[k::num_workers]) for k in range(num_workers)]
+        return [shard for shard in shards if shard]
+
+    # Unir cámaras conectadas por pares (union-find)
+    parent = {c: c for c in cam_ids}
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+    for a, b in groups:
+        if a in parent and b in parent:
+            parent[find(a)] = find(b)
+    clusters = collections.defaultdict(list)
+    for c in cam_ids:
+        clusters[find(c)].append(c)
+
+    shards = [[] for _ in range(num_workers)]
+    for cluster in sorted(clusters.values(), key=len, reverse=True):
+        min(shards, key=len).extend(cluster)
+    return [sorted(shard) for shard in shards if shard]
+
+class EventDeduplicator:
+    """
+    Descarta eventos ya vistos por su event_id (los workers reenvían tras reconectar, así que
+    la entrega es "al menos una vez"). Guarda los últimos `capacity` ids.
+    """
+    def __init__(self, capacity=100000):
+        self.seen = collections.OrderedDict()
+        self.capacity = capacity
+        self.duplicates = 0
+
+    def is_new(self, event_id):
+        if event_id in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen[event_id] = True
+        if len(self.seen) > self.capacity:
+            self.seen.popitem(last=False)
+        return True
+
+class CountAggregator:
+    """
+    Totales por terminal y clase a partir de los eventos de todos los workers.
+    """
+    def __init__(self):
+        self.totals = collections.defaultdict(lambda: collections.defaultdict(int))
+
+    def add(self, event):
+        terminal = event.get("terminal") or f"cam{event['cam_id']}"
+        self.totals[terminal][event["class"]] += 1
+
+    def report(self):
+        return {terminal: dict(counts) for terminal, counts in self.totals.items()}
+
+class ShardServer:
+    """
+    Lado coordinador: acepta conexiones de workers (socket local o remoto) y deja todos los
+    mensajes en una única cola.
+    multiprocessing.connection intercambia pickles, así que la clave es lo único que impide
+    ejecutar código a quien alcance el puerto: sin SHARD_AUTHKEY solo se escucha en loopback,
+    con una clave aleatoria que el coordinador pasa a sus workers locales.
+    """
+    def __init__(self, address, key=None):
+        self.key = key or authkey()
+        if self.key is None:
+            if not is_loopback(address[0]):
+                raise RuntimeError(f"Escuchar en {address[0]} requiere definir SHARD_AUTHKEY en el .env "
+                                   f"(la misma clave en el coordinador y en los workers remotos)")
+            self.key = os.urandom(32).hex().encode()
+        self.listener = Listener(address, authkey=self.key)
+        self.address = self.listener.address
+        self.messages = queue.Queue()
+        self.stopped = False
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while not self.stopped:
+            try:
+                conn = self.listener.accept()
+            except Exception as e:
+                if not self.stopped:
+                    print(f"[WARN] Conexión de worker rechazada: {e}")
+                continue
+            threading.Thread(target=self._reader, args=(conn,), daemon=True).start()
+
+    def _reader(self, conn):
+        while not self.stopped:
+            try:
+                self.messages.put(conn.recv())
+            except (EOFError, OSError):
+                break
+        conn.close()
+
+    def get(self, timeout=0.5):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.stopped = True
+        self.listener.close()
+
+class ShardClient:
+    """
+    Lado worker: envía eventos y métricas al coordinador. Los mensajes se encolan y un hilo
+    los envía; si la conexión cae se reintenta con backoff y los mensajes pendientes se
+    reenvían (el coordinador descarta duplicados por event_id).
+    """
+    def __init__(self, address, worker_id, key=None, max_pending=10000):
+        self.address = address
+        self.worker_id = worker_id
+        self.key = key or authkey()
+        if self.key is None:
+            raise RuntimeError("SHARD_AUTHKEY no definido: el worker necesita la clave del coordinador")
+        self.pending = collections.deque(maxlen=max_pending)
+        self.cond = threading.Condition()
+        self.conn = None
+        self.backoff = Backoff(base=0.5, maximum=10.0)
+        # Prefijo único por proceso: un worker reiniciado no reutiliza ids de eventos
+        self.event_prefix = f"{worker_id}-{os.getpid()}-{int(time.time())}"
+        self.event_seq = itertools.count()
+        self.stopped = False
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def next_event_id(self):
+        return f"{self.event_prefix}-{next(self.event_seq)}"
+
+    def send(self, message):
+        message = {"worker": self.worker_id, **message}
+        with self.cond:
+            self.pending.append(message)
+            self.cond.notify()
+
+    def _connect(self):
+        while not self.stopped:
+            try:
+                self.conn = Client(self.address, authkey=self.key)
+                self.backoff.reset()
+                return True
+            except AuthenticationError:
+                # Reintentar no sirve y el hilo moriría en silencio mientras los eventos se descartan en
+                # la cola acotada: se termina el proceso para que el coordinador lo vea
+                print(f"[ERROR] El coordinador {self.address[0]}:{self.address[1]} rechazó la clave: "
+                      "SHARD_AUTHKEY debe ser la misma en el coordinador y en los workers.")
+                os._exit(AUTH_EXIT_CODE)
+            except OSError:
+                time.sleep(self.backoff.next_delay())
+        return False
+
+    def _send_loop(self):
+        while not self.stopped:
+            with self.cond:
+                while not self.pending and not self.stopped:
+                    self.cond.wait(0.5)
+                if self.stopped:
+                    break
+                message = self.pending[0]
+            if self.conn is None and not self._connect():
+                break
+            try:
+                self.conn.send(message)
+            except OSError:
+                print("[WARN] Conexión con el coordinador perdida. Reintentando...")
+                self.conn = None
+                continue
+            with self.cond:
+                if self.pending and self.pending[0] is message:
+                    self.pending.popleft()
+
+    def close(self, timeout=2.0):
+        # Dar tiempo a vaciar los eventos pendientes
+        deadline = time.time() + timeout
+        while self.pending and time.time() < deadline:
+            time.sleep(0.05)
+        self.stopped = True
+        with self.cond:
+            self.cond.notify()
+        if self.conn is not None:
+            self.conn.close()
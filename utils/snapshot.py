@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+def counter_state(counter, live_ids=None):
+    """
+    Estado de un LineCounter como arrays (se copia en el hilo principal; es barato).
+    :param live_ids: Ids de los tracks que el tracker aún conserva (activos o perdidos). Si se
+        indica, solo se guardan counted_ids / track_history de esos tracks: los ids no se
+        reutilizan, así que los de tracks terminados ya no influyen en el conteo y el
+        snapshot no crece durante todo el turno.
+    """
+    names = list(counter.counts)
+    history = counter.track_history
+    counted = counter.counted_ids
+    if live_ids is not None:
+        live_ids = set(live_ids)
+        history = {tid: point for tid, point in history.items() if tid in live_ids}
+        counted = counted & live_ids
+    hist_ids = np.fromiter(history.keys(), dtype=np.int64, count=len(history))
+    hist_xy = np.array(list(history.values()), dtype=np.int32).reshape(-1, 2)
+    return {"counted": np.fromiter(counted, dtype=np.int64, count=len(counted)),
+            "hist_ids": hist_ids, "hist_xy": hist_xy,
+            "names": np.array(names, dtype=str), "values": np.array([counter.counts[n] for n in names], dtype=np.int64),
+            "total": np.array(counter.total_count, dtype=np.int64)}
+
+def restore_counter(counter, state):
+    counter.counts.update(zip(state["names"].tolist(), state["values"].tolist()))
+    counter.total_count = int(state["total"])
+    counter.counted_ids = set(state["counted"].tolist())
+    counter.track_history = dict(zip(state["hist_ids"].tolist(), map(tuple, state["hist_xy"].tolist())))
+
+def load_snapshot(path, max_age):
+    """
+    :param max_age: Segundos máximos de antigüedad para considerar válido el snapshot.
+    :return: (estados {cam_id: {clave: array}}, metadatos) o (None, motivo) si no se puede usar.
+    """
+    if not os.path.exists(path):
+        return None, "no existe"
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key] for key in data.files}
+    except Exception as e:
+        return None, f"ilegible ({e})"
+    age = time.time() - float(arrays.pop("meta_time"))
+    if age > max_age:
+        return None, f"antiguo ({age:.0f}s > {max_age}s)"
+    meta = {"age": age, "max_track_id": int(arrays.pop("meta_max_track_id"))}
+    states = {}
+    for key, value in arrays.items():
+        cam, name = key.split("/", 1)
+        states.setdefault(int(cam), {})[name] = value
+    return states, meta
+
+class SnapshotWriter:
+    """
+    Snapshots periódicos del estado de conteo y tracking por cámara en un único .npz sin
+    comprimir. El bucle principal solo copia el estado a arrays; el .npz se escribe en un
+    hilo aparte, con fichero temporal + fsync + renombrado atómico para que un corte a mitad
+    de escritura nunca deje un snapshot corrupto. Si la escritura anterior aún no terminó,
+    el snapshot del intervalo se omite; el snapshot final (final=True) espera a que termine y
+    se escribe en el hilo que llama.
+    """
+    def __init__(self, path, interval=10.0):
+        self.path = path
+        self.interval = interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.last = time.time()
+        self.busy = threading.Lock() # Tomado mientras se escribe un snapshot
+        self.saved = 0
+        self.skipped = 0
+        self.capture_time = 0.0 # Hilo principal
+        self.write_time = 0.0   # Hilo de escritura
+        self.bytes = 0
+
+    def due(self):
+        return time.time() - self.last >= self.interval
+
+    def save(self, states, max_track_id, capture_time=0.0, final=False, timeout=5.0):
+        """
+        :param states: {cam_id: {clave: array}} (ver counter_state y utils.tracking.tracker_state).
+        :param capture_time: Segundos que tardó el hilo principal en copiar el estado.
+        :param final: Esperar (hasta `timeout` segundos) a la escritura en curso y escribir de
+            forma síncrona; al volver, el snapshot ya está en disco.
+        :return: True si el snapshot se guardó o quedó en escritura.
+        """
+        self.last = time.time()
+        acquired = self.busy.acquire(timeout=timeout) if final else self.busy.acquire(blocking=False)
+        if not acquired:
+            if final:
+                print(f"[WARN] Snapshot final de {self.path} omitido: la escritura anterior no terminó")
+            self.skipped += 1
+            return False
+        self.capture_time += capture_time
+        arrays = {f"{cam_id}/{key}": value for cam_id, state in states.items() for key, value in state.items()}
+        arrays["meta_time"] = np.array(self.last)
+        arrays["meta_max_track_id"] = np.array(max_track_id, dtype=np.int64)
+        if final:
+            self._write(arrays)
+        else:
+            threading.Thread(target=self._write, args=(arrays,), daemon=True).start()
+        return True
+
+    def _write(self, arrays):
+        start = time.perf_counter()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.bytes = os.path.getsize(self.path)
+            self.saved += 1
+            self.write_time += time.perf_counter() - start
+        except OSError as e:
+            print(f"[WARN] No se pudo guardar el snapshot {self.path}: {e}")
+        finally:
+            self.busy.release()
+
+    def close(self, timeout=5.0):
+        """
+        Espera a que termine la escritura en curso (para un snapshot final usar save(final=True)).
+        """
+        if self.busy.acquire(timeout=timeout):
+            self.busy.release()
+
+    def report(self):
+        n = max(self.saved, 1)
+        return (f"{self.saved} guardados ({self.skipped} omitidos), {self.bytes / 1024:.0f} KB, "
+                f"copia {1000 * self.capture_time / n:.2f} ms (hilo principal), "
+                f"escritura {1000 * self.write_time / n:.1f} ms por intervalo de {self.interval:.0f}s")
@@ -0,0 +1,156 @@
+# Estas utilidades usan internos de los trackers de Ultralytics (BaseTrack._count, tracked_stracks,
+# lost_stracks, atributos de STrack, constructor con frame_rate) tal como son de 8.1.0 a 8.3.253 (rango probado, fijado en requirements.txt)
+import numpy as np
+import yaml
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.basetrack import BaseTrack
+from ultralytics.trackers.bot_sort import BOTSORT, BOTrack
+from ultralytics.trackers.byte_tracker import BYTETracker, STrack
+from ultralytics.utils import IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+from utils.detections import DetectionBatch
+
+TRACKER_MAP = {"bytetrack": BYTETracker, "botsort": BOTSORT}
+
+def load_tracker_cfg(tracker_type="bytetrack.yaml"):
+    """
+    Carga la configuración de un tracker de Ultralytics ('bytetrack.yaml', 'botsort.yaml' o ruta propia).
+    """
+    # yaml.safe_load directamente: ultralytics.utils.yaml_load desaparece dentro del rango fijado (8.3.x tardías)
+    with open(check_yaml(tracker_type), "r", encoding="utf-8") as f:
+        cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+    if cfg.tracker_type not in TRACKER_MAP:
+        raise ValueError(f"Tracker no soportado: '{cfg.tracker_type}'. Opciones: {list(TRACKER_MAP)}")
+    return cfg
+
+def create_tracker(tracker_type="bytetrack.yaml", frame_rate=30, **overrides):
+    """
+    Crea una instancia independiente de tracker (una por cámara).
+    Los ids de track son un contador global (BaseTrack._count) y el constructor de los trackers
+    de Ultralytics lo pone a 0: se conserva para que crear el tracker de una cámara no haga que
+    las demás vuelvan a emitir ids que ya están en sus contadores.
+    :param overrides: Parámetros del YAML a sobrescribir (ej. gmc_method="none").
+    """
+    cfg = load_tracker_cfg(tracker_type)
+    for key, value in overrides.items():
+        setattr(cfg, key, value)
+    count = BaseTrack._count
+    tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+    BaseTrack._count = max(BaseTrack._count, count)
+    return tracker
+
+def tracker_state(tracker):
+    """
+    Tracks activos y perdidos del tracker (con su estado de Kalman) como arrays numéricos,
+    para guardarlos junto al resto del snapshot (ver utils.snapshot) sin recurrir a pickle.
+    """
+    tracks = [t for t in tracker.tracked_stracks + tracker.lost_stracks if t.mean is not None]
+    lost = set(map(id, tracker.lost_stracks))
+    return {"frame_id": np.array(tracker.frame_id, dtype=np.int64),
+            "lost": np.array([id(t) in lost for t in tracks], dtype=bool),
+            # [track_id, estado, frame_id, start_frame, tracklet_len, activado]
+            "ints": np.array([[t.track_id, t.state, t.frame_id, t.start_frame, t.tracklet_len, t.is_activated]
+                              for t in tracks], dtype=np.int64).reshape(-1, 6),
+            # [score, cls, índice de detección]
+            "floats": np.array([[t.score, t.cls, t.idx] for t in tracks], dtype=np.float64).reshape(-1, 3),
+            "tlwh": np.array([t._tlwh for t in tracks], dtype=np.float64).reshape(-1, 4),
+            "mean": np.array([t.mean for t in tracks], dtype=np.float64).reshape(-1, 8),
+            "covariance": np.array([t.covariance for t in tracks], dtype=np.float64).reshape(-1, 8, 8)}
+
+def restore_tracker(tracker, state):
+    """
+    Reconstruye los tracks guardados con tracker_state. En BoT-SORT no se conservan los
+    descriptores de apariencia (solo se usan con ReID).
+    """
+    track_cls = BOTrack if isinstance(tracker, BOTSORT) else STrack
+    tracked, lost = [], []
+    for k in range(len(state["ints"])):
+        track_id, track_state, frame_id, start_frame, tracklet_len, activated = state["ints"][k].tolist()
+        score, cls, idx = state["floats"][k].tolist()
+        left, top, w, h = state["tlwh"][k].tolist()
+        track = track_cls(np.array([left + w / 2, top + h / 2, w, h, idx]), score, cls)
+        track.kalman_filter = tracker.kalman_filter
+        track.mean, track.covariance = state["mean"][k].copy(), state["covariance"][k].copy()
+        track.track_id, track.state, track.is_activated = track_id, track_state, bool(activated)
+        track.frame_id, track.start_frame, track.tracklet_len = frame_id, start_frame, tracklet_len
+        (lost if state["lost"][k] else tracked).append(track)
+    tracker.frame_id = int(state["frame_id"])
+    tracker.tracked_stracks = tracked
+    tracker.lost_stracks = lost
+
+def max_track_id():
+    return BaseTrack._count
+
+def reserve_track_ids(max_id):
+    """
+    Los ids de track son un contador global que empieza en 1 en cada proceso. Tras restaurar
+    un snapshot hay que continuar desde el último id asignado: si no, los tracks nuevos
+    reutilizarían ids que ya están en counted_ids / track_history de los contadores.
+    """
+    BaseTrack._count = max(BaseTrack._count, int(max_id))
+
+def update_tracker(tracker, boxes, conf, cls, frame_shape, img=None):
+    """
+    Pasa las detecciones de un frame al tracker.
+    :param boxes: Array (N, 4) xyxy en píxeles del frame original.
+    :param conf: Array (N,) de confianzas.
+    :param cls: Array (N,) de clases.
+    :param frame_shape: (alto, ancho) del frame original.
+    :param img: Frame BGR (solo lo necesita BoT-SORT para la compensación de movimiento).
+    :return: Array (M, 7) float32 con columnas [x1, y1, x2, y2, track_id, conf, cls].
+    """
+    data = np.empty((len(boxes), 6), dtype=np.float32)
+    data[:, :4] = boxes
+    data[:, 4] = conf
+    data[:, 5] = cls
+    tracks = tracker.update(Boxes(data, frame_shape[:2]), img)
+    if len(tracks) == 0:
+        return np.zeros((0, 7), dtype=np.float32)
+    return np.asarray(tracks, dtype=np.float32)[:, :7]
+
+def predict_detections(model, frames, pad_to=None, **predict_kwargs):
+    """
+    Ejecuta model.predict sobre un lote de frames.
+    :param pad_to: Tamaño fijo de lote: con menos frames se completa repitiendo el último (sus
+                   resultados se descartan), así el acelerador ve siempre la misma forma de lote.
+    :return: DetectionBatch (una cámara por frame) en coordenadas del frame original,
+             extraído del acelerador con una sola transferencia.
+    """
+    if not frames:
+        return DetectionBatch.empty(0)
+    n = len(frames)
+    if pad_to and n < pad_to:
+        frames = list(frames) + [frames[-1]] * (pad_to - n)
+    return DetectionBatch.from_results(model.predict(source=frames, verbose=False, **predict_kwargs)[:n])
+
+def predict_bucketed(model, frames, sizes, pad_to=None, **predict_kwargs):
+    """
+    Inferencia agrupada por forma: los frames con el mismo imgsz y la misma resolución de
+    origen forman un bucket y cada bucket es una única llamada en lote (con formas iguales
+    Ultralytics usa letterbox rectangular mínimo, ej. 640x384 para 16:9, en vez de 640x640).
+    :param sizes: Lista paralela a frames con el imgsz de cada uno.
+    :param pad_to: Tamaño fijo del lote completo (ver predict_detections). Los huecos libres
+                   (pad_to - len(frames)) se rellenan solo en el bucket más grande, de modo que
+                   cada paso procesa pad_to imágenes en total aunque haya varios buckets; con
+                   escalones de resolución mezclados la forma de cada llamada puede variar, pero
+                   rellenar cada bucket hasta pad_to multiplicaría el coste por el número de buckets.
+    :return: DetectionBatch (una cámara por frame, en el orden de `frames`).
+    """
+    if not frames:
+        return DetectionBatch.empty(0)
+    buckets = {}
+    for i, (frame, size) in enumerate(zip(frames, sizes)):
+        buckets.setdefault((int(size), frame.shape[:2]), []).append(i)
+    if len(buckets) == 1:
+        return predict_detections(model, frames, pad_to, imgsz=int(sizes[0]), **predict_kwargs)
+    spare = max(0, pad_to - len(frames)) if pad_to else 0
+    largest = max(buckets, key=lambda key: len(buckets[key]))
+    views = [None] * len(frames)
+    for key, positions in buckets.items():
+        size = key[0]
+        fill = len(positions) + spare if key == largest else None
+        batch = predict_detections(model, [frames[i] for i in positions], fill, imgsz=size, **predict_kwargs)
+        for j, i in enumerate(positions):
+            views[i] = batch.camera(j)
+    return DetectionBatch.concat(views)
@@ -1,5 +1,4 @@
 import yaml
-import torch
 import os
 import logging
 
@@ -28,6 +27,8 @@ def get_device(device_config=None):
     Determina el dispositivo a utilizar (GPU o CPU).
     Verifica si torch.cuda.is_available() devuelve True.
     """
+    import torch # Import diferido: torch tarda varios segundos en cargar
+
     if torch.cuda.is_available():
         if device_config == "cpu":
             logger.warning("GPU disponible pero se solicitó CPU en la configuración.")
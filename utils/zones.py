@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+
+class ZoneEngine:
+    """
+    Zonas poligonales de una cámara: ocupación, entradas/salidas y tiempo de permanencia.
+
+    Los polígonos se rasterizan una sola vez en una máscara de etiquetas (0 = fuera de toda
+    zona, k = zona k-1), así que asignar zona a todos los centroides del frame es una única
+    indexación del array, con coste independiente del número de zonas. Si dos zonas se
+    solapan, la que aparece después en la configuración prevalece.
+
+    El estado por track se guarda en arrays ordenados por track_id (zona actual, momento de
+    entrada, última vez visto, alerta emitida) y se actualiza de forma vectorizada.
+    """
+    def __init__(self, zones, track_ttl=5.0):
+        """
+        :param zones: Lista de dicts {name, polygon: [[x, y], ...], max_dwell (opcional, segundos)}.
+        :param track_ttl: Segundos sin ver un track antes de olvidar su estado.
+        """
+        self.names = [z.get("name", f"zona{k + 1}") for k, z in enumerate(zones)]
+        self.polygons = [np.asarray(z["polygon"], dtype=np.int32).reshape(-1, 2) for z in zones]
+        # Índice 0 reservado para "fuera de zona"; np.inf = sin límite de permanencia
+        self.max_dwell = np.array([np.inf] + [float(z.get("max_dwell") or np.inf) for z in zones])
+        self.track_ttl = track_ttl
+        self.mask = None
+
+        n = len(zones) + 1
+        self.occupancy = np.zeros(n, dtype=np.int64)
+        self.entered = np.zeros(n, dtype=np.int64)
+        self.exited = np.zeros(n, dtype=np.int64)
+        self.alerts = 0
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.zone = np.zeros(0, dtype=np.int32)
+        self.since = np.zeros(0, dtype=np.float64)
+        self.seen = np.zeros(0, dtype=np.float64)
+        self.alerted = np.zeros(0, dtype=bool)
+
+    def _build_mask(self, frame_shape):
+        h, w = frame_shape[:2]
+        dtype = np.uint8 if len(self.polygons) < 255 else np.uint16
+        self.mask = np.zeros((h, w), dtype=dtype)
+        for k, polygon in enumerate(self.polygons, 1):
+            cv2.fillPoly(self.mask, [polygon], int(k))
+
+    def lookup(self, points):
+        """
+        :param points: Array (N, 2) de coordenadas (x, y) en píxeles.
+        :return: Array (N,) con la etiqueta de zona de cada punto (0 = ninguna).
+        """
+        h, w = self.mask.shape
+        xs = np.clip(points[:, 0].astype(np.int64), 0, w - 1)
+        ys = np.clip(points[:, 1].astype(np.int64), 0, h - 1)
+        return self.mask[ys, xs].astype(np.int32)
+
+    def update(self, detections, frame_shape, timestamp):
+        """
+        :param detections: DetectionBatch de una cámara (con track_id).
+        :return: Diccionario con 'entered' y 'exited' (conteos por zona en este frame,
+                 índice 0 = fuera de zona) y 'stuck' [(track_id, zona, segundos), ...]
+                 de los tracks que superan max_dwell por primera vez.
+        """
+        if self.mask is None or self.mask.shape != tuple(frame_shape[:2]):
+            self._build_mask(frame_shape)
+        n = len(self.names) + 1
+        tracked = detections.track_id >= 0
+        ids = detections.track_id[tracked]
+        labels = self.lookup(detections.centroids()[tracked])
+
+        # Emparejar con el estado previo (ids ordenados + searchsorted)
+        pos = np.searchsorted(self.ids, ids)
+        pos_c = np.minimum(pos, max(len(self.ids) - 1, 0))
+        known = (pos < len(self.ids)) & (self.ids[pos_c] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        prev = np.where(known, self.zone[pos_c] if len(self.ids) else 0, 0)
+
+        changed = known & (prev != labels)
+        entered = np.bincount(labels[changed], minlength=n)
+        exited = np.bincount(prev[changed], minlength=n)
+        entered[0] = exited[0] = 0
+        self.entered += entered
+        self.exited += exited
+        self.occupancy = np.bincount(labels, minlength=n)
+
+        # Actualizar tracks conocidos en su posición
+        upd = pos_c[known]
+        reset = changed[known]
+        self.zone[upd] = labels[known]
+        self.since[upd] = np.where(reset, timestamp, self.since[upd])
+        self.alerted[upd] &= ~reset
+        self.seen[upd] = timestamp
+
+        # Insertar tracks nuevos y olvidar los que llevan track_ttl sin verse
+        new = ~known
+        ids_all = np.concatenate([self.ids, ids[new]])
+        order = np.argsort(ids_all, kind="stable")
+        self.ids = ids_all[order]
+        self.zone = np.concatenate([self.zone, labels[new]])[order]
+        self.since = np.concatenate([self.since, np.full(new.sum(), timestamp)])[order]
+        self.seen = np.concatenate([self.seen, np.full(new.sum(), timestamp)])[order]
+        self.alerted = np.concatenate([self.alerted, np.zeros(new.sum(), dtype=bool)])[order]
+        keep = self.seen >= timestamp - self.track_ttl
+        if not keep.all():
+            self.ids, self.zone, self.since = self.ids[keep], self.zone[keep], self.since[keep]
+            self.seen, self.alerted = self.seen[keep], self.alerted[keep]
+
+        # Permanencia excesiva (ej. paquete atascado en una cinta)
+        dwell = timestamp - self.since
+        stuck = (self.seen == timestamp) & (self.zone > 0) & ~self.alerted & (dwell > self.max_dwell[self.zone])
+        self.alerted |= stuck
+        self.alerts += int(stuck.sum())
+        stuck_list = [(int(t), self.names[z - 1], float(d))
+                      for t, z, d in zip(self.ids[stuck], self.zone[stuck], dwell[stuck])]
+        return {"entered": entered, "exited": exited, "stuck": stuck_list}
+
+    def dwell_times(self, timestamp):
+        """
+        :return: Diccionario {nombre de zona: segundos máximos de permanencia actual}.
+        """
+        result = {}
+        inside = self.zone > 0
+        for z, d in zip(self.zone[inside], timestamp - self.since[inside]):
+            name = self.names[z - 1]
+            result[name] = max(result.get(name, 0.0), float(d))
+        return result
+
+    def draw(self, frame, scale=(1.0, 1.0)):
+        """
+        :param scale: Factores (sx, sy) para dibujar sobre un frame redimensionado.
+        """
+        for k, (name, polygon) in enumerate(zip(self.names, self.polygons), 1):
+            polygon = np.round(polygon * np.asarray(scale)).astype(np.int32)
+            cv2.polylines(frame, [polygon], True, (255, 200, 0), 2)
+            x, y = polygon.min(axis=0)
+            text = f"{name}: {self.occupancy[k]} (+{self.entered[k]} / -{self.exited[k]})"
+            cv2.putText(frame, text, (int(x) + 5, int(y) + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 200, 0), 2)
+        return frame
+
+    def report(self):
+        parts = [f"{name}: ocupación {self.occupancy[k]}, entradas {self.entered[k]}, salidas {self.exited[k]}"
+                 for k, name in enumerate(self.names, 1)]
+        return " | ".join(parts) + f" | alertas de permanencia {self.alerts}"